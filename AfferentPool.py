@@ -20,6 +20,8 @@
 
 import numpy as np
 from AfferentUnit import AfferentUnit
+from AxonDelayBank import AxonDelayBank
+from ParallelBuild import buildUnits
 from scipy.sparse import lil_matrix
 from numpy import random
 
@@ -50,10 +52,15 @@ class AfferentPool(object):
         self.AFnumber = int(conf.parameterSet('Number_' + pool + '-' + muscle, pool, 0))
                 
         ## Dictionary of Axon objects.
-        self.unit = dict()
+        self.unit = dict(enumerate(buildUnits(conf, AfferentUnit,
+                                              [(pool, muscle, i) for i in xrange(0, self.AFnumber)])))
 
-        for i in xrange(0, self.AFnumber):
-            self.unit[i] = AfferentUnit(conf, pool, muscle, i)
+        ## List with the indices of the afferent units stimulated in the part of the nerve
+        ## modelled as a delay.
+        self.delayUnits = [i for i in xrange(self.AFnumber) if self.unit[i].stimulusCompartment == 'delay']
+        ## AxonDelayBank with the AxonDelay objects of the afferent units of delayUnits.
+        self.delayBank = AxonDelayBank(conf, [self.unit[i].Delay for i in self.delayUnits])
+        for i in self.delayUnits: self.unit[i].delayBank = self.delayBank
 
         ## Vector with the instants of spikes in the last dynamical compartment, in ms.
         self.poolLastCompSpikes = np.array([])
@@ -79,6 +86,22 @@ class AfferentPool(object):
         for i in xrange(self.AFnumber): 
             units[i].atualizeAfferentUnit(t, max(0, (proprioceptorFR - 
                                                      units[i].frequencyThreshold_Hz)*self.conf.timeStep_ms/1000.0))
+        if self.delayUnits: self.atualizeDelays(t)
+
+    def atualizeDelays(self, t):
+        '''
+        Atualizes the delays of the nerve of the afferent units stimulated in the delay
+        (see the atualizeDelay method of the AfferentUnit class) with the AxonDelayBank.
+        Only the units with a spike arriving at the terminal are visited.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        step = self.conf.tick(t)
+        for k in self.delayBank.terminalSpikes(step):
+            self.unit[self.delayUnits[k]].addTerminalSpike(t, step)
+        # All the units of the pool share the same nerve stimulus.
+        self.delayBank.atualizeStimulus(step, self.unit[self.delayUnits[0]].nerveStimulus_mA[step])
 
     def listSpikes(self):
         '''
@@ -103,3 +126,4 @@ class AfferentPool(object):
         self.poolLastCompSpikes = np.array([])
         self.poolTerminalSpikes = np.array([])
         for i in xrange(self.AFnumber): self.unit[i].reset()
+        self.delayBank.reset()
@@ -26,6 +26,7 @@ from AxonDelay import AxonDelay
 from PointProcessGenerator import PointProcessGenerator
 import math
 from scipy.sparse import lil_matrix
+from RungeKutta import RungeKuttaWorkspace
 import time
 
 
@@ -100,56 +101,6 @@ def compGCouplingMatrix(gc):
             
     return GC
 
-#@profile
-def runge_kutta(derivativeFunction, t, x, timeStep, timeStepByTwo,  timeStepBySix):
-    '''
-    Function to implement the fourth order Runge-Kutta Method to solve numerically a 
-    differential equation.
-
-    - Inputs: 
-        + **derivativeFunction**: function that corresponds to the derivative of the differential equation.
-
-        + **t**: current instant.
-
-        + **x**:  current state value.
-
-        + **timeStep**: time step of the solution of the differential equation, in the same unit of t.
-
-        + **timeStepByTwo**:  timeStep divided by two, for computational efficiency.
-
-        + **timeStepBySix**: timeStep divided by six, for computational efficiency.
-
-    This method is intended to solve the following differential equation:
-
-    \f{equation}{
-        \frac{dx(t)}{dt} = f(t, x(t))
-    \f}
-    First, four derivatives are computed:
-
-    \f{align}{
-        k_1 &= f(t,x(t))\\
-        k_2 &= f(t+\frac{\Delta t}{2}, x(t) + \frac{\Delta t}{2}.k_1)\\
-        k_3 &= f(t+\frac{\Delta t}{2}, x(t) + \frac{\Delta t}{2}.k_2)\\
-        k_4 &= f(t+\Delta t, x(t) + \Delta t.k_3)
-    \f}
-    where \f$\Delta t\f$ is the time step of the numerical solution of the
-    differential equation.
-
-    Then the value of \f$x(t+\Delta t)\f$ is computed with:
-
-    \f{equation}{
-        x(t+\Delta t) = x(t) + \frac{\Delta t}{6}(k_1 + 2k_2 + 2k_3+k_4)
-    \f}
-    '''       
-    k1 = derivativeFunction(t, x)
-    k2 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k1)
-    k3 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k2)
-    k4 = derivativeFunction(t + timeStep, x + timeStep * k3)
-    
-    return x + timeStepBySix * (k1 + k2 + k2 + k3 + k3 + k4)
-    #return x + timeStep * (k1)
-
-
 class AfferentUnit(object):
     '''
     Class that implements a motor unit model. Encompasses a motoneuron
@@ -259,6 +210,8 @@ class AfferentUnit(object):
         ## Matrix of the conductance of the motoneuron. Multiplied by the vector self.v_mV,
         ## results in the passive currents of each compartment.
         self.G = np.float64(GC + GL)
+        ## RungeKuttaWorkspace object with the vectors used in the integration of the membrane potential.
+        self.integrator = RungeKuttaWorkspace(self.compNumber)
 
         
         
@@ -305,30 +258,24 @@ class AfferentUnit(object):
         else:
             self.Delay = AxonDelay(conf, self.nerve, pool + '-' + self.muscle, delayLength, -1, index)
             self.stimulusCompartment = -1    
-        # Nerve stimulus function    
-        self.stimulusMeanFrequency_Hz = float(conf.parameterSet('stimFrequency_' + self.nerve, pool, 0))
-        self.stimulusPulseDuration_ms = float(conf.parameterSet('stimPulseDuration_' + self.nerve, pool, 0))
-        self.stimulusIntensity_mA = float(conf.parameterSet('stimIntensity_' + self.nerve, pool, 0))
-        self.stimulusStart_ms = float(conf.parameterSet('stimStart_' + self.nerve, pool, 0))
-        self.stimulusStop_ms = float(conf.parameterSet('stimStop_' + self.nerve, pool, 0))
-        self.stimulusModulationStart_ms = float(conf.parameterSet('stimModulationStart_' + self.nerve, pool, 0))
-        self.stimulusModulationStop_ms = float(conf.parameterSet('stimModulationStop_' + self.nerve, pool, 0))
-
-        exec 'def axonStimModulation(t): return '   +  conf.parameterSet('stimModulation_' + self.nerve, pool, 0)
-        self.axonStimModulation = axonStimModulation
-        ## Vector with the nerve stimulus, in mA.
-        self.nerveStimulus_mA = np.zeros((int(np.rint(conf.simDuration_ms/conf.timeStep_ms)), 1), dtype = float)
-        self.createStimulus()
+        ## AxonDelayBank of the pool that atualizes the Delay of the unit. If None, 
+        ## the Delay is atualized by the atualizeDelay method.
+        self.delayBank = None
+        ## Vector with the nerve stimulus, in mA, at each time step. It is the same vector
+        ## for all the units of the pool (see the nerveStimulus method of the Configuration class).
+        self.nerveStimulus_mA = conf.nerveStimulus(self.nerve, pool)
         # 
         ## Vector with the instants of spikes at the last compartment.
         self.lastCompSpikeTrain = []
         ## Vector with the instants of spikes at the terminal.
         self.terminalSpikeTrain = []
+        ## Time step of the last spike at the terminal (-inf before the first spike).
+        self.terminalSpikeStep = float('-inf')
         
         self.GammaOrder = int(conf.parameterSet('GammaOrder_' + self.pool + '-' + self.muscle, pool, 0))
         ## A PointProcessGenerator object, corresponding the generator of
         ## spikes of the neural tract unit.   
-        self.spikesGenerator = PointProcessGenerator(index) 
+        self.spikesGenerator = PointProcessGenerator(index, conf.randomState('AfferentUnit', pool, muscle, str(index)))
         self.proprioceptorSpikeTrain = self.spikesGenerator.points 
         
         ## Build synapses       
@@ -349,12 +296,11 @@ class AfferentUnit(object):
             + **proprioceptorFR**: proprioceptor firing rate, in Hz.
         ''' 
 
-        self.spikesGenerator.atualizeGenerator(t, proprioceptorFR, self.GammaOrder)
-        if self.proprioceptorSpikeTrain and -1e-3 < (t - self.proprioceptorSpikeTrain[-1][0]) < 1e-3:
+        if self.spikesGenerator.atualizeGenerator(t, proprioceptorFR, self.GammaOrder):
             self.Delay.addSpinalSpike(t)
         if self.compNumber: 
             self.atualizeCompartments(t)
-        self.atualizeDelay(t)
+        if self.delayBank is None: self.atualizeDelay(t)
 
     #@profile    
     def atualizeCompartments(self, t):
@@ -365,14 +311,16 @@ class AfferentUnit(object):
             + **t**: current instant, in ms.
 
         '''
+        if self.conf.gatingUpdate == 'step':
+            for i in xrange(self.compNumber): self.compartment[i].atualizeChannels(t)
         
-        np.clip(runge_kutta(self.dVdt, t, self.v_mV, self.timeStep_ms, self.timeStepByTwo_ms, self.conf.timeStepBySix_ms), -30.0, 120.0, self.v_mV)
+        np.clip(self.integrator.step(self.dVdt, t, self.v_mV, self.timeStep_ms, self.timeStepByTwo_ms, self.conf.timeStepBySix_ms), -30.0, 120.0, self.v_mV)
         for i in xrange(self.somaIndex, self.compNumber):
             if self.v_mV[i] > self.threshold_mV and t-self.tSpikes[i] > self.MNRefPer_ms: 
                 self.addCompartmentSpike(t, i)    
      
     #@profile   
-    def dVdt(self, t, V): 
+    def dVdt(self, t, V, out = None): 
         '''
         Compute the potential derivative of all compartments of the motor unit.
 
@@ -394,7 +342,12 @@ class AfferentUnit(object):
             self.iIonic.itemset(i, self.compartment[i].computeCurrent(t, V.item(i)))
 
               
-        return (self.iIonic + self.G.dot(V)  + self.iInjected + self.EqCurrent_nA) * self.capacitanceInv
+        if out is None: out = np.empty_like(V)
+        np.add(self.iIonic, self.G.dot(V), out)
+        out += self.iInjected
+        out += self.EqCurrent_nA
+        out *= self.capacitanceInv
+        return out
     
     #@profile
     def addCompartmentSpike(self, t, comp):
@@ -426,12 +379,25 @@ class AfferentUnit(object):
             + **t**: current instant, in ms.
         '''
 
-        if -1e-3 < (t - self.Delay.terminalSpikeTrain) < 1e-3: 
-            self.terminalSpikeTrain.append([t, self.index])
-            self.transmitSpikes(t)
+        step = self.conf.tick(t)
+        if step == self.Delay.terminalSpikeStep: 
+            self.addTerminalSpike(t, step)
         
         if self.stimulusCompartment == 'delay':
-            self.Delay.atualizeStimulus(t, self.nerveStimulus_mA[int(np.rint(t/self.conf.timeStep_ms))])
+            self.Delay.atualizeStimulus(step, self.nerveStimulus_mA[step])
+
+    def addTerminalSpike(self, t, step):
+        '''
+        Adds a spike arriving at the terminal to the terminal spike train and transmits it.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **step**: current time step.
+        '''
+        self.terminalSpikeTrain.append([t, self.index])
+        self.terminalSpikeStep = step
+        self.transmitSpikes(t)
 
     def transmitSpikes(self, t):
         '''
@@ -441,33 +407,23 @@ class AfferentUnit(object):
         for i in xrange(len(self.indicesOfSynapsesOnTarget)):
             self.transmitSpikesThroughSynapses[i].receiveSpike(t, self.indicesOfSynapsesOnTarget[i])
 
-    def createStimulus(self):
+    def transmitSpikesRouter(self, t):
         '''
+        Transmits the spike through the SpikeRouter, that replaces the transmitSpikes
+        method when all the targets of the unit are in synapse engines.
+
+        - Inputs:
+            + **t**: current instant, in ms.
         '''
-        self.stimulusMeanFrequency_Hz = float(self.conf.parameterSet('stimFrequency_' + self.nerve, self.pool, 0))
-        self.stimulusPulseDuration_ms = float(self.conf.parameterSet('stimPulseDuration_' + self.nerve, self.pool, 0))
-        self.stimulusIntensity_mA = float(self.conf.parameterSet('stimIntensity_' + self.nerve, self.pool, 0))
-        self.stimulusStart_ms = float(self.conf.parameterSet('stimStart_' + self.nerve, self.pool, 0))
-        self.stimulusStop_ms = float(self.conf.parameterSet('stimStop_' + self.nerve, self.pool, 0))
-        self.stimulusModulationStart_ms = float(self.conf.parameterSet('stimModulationStart_' + self.nerve, self.pool, 0))
-        self.stimulusModulationStop_ms = float(self.conf.parameterSet('stimModulationStop_' + self.nerve, self.pool, 0))
+        self.router.transmit(t, self.routerIndex)
 
-        
-        
-        ## Vector with the nerve stimulus, in mA.
-        self.nerveStimulus_mA = np.zeros((int(np.rint(self.conf.simDuration_ms/self.conf.timeStep_ms)), 1), dtype = float)
-        startStep = int(np.rint(self.stimulusStart_ms / self.conf.timeStep_ms))
-        for i in xrange(len(self.nerveStimulus_mA)):
-            if (i * self.conf.timeStep_ms >= self.stimulusStart_ms and  i * self.conf.timeStep_ms <= self.stimulusStop_ms):
-                if (i * self.conf.timeStep_ms > self.stimulusModulationStart_ms and  i * self.conf.timeStep_ms < self.stimulusModulationStop_ms):
-                    stimulusFrequency_Hz = self.stimulusMeanFrequency_Hz + self.axonStimModulation(i * self.conf.timeStep_ms)
-                else:
-                    stimulusFrequency_Hz = self.stimulusMeanFrequency_Hz
-                if stimulusFrequency_Hz > 0:
-                    stimulusPeriod_ms = 1000.0 / stimulusFrequency_Hz
-                    numberOfSteps = int(np.rint(stimulusPeriod_ms / self.conf.timeStep_ms))
-                    if ((i - startStep) % numberOfSteps == 0):
-                        self.nerveStimulus_mA[i:int(np.rint(i + self.stimulusPulseDuration_ms / self.conf.timeStep_ms))] = self.stimulusIntensity_mA
+    def createStimulus(self):
+        '''
+        Gets the nerve stimulus again from the Configuration object, after a change of
+        the stimulus parameters. The stimulus is generated only once for all the units
+        of the pool.
+        '''
+        self.nerveStimulus_mA = self.conf.nerveStimulus(self.nerve, self.pool)
 
 
     def reset(self):
@@ -482,6 +438,8 @@ class AfferentUnit(object):
         self.lastCompSpikeTrain = []
         ## Vector with the instants of spikes at the terminal.
         self.terminalSpikeTrain = []
+        ## Time step of the last spike at the terminal (-inf before the first spike).
+        self.terminalSpikeStep = float('-inf')
 
 
 
@@ -62,19 +62,28 @@ class AxonDelay(object):
         ## Velocity of conduction, in m/s, of the part of the nerve that is not modelled as a delay.     
         self.velocity_m_s = float(conf.parameterSet('axonDelayCondVel',pool, index))
         
+        ## Number of time steps that the signal takes to travel between the stimulus and the spinal cord.
+        self.latencyStimulusSpinal_steps = int(round((self.length_m - stimulusPositiontoTerminal)/self.velocity_m_s*1000/conf.timeStep_ms, 0))
+        ## Number of time steps that the signal takes to travel between the spinal cord and the terminal.
+        self.latencySpinalTerminal_steps = int(round((self.length_m)/self.velocity_m_s*1000/conf.timeStep_ms, 0))
+        ## Number of time steps that the signal takes to travel between the stimulus and the terminal.
+        self.latencyStimulusTerminal_steps = int(round((stimulusPositiontoTerminal)/self.velocity_m_s*1000/conf.timeStep_ms, 0))
         ## time, in ms, that the signal takes to travel between the stimulus and the spinal cord.        
-        self.latencyStimulusSpinal_ms = round((self.length_m - stimulusPositiontoTerminal)/self.velocity_m_s*1000/conf.timeStep_ms, 0) * conf.timeStep_ms
+        self.latencyStimulusSpinal_ms = self.latencyStimulusSpinal_steps * conf.timeStep_ms
         ## time, in ms, that the signal takes to travel between the spinal cord and the terminal.
-        self.latencySpinalTerminal_ms = round((self.length_m)/self.velocity_m_s*1000/conf.timeStep_ms, 0) * conf.timeStep_ms
+        self.latencySpinalTerminal_ms = self.latencySpinalTerminal_steps * conf.timeStep_ms
         ## time, in ms, tat the signal takes to travel between the stimulus and the terminal.
-        self.latencyStimulusTerminal_ms = round((stimulusPositiontoTerminal)/self.velocity_m_s*1000/conf.timeStep_ms, 0) * conf.timeStep_ms
+        self.latencyStimulusTerminal_ms = self.latencyStimulusTerminal_steps * conf.timeStep_ms
 
-        ## Float with instant, in ms, of the last spike in the terminal. 
-        self.terminalSpikeTrain = float("-inf")
-        self.axonSpikeTrain = float("-inf")
+        ## Time step of the last spike in the terminal (-inf before the first spike).
+        self.terminalSpikeStep = float("-inf")
+        ## Time step of the last spike generated by the stimulus (-inf before the first spike).
+        self.axonSpikeStep = float("-inf")
         
-        self.orthodromicSpikeTrain = []
-        self.antidromicSpikeTrain = []
+        ## List of the time steps in which the orthodromic spikes reach the stimulus position.
+        self.orthodromicSpikeSteps = []
+        ## List of the time steps in which the antidromic spikes reach the spinal cord.
+        self.antidromicSpikeSteps = []
         self.indexOrthodromicSpike = 0
         self.indexAntidromicSpike = 0
 
@@ -83,19 +92,22 @@ class AxonDelay(object):
         self.threshold_muC = float(conf.parameterSet('axonDelayThreshold', pool, index))
 
         self.refractoryPeriod_ms = float(conf.parameterSet('axonDelayRefPeriod_' + nerve, pool, index))
+        ## Refractory period in time steps. A new spike is generated only more than 
+        ## refractoryPeriod_steps time steps after the last one.
+        self.refractoryPeriod_steps = conf.tick(self.refractoryPeriod_ms)
 
         self.leakageTimeConstant_ms = float(conf.parameterSet('axonDelayLeakTimeConstant', pool, index))
         
-    def addTerminalSpike(self, t, latency):
+    def addTerminalSpike(self, step, latency):
         '''
         Indicates to the AxonDelay object that a spike has occurred in the Terminal.
 
         - Inputs:
-            + **t**: current instant, in ms.
+            + **step**: current time step.
 
-            + **latency**: time elapsed until the spike take effect, in ms.
+            + **latency**: number of time steps elapsed until the spike take effect.
         '''
-        self.terminalSpikeTrain = t + latency
+        self.terminalSpikeStep = step + latency
 
     def addSpinalSpike(self, t):
         '''
@@ -103,52 +115,71 @@ class AxonDelay(object):
         dynamical compartment of the motor unit.
 
         - Inputs:
-            + **t**: current instant, in ms.
+            + **t**: instant of the spike, in ms.
         '''
-        self.orthodromicSpikeTrain.append(t + self.latencyStimulusSpinal_ms)
+        self.orthodromicSpikeSteps.append(self.conf.tick(t) + self.latencyStimulusSpinal_steps)
 
-    def addAntidromicSpike(self, t):
+    def addSpinalSpikeBank(self, t):
         '''
-        Indicates to the AxonDelay object that a spike has occurred in the last
-        dynamical compartment of the motor unit.
+        Adds the orthodromic spike to the AxonDelayBank of the pool. It replaces the
+        addSpinalSpike method when the axon is in an AxonDelayBank.
 
         - Inputs:
-            + **t**: current instant, in ms.
+            + **t**: instant of the spike, in ms.
         '''
-        self.antidromicSpikeTrain.append(t + self.latencyStimulusSpinal_ms)
-        
+        self.bank.addSpinalSpike(self.bankIndex, t)
 
-    def atualizeStimulus(self, t, stimulus):
+    def addAntidromicSpike(self, step):
         '''
+        Indicates to the AxonDelay object that a spike generated by the stimulus
+        travels towards the spinal cord.
+
+        - Inputs:
+            + **step**: current time step.
+        '''
+        self.antidromicSpikeSteps.append(step + self.latencyStimulusSpinal_steps)
         
+
+    def atualizeStimulus(self, step, stimulus):
+        '''
+        Atualizes the electric charge due to the stimulus and generates the spikes of the stimulus
+        and the orthodromic spikes that are not collided by an antidromic spike.
+
+        - Inputs:
+            + **step**: current time step.
+
+            + **stimulus**: current, in mA, of the stimulus.
         '''
         self.electricCharge_muC = (stimulus * self.conf.timeStep_ms +
                                    self.electricCharge_muC * 
                                    math.exp(-self.conf.timeStep_ms
                                             /self.leakageTimeConstant_ms)
                                   )
-        if t - self.axonSpikeTrain > self.refractoryPeriod_ms:            
+        if step - self.axonSpikeStep > self.refractoryPeriod_steps:            
             if self.electricCharge_muC >= self.threshold_muC:
                 self.electricCharge_muC = 0
-                self.addTerminalSpike(t, self.latencyStimulusTerminal_ms)
-                self.addAntidromicSpike(t)
-                self.axonSpikeTrain = t
-            if self.indexOrthodromicSpike < len(self.orthodromicSpikeTrain):
-                if t > self.orthodromicSpikeTrain[self.indexOrthodromicSpike]:
-                    if self.indexAntidromicSpike < len(self.antidromicSpikeTrain):
-                        if (math.fabs(self.orthodromicSpikeTrain[self.indexOrthodromicSpike] -
-                                      self.antidromicSpikeTrain[self.indexAntidromicSpike]) < self.latencyStimulusSpinal_ms):
+                self.addTerminalSpike(step, self.latencyStimulusTerminal_steps)
+                self.addAntidromicSpike(step)
+                self.axonSpikeStep = step
+            if self.indexOrthodromicSpike < len(self.orthodromicSpikeSteps):
+                # The orthodromic spike passes the stimulus position in the step after its
+                # nominal step (strictly after the latency). With instants in ms this
+                # sometimes happened in the nominal step, due to the rounding of t.
+                if step > self.orthodromicSpikeSteps[self.indexOrthodromicSpike]:
+                    if self.indexAntidromicSpike < len(self.antidromicSpikeSteps):
+                        if (abs(self.orthodromicSpikeSteps[self.indexOrthodromicSpike] -
+                                self.antidromicSpikeSteps[self.indexAntidromicSpike]) < self.latencyStimulusSpinal_steps):
                             self.indexOrthodromicSpike += 1
                             self.indexAntidromicSpike += 1
                         else:
                             self.electricCharge_muC = 0
-                            self.addTerminalSpike(t, self.latencyStimulusTerminal_ms)
-                            self.axonSpikeTrain = t
+                            self.addTerminalSpike(step, self.latencyStimulusTerminal_steps)
+                            self.axonSpikeStep = step
                             self.indexOrthodromicSpike += 1
                     else:
                         self.electricCharge_muC = 0
-                        self.addTerminalSpike(t, self.latencyStimulusTerminal_ms)
-                        self.axonSpikeTrain = t
+                        self.addTerminalSpike(step, self.latencyStimulusTerminal_steps)
+                        self.axonSpikeStep = step
                         self.indexOrthodromicSpike += 1
 
     def reset(self):
@@ -156,13 +187,10 @@ class AxonDelay(object):
 
         '''
         self.electricCharge_muC = 0
-        self.terminalSpikeTrain = float("-inf")
-        self.axonSpikeTrain = float("-inf")        
+        self.terminalSpikeStep = float("-inf")
+        self.axonSpikeStep = float("-inf")        
 
-        self.orthodromicSpikeTrain = []
-        self.antidromicSpikeTrain = []
+        self.orthodromicSpikeSteps = []
+        self.antidromicSpikeSteps = []
         self.indexOrthodromicSpike = 0
         self.indexAntidromicSpike = 0
-
-
-        
@@ -0,0 +1,214 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import numpy as np
+import math
+
+## Initial number of events that each queue of the AxonDelayBank holds for each axon.
+## The queues are enlarged when needed.
+initialQueueLength = 4
+
+
+class AxonDelayBank(object):
+    '''
+    Class that implements the AxonDelay objects of the stimulated axons of a pool with
+    vectors, one element per axon. The electric charge of the stimulus, the refractory
+    period and the collision between orthodromic and antidromic spikes (see the
+    atualizeStimulus method of the AxonDelay class) are computed for all the axons at
+    once. The orthodromic and antidromic spikes waiting to arrive are kept in ring
+    buffers (matrices with one row per axon), so only the first spike of each queue
+    is checked at each time step.
+    '''
+
+    def __init__(self, conf, delays):
+        '''
+        Constructor
+
+        - Inputs:
+            + **conf**: Configuration object with the simulation parameters.
+
+            + **delays**: list of the AxonDelay objects of the axons stimulated in the delay.
+        '''
+        self.conf = conf
+        ## Number of axons.
+        self.axonNumber = len(delays)
+        ## Vector with the threshold, in \f$\mu\f$C, of the electric charge of each axon.
+        self.threshold_muC = np.array([delay.threshold_muC for delay in delays], dtype = float)
+        ## Vector with the decay of the electric charge of each axon in one time step.
+        self.chargeDecay = np.array([math.exp(-conf.timeStep_ms / delay.leakageTimeConstant_ms)
+                                     for delay in delays], dtype = float)
+        ## Vector with the refractory period, in time steps, of each axon.
+        self.refractoryPeriod_steps = np.array([delay.refractoryPeriod_steps for delay in delays], dtype = int)
+        ## Vector with the number of time steps between the stimulus and the spinal cord of each axon.
+        self.latencyStimulusSpinal_steps = np.array([delay.latencyStimulusSpinal_steps
+                                                     for delay in delays], dtype = int)
+        ## Vector with the number of time steps between the stimulus and the terminal of each axon.
+        self.latencyStimulusTerminal_steps = np.array([delay.latencyStimulusTerminal_steps
+                                                       for delay in delays], dtype = int)
+
+        self.reset()
+
+        for i in xrange(self.axonNumber):
+            delays[i].bank = self
+            delays[i].bankIndex = i
+            delays[i].addSpinalSpike = delays[i].addSpinalSpikeBank
+
+    def atualizeStimulus(self, step, stimulus):
+        '''
+        Atualizes the electric charge of all the axons and generates the spikes of the
+        stimulus and the orthodromic spikes that are not collided by an antidromic spike.
+        It is the vectorized version of the atualizeStimulus method of the AxonDelay class.
+
+        - Inputs:
+            + **step**: current time step.
+
+            + **stimulus**: current, in mA, of the stimulus (scalar or vector with one
+            element per axon).
+        '''
+        self.electricCharge_muC = stimulus * self.conf.timeStep_ms + self.electricCharge_muC * self.chargeDecay
+        ready = step - self.axonSpikeStep > self.refractoryPeriod_steps
+        if not ready.any(): return
+
+        fire = np.flatnonzero(ready & (self.electricCharge_muC >= self.threshold_muC))
+        if len(fire):
+            self.fire(step, fire)
+            self.pushEvents('antidromic', fire, step + self.latencyStimulusSpinal_steps[fire])
+
+        due = ready & (self.orthodromicCount > 0)
+        due[due] = step > self.firstEvents('orthodromic', np.flatnonzero(due))
+        due = np.flatnonzero(due)
+        if not len(due): return
+        collided = self.antidromicCount[due] > 0
+        collided[collided] = (np.abs(self.firstEvents('orthodromic', due[collided]) -
+                                     self.firstEvents('antidromic', due[collided]))
+                              < self.latencyStimulusSpinal_steps[due[collided]])
+        self.popEvents('orthodromic', due)
+        self.popEvents('antidromic', due[collided])
+        self.fire(step, due[np.logical_not(collided)])
+
+    def fire(self, step, axons):
+        '''
+        Generates a spike in a set of axons, that arrives at the terminal after
+        latencyStimulusTerminal_steps.
+        '''
+        self.electricCharge_muC[axons] = 0
+        self.terminalSpikeStep[axons] = step + self.latencyStimulusTerminal_steps[axons]
+        self.axonSpikeStep[axons] = step
+
+    def addSpinalSpike(self, axon, t):
+        '''
+        Adds the orthodromic spike of a spike in the last dynamical compartment of
+        the unit of an axon.
+
+        - Inputs:
+            + **axon**: integer with the index of the axon.
+
+            + **t**: instant of the spike, in ms.
+        '''
+        self.pushEvents('orthodromic', np.array([axon]),
+                        self.conf.tick(t) + self.latencyStimulusSpinal_steps[axon])
+
+    def terminalSpikes(self, step):
+        '''
+        Vector with the indices of the axons with a spike arriving at the terminal at **step**.
+        '''
+        return np.flatnonzero(self.terminalSpikeStep == step)
+
+    def antidromicSpikes(self, step):
+        '''
+        Vector with the indices of the axons whose first antidromic spike waiting arrives
+        at the spinal cord at **step**.
+        '''
+        axons = np.flatnonzero(self.antidromicCount > 0)
+        return axons[self.firstEvents('antidromic', axons) == step]
+
+    def firstEvents(self, queue, axons):
+        '''
+        Vector with the first event of the queue (*orthodromic* or *antidromic*) of a set of axons.
+        '''
+        events = getattr(self, queue + 'Steps')
+        return events[axons, getattr(self, queue + 'First')[axons]]
+
+    def pushEvents(self, queue, axons, steps):
+        '''
+        Adds an event at the end of the queue (*orthodromic* or *antidromic*) of a set of
+        different axons. The queues are enlarged if they are full.
+
+        - Inputs:
+            + **queue**: string with the queue.
+
+            + **axons**: vector with the indices of the axons.
+
+            + **steps**: time steps of the events.
+        '''
+        events = getattr(self, queue + 'Steps')
+        count = getattr(self, queue + 'Count')
+        if (count[axons] == events.shape[1]).any():
+            events = self.enlargeQueue(queue)
+        first = getattr(self, queue + 'First')
+        events[axons, (first[axons] + count[axons]) % events.shape[1]] = steps
+        count[axons] += 1
+
+    def popEvents(self, queue, axons):
+        '''
+        Removes the first event of the queue (*orthodromic* or *antidromic*) of a set of
+        different axons.
+        '''
+        first = getattr(self, queue + 'First')
+        first[axons] = (first[axons] + 1) % getattr(self, queue + 'Steps').shape[1]
+        getattr(self, queue + 'Count')[axons] -= 1
+
+    def enlargeQueue(self, queue):
+        '''
+        Doubles the length of a queue, keeping its events in order.
+
+        - Output:
+            + The matrix with the events of the queue.
+        '''
+        events = getattr(self, queue + 'Steps')
+        first = getattr(self, queue + 'First')
+        length = events.shape[1]
+        order = (first[:, np.newaxis] + np.arange(length)) % length
+        newEvents = np.zeros((self.axonNumber, 2 * length), dtype = int)
+        newEvents[:, :length] = events[np.arange(self.axonNumber)[:, np.newaxis], order]
+        first[:] = 0
+        setattr(self, queue + 'Steps', newEvents)
+        return newEvents
+
+    def reset(self):
+        '''
+        Reset the axons in the same way as the reset method of the AxonDelay class.
+        '''
+        ## Vector with the electric charge, in \f$\mu\f$C, of each axon.
+        self.electricCharge_muC = np.zeros((self.axonNumber), dtype = float)
+        ## Vectors with the time step of the last spike in the terminal and of the last spike
+        ## generated by the stimulus of each axon (-inf before the first spike).
+        self.terminalSpikeStep = np.full((self.axonNumber), float('-inf'))
+        self.axonSpikeStep = np.full((self.axonNumber), float('-inf'))
+        ## Ring buffers with the time steps in which the orthodromic spikes reach the stimulus
+        ## position (orthodromicSteps) and the antidromic spikes reach the spinal cord
+        ## (antidromicSteps), with the index of the first event (First) and the number of
+        ## events (Count) of each axon.
+        self.orthodromicSteps = np.zeros((self.axonNumber, initialQueueLength), dtype = int)
+        self.orthodromicFirst = np.zeros((self.axonNumber), dtype = int)
+        self.orthodromicCount = np.zeros((self.axonNumber), dtype = int)
+        self.antidromicSteps = np.zeros((self.axonNumber, initialQueueLength), dtype = int)
+        self.antidromicFirst = np.zeros((self.axonNumber), dtype = int)
+        self.antidromicCount = np.zeros((self.axonNumber), dtype = int)
@@ -0,0 +1,174 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import os
+import glob
+import hashlib
+import tempfile
+import types
+import copy_reg
+import cPickle
+import cStringIO
+
+
+def reduceMethod(method):
+    '''
+    Allows the pickling of the bound methods, such as the methods chosen in the constructors
+    of the units (e.g. the transmitSpikes method).
+    '''
+    return (getattr, (method.im_self, method.im_func.__name__))
+
+copy_reg.pickle(types.MethodType, reduceMethod)
+
+## String with the digest of the source files of the simulator. Objects built by different
+## versions of the code are kept with different keys.
+sourceDigest = None
+
+
+def computeSourceDigest():
+    '''
+    Returns the digest of the source files of the simulator (computed only once).
+    '''
+    global sourceDigest
+    if sourceDigest is None:
+        digest = hashlib.sha1()
+        for filename in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+            digest.update(os.path.basename(filename))
+            with open(filename, 'rb') as sourceFile:
+                digest.update(sourceFile.read())
+        sourceDigest = digest.hexdigest()
+    return sourceDigest
+
+
+class BuildCache(object):
+    '''
+    Class that keeps the objects built from a configuration, such as the units of a pool,
+    in files of the directory given by the buildCache parameter, so a system built with
+    the same configuration file is read again instead of being built.
+
+    Each file is identified by the contents of the configuration file, the seed, the name
+    of the objects and the source files of the simulator, so a change in any of them
+    builds the objects again. The objects are kept with pickle. The Configuration object
+    and the nerve stimulus vectors shared by the units are not kept in the files, and are
+    replaced by the ones of the current Configuration object when the file is read.
+    '''
+
+    def __init__(self, conf):
+        '''
+        Constructor
+
+        - Inputs:
+            + **conf**: Configuration object with the simulation parameters.
+        '''
+        self.conf = conf
+        ## String with the directory of the files.
+        self.directory = conf.buildCache
+        ## Dictionary with the persistent id of the nerve stimulus vectors, with the id of the
+        ## vector as key.
+        self.sharedVectors = dict()
+
+    def key(self, name):
+        '''
+        Returns the name of the file with the objects **name**, given by the digest of the
+        configuration parameters, the seed, **name** and the source files.
+        '''
+        digest = hashlib.sha1()
+        digest.update(self.conf.confArray.tostring())
+        digest.update(str(self.conf.seed))
+        digest.update(name)
+        digest.update(computeSourceDigest())
+        return os.path.join(self.directory, name + '-' + digest.hexdigest() + '.pkl')
+
+    def persistentId(self, obj):
+        if obj is self.conf:
+            return 'conf'
+        return self.sharedVectors.get(id(obj))
+
+    def persistentLoad(self, pid):
+        if pid == 'conf':
+            return self.conf
+        return self.conf.nerveStimulus(pid[1], pid[2])
+
+    def dump(self, obj, outputFile):
+        '''
+        Writes the objects **obj** in a file (or a file-like object) with pickle.
+        '''
+        self.sharedVectors = dict()
+        for (nerve, pool), (parameters, stimulus) in self.conf.nerveStimuli.items():
+            self.sharedVectors[id(stimulus)] = ('nerveStimulus', nerve, pool)
+        pickler = cPickle.Pickler(outputFile, cPickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = self.persistentId
+        pickler.dump(obj)
+
+    def read(self, inputFile):
+        '''
+        Reads the objects written by the dump method in a file (or a file-like object).
+        '''
+        unpickler = cPickle.Unpickler(inputFile)
+        unpickler.persistent_load = self.persistentLoad
+        return unpickler.load()
+
+    def dumps(self, obj):
+        '''
+        Returns a string with the objects **obj**, such as the units built by another process
+        (see the buildUnits function).
+        '''
+        outputFile = cStringIO.StringIO()
+        self.dump(obj, outputFile)
+        return outputFile.getvalue()
+
+    def loads(self, data):
+        '''
+        Returns the objects of a string written by the dumps method.
+        '''
+        return self.read(cStringIO.StringIO(data))
+
+    def load(self, name):
+        '''
+        Reads the objects **name**.
+
+        - Inputs:
+            + **name**: string that identifies the objects, such as *MotorUnitPool-SOL*.
+
+        - Output:
+            + The objects, or None if they are not in the cache.
+        '''
+        filename = self.key(name)
+        if not os.path.isfile(filename):
+            return None
+        with open(filename, 'rb') as cacheFile:
+            return self.read(cacheFile)
+
+    def save(self, name, obj):
+        '''
+        Writes the objects **name**. The file is written with a temporary name and then
+        renamed, so simulations running at the same time never read an incomplete file.
+
+        - Inputs:
+            + **name**: string that identifies the objects, such as *MotorUnitPool-SOL*.
+
+            + **obj**: objects to be kept.
+        '''
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        descriptor, temporaryName = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+        with os.fdopen(descriptor, 'wb') as cacheFile:
+            self.dump(obj, cacheFile)
+        os.rename(temporaryName, self.key(name))
@@ -0,0 +1,200 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import numpy as np
+
+
+def hinesSolve(lower, diag, upper, rhs):
+    '''
+    Solves a set of tridiagonal systems, one for each column of the inputs, with
+    the elimination of Hines (1984), that for an unbranched cable is the same as
+    the Thomas algorithm. The elimination is O(n) for each system and is
+    vectorized across the systems.
+
+    - Inputs:
+        + **lower**: matrix with the subdiagonal of each system along the columns. The
+        element in the first row is not used.
+
+        + **diag**: matrix with the diagonal of each system along the columns.
+
+        + **upper**: matrix with the superdiagonal of each system along the columns. The
+        element in the last row is not used.
+
+        + **rhs**: matrix with the right-hand side of each system along the columns.
+
+    - Output:
+        + matrix with the solution of each system along the columns.
+
+    The solution is obtained with a forward elimination:
+
+    \f{align}{
+        c'_0 &= \frac{c_0}{b_0}, \quad d'_0 = \frac{d_0}{b_0}\\
+        c'_j &= \frac{c_j}{b_j - a_jc'_{j-1}}, \quad d'_j = \frac{d_j - a_jd'_{j-1}}{b_j - a_jc'_{j-1}}
+    \f}
+    and a back substitution:
+
+    \f{equation}{
+        x_{N-1} = d'_{N-1}, \quad x_j = d'_j - c'_jx_{j+1}
+    \f}
+    where \f$a\f$, \f$b\f$ and \f$c\f$ are the subdiagonal, diagonal and superdiagonal and
+    \f$d\f$ is the right-hand side.
+    '''
+    n = diag.shape[0]
+    cPrime = np.empty_like(diag)
+    dPrime = np.empty_like(rhs)
+    cPrime[0] = upper[0] / diag[0]
+    dPrime[0] = rhs[0] / diag[0]
+    for j in xrange(1, n):
+        m = diag[j] - lower[j] * cPrime[j-1]
+        cPrime[j] = upper[j] / m
+        dPrime[j] = (rhs[j] - lower[j] * dPrime[j-1]) / m
+    x = np.empty_like(rhs)
+    x[n-1] = dPrime[n-1]
+    for j in xrange(n-2, -1, -1):
+        x[j] = dPrime[j] - cPrime[j] * x[j+1]
+    return x
+
+
+class CableSolver(object):
+    '''
+    Class that implements an implicit solver (backward Euler or Crank-Nicolson) of
+    the membrane potential of the compartments of a pool. The conductance matrix of
+    each unit is tridiagonal (dendrite-soma-internode-node chain), so the linear system
+    of each time step is solved with the Hines elimination, vectorized across all the
+    units of the pool.
+    '''
+
+    def __init__(self, conf, unit, compOffset, capacitanceInv, method):
+        '''
+        Constructor
+
+        - Inputs:
+            + **conf**: Configuration object with the simulation parameters.
+
+            + **unit**: dictionary with the units of the pool. Each unit has the matrix G,
+            with the conductances of the compartments of the unit.
+
+            + **compOffset**: vector with the index, in the pool vectors, of the first
+            compartment of each unit.
+
+            + **capacitanceInv**: vector with the inverse of the capacitance, in 1/nF, of
+            all the compartments of the pool.
+
+            + **method**: string with the integration method. It can be *backwardEuler* or
+            *CrankNicolson*.
+        '''
+        self.conf = conf
+        ## String with the integration method. It can be *backwardEuler* or *CrankNicolson*.
+        self.method = method
+        ## Weight of the implicit part of the \f$\theta\f$-method (1 for backward Euler
+        ## and 0.5 for Crank-Nicolson).
+        if self.method == 'CrankNicolson':
+            self.theta = 0.5
+        else:
+            self.theta = 1.0
+
+        numberOfUnits = len(unit)
+        compNumber = np.array([unit[i].compNumber for i in xrange(numberOfUnits)], dtype = int)
+        ## Largest number of compartments of a unit of the pool. The systems of
+        ## the units with less compartments are padded with identity rows.
+        self.maxCompNumber = int(compNumber.max()) if numberOfUnits else 0
+
+        ## Matrix (compartment x unit) indicating the valid elements of the padded layout.
+        self.valid = np.arange(self.maxCompNumber)[:, np.newaxis] < compNumber[np.newaxis, :]
+        ## Matrix (compartment x unit) with the index, in the pool vectors, of each element
+        ## of the padded layout.
+        self.index = np.where(self.valid,
+                              np.arange(self.maxCompNumber)[:, np.newaxis] + np.asarray(compOffset)[np.newaxis, :],
+                              0)
+        ## Vector with the indices of the valid elements in the pool vectors.
+        self.flatIndex = self.index[self.valid]
+
+        ## Subdiagonal, diagonal and superdiagonal of the conductance matrices, in \f$\mu\f$S,
+        ## in the padded layout.
+        self.lower = np.zeros((self.maxCompNumber, numberOfUnits), dtype = conf.floatType)
+        self.diag = np.zeros_like(self.lower)
+        self.upper = np.zeros_like(self.lower)
+        for i in xrange(numberOfUnits):
+            n = compNumber[i]
+            G = np.asarray(unit[i].G, dtype = float).reshape((n, n))
+            self.diag[:n, i] = np.diag(G)
+            if n > 1:
+                self.upper[:n-1, i] = np.diag(G, 1)
+                self.lower[1:n, i] = np.diag(G, -1)
+
+        ## Inverse of the capacitance, in 1/nF, in the padded layout.
+        self.capacitanceInv = np.where(self.valid, np.asarray(capacitanceInv)[self.index], 0.0)
+
+    def pad(self, x):
+        '''
+        Returns the pool vector **x** in the padded layout (compartment x unit).
+        '''
+        return np.where(self.valid, x[self.index], 0.0)
+
+    def atualizePotential(self, V, gTotal, iConstant, timeStep):
+        '''
+        Computes the membrane potential of all the compartments after one time step.
+
+        - Inputs:
+            + **V**: vector with the membrane potential, in mV, of all the compartments
+            of the pool at the current instant.
+
+            + **gTotal**: vector with the conductance, in \f$\mu\f$S, of the active currents
+            of each compartment, treated implicitly.
+
+            + **iConstant**: vector with the current, in nA, of each compartment that does not
+            depend on the membrane potential (including \f$g_{total}V\f$ at the current instant,
+            so that the active currents are linearized around the current potential).
+
+            + **timeStep**: time step, in ms.
+
+        - Output:
+            + vector with the membrane potential, in mV, at the next instant.
+
+        The membrane potential \f$V\f$ follows:
+
+        \f{equation}{
+            \frac{dV}{dt} = C^{-1}\left[(G - g_{total})V + I_{const}\right] = LV + C^{-1}I_{const}
+        \f}
+        and the \f$\theta\f$-method gives the tridiagonal system:
+
+        \f{equation}{
+            (I - \theta\Delta tL)V(t+\Delta t) = (I + (1-\theta)\Delta tL)V(t) + \Delta tC^{-1}I_{const}
+        \f}
+        '''
+        Vp = self.pad(V)
+        diagL = self.capacitanceInv * (self.diag - self.pad(gTotal))
+        lowerL = self.capacitanceInv * self.lower
+        upperL = self.capacitanceInv * self.upper
+
+        LV = diagL * Vp
+        LV[1:] += lowerL[1:] * Vp[:-1]
+        LV[:-1] += upperL[:-1] * Vp[1:]
+
+        rhs = Vp + timeStep * ((1.0 - self.theta) * LV + self.capacitanceInv * self.pad(iConstant))
+        thetaDt = self.theta * timeStep
+        # Padded elements are identity rows.
+        diag = np.where(self.valid, 1.0 - thetaDt * diagL, 1.0)
+
+        Vp = hinesSolve(-thetaDt * lowerL, diag, -thetaDt * upperL, rhs)
+
+        Vnew = np.empty_like(V)
+        Vnew[self.flatIndex] = Vp[self.valid]
+        return Vnew
@@ -21,6 +21,7 @@
 import numpy as np
 import math
 from PulseConductanceState import PulseConductanceState
+from LazyPulseConductanceState import LazyPulseConductanceState
 #from numba import jit
 
 
@@ -192,11 +193,14 @@ class ChannelConductance(object):
         ## Maximal conductance, in \f$\mu\f$S, of the ionic channel. 
         self.gmax_muS = compArea * float(conf.parameterSet('gmax_' + kind + ':' + pool + '-' + neuronKind + '@' + compKind, pool, index))
                         
-        ## String with type of dynamics of the states. For now it accepts the string pulse.
+        ## String with type of dynamics of the states. For now it accepts the strings pulse
+        ## (see PulseConductanceState) and lazyPulse (see LazyPulseConductanceState).
         self.stateType = conf.parameterSet('StateType', pool, index)
         
         if self.stateType == 'pulse':
             ConductanceState = PulseConductanceState
+        elif self.stateType == 'lazyPulse':
+            ConductanceState = LazyPulseConductanceState
 
         ## List of ConductanceState objects, representing each state of the ionic channel.
         self.condState = []
@@ -226,6 +230,9 @@ class ChannelConductance(object):
         
         ## Integer with the number of states in the ionic channel.    
         self.lenStates = len(self.condState)          
+
+        if conf.gatingUpdate == 'step':
+            self.computeCurrent = self.computeCurrentFixedStates
     
     #@profile
     def computeCurrent(self, t, V_mV): 
@@ -245,6 +252,33 @@ class ChannelConductance(object):
                           
         return self.compCond(V_mV, self.gmax_muS, self.condState, self.EqPot_mV)
 
+    def computeCurrentFixedStates(self, t, V_mV):
+        '''
+        Computes the current generated by the ionic Channel without updating the
+        states. It replaces the computeCurrent method when the states are updated
+        once per time step (gatingUpdate parameter equal to step), with the
+        atualizeChannel method.
+
+        - Inputs:
+            + **t**: instant in ms.
+            + **V_mV**: membrane potential of the compartment in mV.
+
+        - Outputs:
+            + Ionic current, in nA
+        '''
+        return self.compCond(V_mV, self.gmax_muS, self.condState, self.EqPot_mV)
+
+    def atualizeChannel(self, t):
+        '''
+        Updates the states of the ionic channel. It is called once per time step
+        when the gatingUpdate parameter is step.
+
+        - Inputs:
+            + **t**: instant in ms.
+        '''
+        for i in xrange(0, self.lenStates): 
+            self.condState[i].computeStateValue(t)
+
     def reset(self):
         '''
 
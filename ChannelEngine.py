@@ -0,0 +1,530 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import numpy as np
+from LazyPulseConductanceState import settleTolerance
+
+
+def compGatingKs(value, states):
+    '''
+    Gating term \f$q^2\f$ of the slow potassium channels (see compCondKs in ChannelConductance).
+    '''
+    q = value[states[0]]
+    return q * q
+
+def compGatingKsaxon(value, states):
+    '''
+    Gating term \f$s\f$ of the slow potassium channels of the axon (see compCondKsaxon in ChannelConductance).
+    '''
+    return value[states[0]]
+
+def compGatingNa(value, states):
+    '''
+    Gating term \f$m^3h\f$ of the sodium channels (see compCondNa in ChannelConductance).
+    '''
+    m = value[states[0]]
+    return m * m * m * value[states[1]]
+
+def compGatingNap(value, states):
+    '''
+    Gating term \f$m_p^3\f$ of the persistent sodium channels (see compCondNap in ChannelConductance).
+    '''
+    mp = value[states[0]]
+    return mp * mp * mp
+
+def compGatingKf(value, states):
+    '''
+    Gating term \f$n^4\f$ of the fast potassium channels (see compCondKf in ChannelConductance).
+    '''
+    n = value[states[0]]
+    n2 = n * n
+    return n2 * n2
+
+def compGatingH(value, states):
+    '''
+    Gating term \f$q_h\f$ of the HCN channels (see compCondH in ChannelConductance).
+    '''
+    return value[states[0]]
+
+
+class ChannelEngine(object):
+    '''
+    Class that implements all the ionic channels of a pool of neurons with flat
+    arrays. The states of every PulseConductanceState of the pool are stored in
+    vectors, and the ionic currents of all the compartments are computed with a
+    few vectorized expressions, instead of calling the computeCurrent method of
+    each ChannelConductance object.
+    '''
+
+    def __init__(self, conf, unit, compOffset, totalNumberOfCompartments):
+        '''
+        Constructor
+
+        - Inputs:
+            + **conf**: Configuration object with the simulation parameters.
+
+            + **unit**: dictionary with the units (MotorUnit or Interneuron objects) of the pool.
+
+            + **compOffset**: vector with the index, in the pool vectors, of the first
+            compartment of each unit.
+
+            + **totalNumberOfCompartments**: integer with the number of compartments of the pool.
+        '''
+        self.conf = conf
+
+        ## Number of compartments of the pool.
+        self.totalNumberOfCompartments = totalNumberOfCompartments
+
+        value, state, endOfPulse, pulseDur, alphaExp, betaExp, activation = [], [], [], [], [], [], []
+        alpha, beta, t0, v0 = [], [], [], []
+        stateTypes = set()
+        channelComp, channelGmax, channelEqPot, channelStates = dict(), dict(), dict(), dict()
+
+        for i in xrange(len(unit)):
+            for j in xrange(len(unit[i].compartment)):
+                for channel in unit[i].compartment[j].Channels:
+                    if channel.kind not in channelComp:
+                        channelComp[channel.kind] = []
+                        channelGmax[channel.kind] = []
+                        channelEqPot[channel.kind] = []
+                        channelStates[channel.kind] = [[] for k in xrange(channel.lenStates)]
+                    channelComp[channel.kind].append(compOffset[i] + j)
+                    channelGmax[channel.kind].append(channel.gmax_muS)
+                    channelEqPot[channel.kind].append(channel.EqPot_mV)
+                    stateTypes.add(channel.stateType)
+                    for k in xrange(channel.lenStates):
+                        channelStates[channel.kind][k].append(len(value))
+                        condState = channel.condState[k]
+                        value.append(condState.value)
+                        state.append(condState.state)
+                        endOfPulse.append(condState.endOfPulse_ms)
+                        pulseDur.append(condState.PulseDur_ms)
+                        alphaExp.append(condState.AlphaExp)
+                        betaExp.append(condState.BetaExp)
+                        activation.append(condState.actType == 'activation')
+                        alpha.append(condState.alpha_ms1)
+                        beta.append(condState.beta_ms1)
+                        t0.append(getattr(condState, 't0_ms', 0.0))
+                        v0.append(getattr(condState, 'v0', condState.value))
+
+        ## Vector with the values of all the states of the pool.
+        self.value = np.array(value, dtype = conf.floatType)
+        ## Vector indicating whether each state is during a pulse (True) or not (False).
+        self.state = np.array(state, dtype = bool)
+        ## Vector with the instant, in ms, of the end of the pulse of each state.
+        self.endOfPulse_ms = np.array(endOfPulse, dtype = float)
+        ## Vector with the pulse duration, in ms, of each state.
+        self.PulseDur_ms = np.array(pulseDur, dtype = float)
+        ## Vector with \f$\exp(-\alpha\Delta t)\f$ of each state.
+        self.AlphaExp = np.array(alphaExp, dtype = conf.floatType)
+        ## Vector with \f$\exp(-\beta\Delta t)\f$ of each state.
+        self.BetaExp = np.array(betaExp, dtype = conf.floatType)
+        ## Vector indicating whether each state is of *activation* (True) or
+        ## *inactivation* (False) type.
+        self.activation = np.array(activation, dtype = bool)
+
+        ## Indicates whether the states are evaluated lazily, in closed form, from the
+        ## instant and the value of their last change (see LazyPulseConductanceState).
+        ## It is True when the StateType parameter is lazyPulse.
+        self.lazy = stateTypes == set(['lazyPulse'])
+        if self.lazy:
+            ## Vector with the rate \f$\alpha\f$, in 1/ms, of each state.
+            self.alpha_ms1 = np.array(alpha, dtype = float)
+            ## Vector with the rate \f$\beta\f$, in 1/ms, of each state.
+            self.beta_ms1 = np.array(beta, dtype = float)
+            ## Vector with the instant, in ms, of the last change of each state.
+            self.t0_ms = np.array(t0, dtype = float)
+            ## Vector with the value of each state at its last change.
+            self.v0 = np.array(v0, dtype = float)
+            ## Vector with the instant, in ms, from which each state is considered settled.
+            self.tSettle_ms = np.zeros_like(self.value, dtype = float)
+            ## Vector indicating whether the value of each state is already at its asymptotic value.
+            self.settled = np.zeros_like(self.state)
+            self.computeSettleTime(np.arange(len(self.value)))
+            self.computeStateValue = self.computeStateValueLazy
+
+        ## List with the kinds of channels in the pool (Na, Kf, Ks, KsAxon, Nap, H).
+        self.channelKinds = sorted(channelComp.keys())
+        ## Dictionary with the compartment index of each channel, grouped by channel kind.
+        self.channelComp = dict()
+        ## Dictionary with the maximal conductance, in \f$\mu\f$S, of each channel, grouped by channel kind.
+        self.channelGmax_muS = dict()
+        ## Dictionary with the equilibrium potential, in mV, of each channel, grouped by channel kind.
+        self.channelEqPot_mV = dict()
+        ## Dictionary with the indices, in the state vectors, of the states of each channel,
+        ## grouped by channel kind.
+        self.channelStates = dict()
+        ## Dictionary with the functions that compute the gating term of each channel kind.
+        self.compGating = dict()
+        for kind in self.channelKinds:
+            self.channelComp[kind] = np.array(channelComp[kind], dtype = int)
+            self.channelGmax_muS[kind] = np.array(channelGmax[kind], dtype = conf.floatType)
+            self.channelEqPot_mV[kind] = np.array(channelEqPot[kind], dtype = conf.floatType)
+            self.channelStates[kind] = [np.array(states, dtype = int) for states in channelStates[kind]]
+            if kind == 'Kf': self.compGating[kind] = compGatingKf
+            elif kind == 'Ks': self.compGating[kind] = compGatingKs
+            elif kind == 'Na': self.compGating[kind] = compGatingNa
+            elif kind == 'Nap': self.compGating[kind] = compGatingNap
+            elif kind == 'KsAxon': self.compGating[kind] = compGatingKsaxon
+            elif kind == 'H': self.compGating[kind] = compGatingH
+
+        ## Vector with the compartment index of each state.
+        self.stateComp = np.zeros_like(self.value, dtype = int)
+        for kind in self.channelKinds:
+            for states in self.channelStates[kind]:
+                self.stateComp[states] = self.channelComp[kind]
+        ## Indices of the states of each compartment, in CSR layout: the states of the
+        ## compartment j are self.compStates[self.compStatesPtr[j]:self.compStatesPtr[j+1]].
+        self.compStates = np.argsort(self.stateComp, kind = 'mergesort')
+        self.compStatesPtr = np.searchsorted(self.stateComp[self.compStates],
+                                             np.arange(self.totalNumberOfCompartments + 1))
+
+        ## Sum of the conductances, in \f$\mu\f$S, of the ionic channels of each compartment.
+        self.gTotal_muS = np.zeros((self.totalNumberOfCompartments), dtype = conf.floatType)
+        ## Sum of the products of the conductances and the equilibrium potentials, in nA, of the
+        ## ionic channels of each compartment.
+        self.gEqPot_nA = np.zeros_like(self.gTotal_muS)
+        ## Vector with the ionic currents, in nA, of each compartment.
+        self.iIonic = np.zeros_like(self.gTotal_muS)
+
+        ## Vector with the indices of the compartments evaluated by the computeActiveCurrent and
+        ## atualizeActiveChannels methods (see the setActiveCompartments method).
+        self.activeComp = np.arange(self.totalNumberOfCompartments)
+        self.setActiveCompartments(self.activeComp)
+
+        if conf.gatingUpdate == 'step':
+            self.computeCurrent = self.computeCurrentFixedStates
+
+    def computeStateValue(self, t):
+        '''
+        Compute the value of all the states of the pool, with the approximation of
+        Destexhe (1997). It is the vectorized version of the computeStateValueActivation and
+        computeStateValueInactivation methods of the PulseConductanceState class.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        expired = self.state & (t > self.endOfPulse_ms)
+        if expired.any():
+            self.state[expired] = False
+            self.endOfPulse_ms[expired] = self.PulseDur_ms[expired] + t
+
+        self.value = np.where(self.state == self.activation,
+                              (self.value - 1) * self.AlphaExp + 1,
+                              self.value * self.BetaExp)
+
+    def closedFormValue(self, states, t):
+        '''
+        Computes, in closed form, the value of a set of states at the instant **t**, 
+        from their last change of state. Used when the states are evaluated lazily.
+
+        - Inputs:
+            + **states**: vector with the indices of the states.
+
+            + **t**: instant (or vector of instants), in ms.
+
+        The value of the states going to 1 is computed with compValOff and the value of the
+        states going to 0 with compValOn (see PulseConductanceState).
+        '''
+        growing = self.state[states] == self.activation[states]
+        decay = np.exp(np.where(growing, self.alpha_ms1[states], self.beta_ms1[states])
+                       * (self.t0_ms[states] - t))
+        value = np.where(growing, 1.0 + (self.v0[states] - 1.0) * decay, self.v0[states] * decay)
+        return np.where(t >= self.tSettle_ms[states], growing.astype(float), value)
+
+    def computeSettleTime(self, states):
+        '''
+        Computes the instant from which each state of a set of states is considered settled
+        (see compSettleTime in LazyPulseConductanceState).
+
+        - Inputs:
+            + **states**: vector with the indices of the states.
+        '''
+        growing = self.state[states] == self.activation[states]
+        distance = np.abs(self.v0[states] - growing)
+        rate = np.where(growing, self.alpha_ms1[states], self.beta_ms1[states])
+        with np.errstate(divide = 'ignore'):
+            tSettle = self.t0_ms[states] + np.log(np.maximum(distance, settleTolerance) / settleTolerance) / rate
+        self.tSettle_ms[states] = np.where(distance <= settleTolerance, self.t0_ms[states], 
+                                           np.where(rate > 0, tSettle, np.inf))
+        self.settled[states] = False
+
+    def computeStateValueLazy(self, t):
+        '''
+        Compute the value of the states of the pool in closed form. Only the states that
+        did not reach their asymptotic value are computed.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        expired = self.state & (t > self.endOfPulse_ms)
+        if expired.any():
+            states = np.flatnonzero(expired)
+            tEnd = self.endOfPulse_ms[states]
+            self.v0[states] = self.closedFormValue(states, tEnd)
+            self.t0_ms[states] = tEnd
+            self.state[states] = False
+            self.endOfPulse_ms[states] = self.PulseDur_ms[states] + t
+            self.computeSettleTime(states)
+
+        states = np.flatnonzero(np.logical_not(self.settled))
+        if len(states):
+            self.value[states] = self.closedFormValue(states, t)
+            self.settled[states] = t >= self.tSettle_ms[states]
+
+    def computeConductance(self):
+        '''
+        Computes, for each compartment, the sum of the conductances of the ionic channels
+        (gTotal_muS) and the sum of the products of the conductances and the equilibrium
+        potentials (gEqPot_nA), with the current values of the states.
+        '''
+        self.gTotal_muS.fill(0.0)
+        self.gEqPot_nA.fill(0.0)
+        for kind in self.channelKinds:
+            g = self.channelGmax_muS[kind] * self.compGating[kind](self.value, self.channelStates[kind])
+            # Each compartment has at most one channel of each kind.
+            self.gTotal_muS[self.channelComp[kind]] += g
+            self.gEqPot_nA[self.channelComp[kind]] += g * self.channelEqPot_mV[kind]
+
+    def computeCurrent(self, t, V_mV):
+        '''
+        Computes the ionic currents of all the compartments of the pool.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V_mV**: vector with the membrane potential, in mV, of all the compartments of the pool.
+
+        - Outputs:
+            + Vector with the ionic current, in nA, of each compartment.
+
+        The current of each compartment is computed as:
+
+        \f{equation}{
+            I = \limits\sum_k g_k(E_k-V) = \limits\sum_k g_kE_k - V\limits\sum_k g_k
+        \f}
+        where \f$g_k\f$ and \f$E_k\f$ are the conductance and the equilibrium potential of the
+        channel \f$k\f$ of the compartment.
+        '''
+        self.computeStateValue(t)
+        self.computeConductance()
+        np.subtract(self.gEqPot_nA, self.gTotal_muS * V_mV, self.iIonic)
+        return self.iIonic
+
+    def atualizeChannels(self, t):
+        '''
+        Updates the states and the conductances of all the channels. It is called once
+        per time step when the gatingUpdate parameter is step.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        self.computeStateValue(t)
+        self.computeConductance()
+
+    def computeCurrentFixedStates(self, t, V_mV):
+        '''
+        Computes the ionic currents of all the compartments of the pool with the
+        conductances computed by the last call of atualizeChannels.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V_mV**: vector with the membrane potential, in mV, of all the compartments of the pool.
+
+        - Outputs:
+            + Vector with the ionic current, in nA, of each compartment.
+        '''
+        np.subtract(self.gEqPot_nA, self.gTotal_muS * V_mV, self.iIonic)
+        return self.iIonic
+
+    def setActiveCompartments(self, comps):
+        '''
+        Chooses the compartments evaluated by the computeActiveCurrent and atualizeActiveChannels
+        methods, used when the motor units at rest are skipped (quiescentUnits parameter). The
+        states of the other compartments are kept constant.
+
+        - Inputs:
+            + **comps**: vector with the indices, in increasing order, of the compartments.
+        '''
+        self.activeComp = comps
+        active = np.zeros((self.totalNumberOfCompartments), dtype = bool)
+        active[comps] = True
+        ## Vector with the indices of the states of the active compartments.
+        self.activeStates = np.flatnonzero(active[self.stateComp])
+        ## Dictionaries, grouped by channel kind, with the indices (in the vectors of the kind) of
+        ## the channels of the active compartments, and with their compartments and states.
+        self.activeChannels = dict()
+        self.activeChannelComp = dict()
+        self.activeChannelStates = dict()
+        for kind in self.channelKinds:
+            channels = np.flatnonzero(active[self.channelComp[kind]])
+            self.activeChannels[kind] = channels
+            self.activeChannelComp[kind] = self.channelComp[kind][channels]
+            self.activeChannelStates[kind] = [states[channels] for states in self.channelStates[kind]]
+
+    def computeActiveStateValue(self, t):
+        '''
+        Computes the value of the states of the active compartments (see the
+        setActiveCompartments method), in the same way as the computeStateValue and 
+        computeStateValueLazy methods.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        active = self.activeStates
+        expired = active[self.state[active] & (t > self.endOfPulse_ms[active])]
+        if len(expired):
+            if self.lazy:
+                tEnd = self.endOfPulse_ms[expired]
+                self.v0[expired] = self.closedFormValue(expired, tEnd)
+                self.t0_ms[expired] = tEnd
+            self.state[expired] = False
+            self.endOfPulse_ms[expired] = self.PulseDur_ms[expired] + t
+            if self.lazy:
+                self.computeSettleTime(expired)
+
+        if self.lazy:
+            states = active[np.logical_not(self.settled[active])]
+            if len(states):
+                self.value[states] = self.closedFormValue(states, t)
+                self.settled[states] = t >= self.tSettle_ms[states]
+        else:
+            value = self.value[active]
+            self.value[active] = np.where(self.state[active] == self.activation[active],
+                                          (value - 1) * self.AlphaExp[active] + 1,
+                                          value * self.BetaExp[active])
+
+    def computeActiveConductance(self):
+        '''
+        Computes gTotal_muS and gEqPot_nA (see the computeConductance method) of the active 
+        compartments.
+        '''
+        self.gTotal_muS[self.activeComp] = 0.0
+        self.gEqPot_nA[self.activeComp] = 0.0
+        for kind in self.channelKinds:
+            channels = self.activeChannels[kind]
+            if not len(channels): continue
+            g = self.channelGmax_muS[kind][channels] * self.compGating[kind](self.value, self.activeChannelStates[kind])
+            self.gTotal_muS[self.activeChannelComp[kind]] += g
+            self.gEqPot_nA[self.activeChannelComp[kind]] += g * self.channelEqPot_mV[kind][channels]
+
+    def atualizeActiveChannels(self, t):
+        '''
+        Updates the states and the conductances of the channels of the active compartments.
+        It is the version of the atualizeChannels method used when the motor units at rest
+        are skipped.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        self.computeActiveStateValue(t)
+        self.computeActiveConductance()
+
+    def computeActiveCurrent(self, t, V_mV):
+        '''
+        Computes the ionic currents of the active compartments. It is the version of the
+        computeCurrent method used when the motor units at rest are skipped.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V_mV**: vector with the membrane potential, in mV, of the active compartments.
+
+        - Outputs:
+            + Vector with the ionic current, in nA, of each active compartment.
+        '''
+        if self.conf.gatingUpdate != 'step':
+            self.computeActiveStateValue(t)
+            self.computeActiveConductance()
+        return self.gEqPot_nA[self.activeComp] - self.gTotal_muS[self.activeComp] * V_mV
+
+    def unsettledCompartments(self, tolerance):
+        '''
+        Indicates the compartments with at least one state during a pulse or
+        farther than **tolerance** from its asymptotic value.
+
+        - Inputs:
+            + **tolerance**: distance from the asymptotic value below which a state
+            is considered settled.
+
+        - Outputs:
+            + Boolean vector with one element for each compartment of the pool.
+        '''
+        unsettled = self.state | (np.abs(self.value - (self.state == self.activation)) > tolerance)
+        return np.bincount(self.stateComp[unsettled],
+                           minlength = self.totalNumberOfCompartments) > 0
+
+    def changeCompartmentState(self, t, comp):
+        '''
+        Modify the current situation (true/false) of all the states of a compartment.
+        It is the same as calling the changeState method of all the states of the compartment.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **comp**: integer with the index of the compartment in the pool.
+        '''
+        self.toggleStates(t, self.compStates[self.compStatesPtr[comp]:self.compStatesPtr[comp+1]])
+
+    def changeState(self, t, compMask):
+        '''
+        Modify the current situation (true/false) of all the states of a set of compartments.
+
+        - Inputs:
+            + **t**: current instant, in ms, or vector with the instant of the change
+            of each compartment of the pool.
+
+            + **compMask**: boolean vector, with one element for each compartment of the pool,
+            indicating the compartments that have their states changed.
+        '''
+        states = np.flatnonzero(compMask[self.stateComp])
+        if np.ndim(t): t = t[self.stateComp[states]]
+        self.toggleStates(t, states)
+
+    def toggleStates(self, t, states):
+        '''
+        Modify the current situation (true/false) of a set of states, in the same way
+        as the changeState method of the PulseConductanceState class.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **states**: vector with the indices of the states.
+        '''
+        if self.lazy:
+            self.v0[states] = self.closedFormValue(states, t)
+            self.t0_ms[states] = t
+        self.state[states] = np.logical_not(self.state[states])
+        self.endOfPulse_ms[states] = self.PulseDur_ms[states] + t
+        if self.lazy:
+            self.computeSettleTime(states)
+
+    def reset(self):
+        '''
+        Reset the states in the same way as the reset method of the PulseConductanceState class.
+        '''
+        self.value.fill(0.0)
+        self.endOfPulse_ms[:] = self.PulseDur_ms
+        self.iIonic.fill(0.0)
+        if self.lazy:
+            self.t0_ms.fill(0.0)
+            self.v0.fill(0.0)
+            self.computeSettleTime(np.arange(len(self.value)))
@@ -49,6 +49,36 @@ def calcGLeak(area, specificRes):
     '''
     return (1e6 * area) / specificRes
 
+def compSpikeTime(t, vBefore, vAfter, threshold, timeStep):
+    '''
+    Computes the instant of the threshold crossing of the membrane potential
+    during a time step.
+
+    - Inputs:
+        + **t**: instant, in ms, of the beginning of the time step.
+
+        + **vBefore**: membrane potential, in mV, at the beginning of the time step.
+
+        + **vAfter**: membrane potential, in mV, at the end of the time step.
+
+        + **threshold**: threshold, in mV.
+
+        + **timeStep**: time step, in ms.
+
+    - Output:
+        + Instant of the crossing, in ms.
+
+    It is computed by linear interpolation:
+
+    \f{equation}{
+        t_s = t + \Delta t\frac{V_{th} - V(t)}{V(t+\Delta t) - V(t)}
+    \f}
+    If the membrane potential is already above the threshold at the beginning of
+    the time step, the instant is \f$t\f$.
+    '''
+    if vBefore >= threshold: return t
+    return t + timeStep * (threshold - vBefore) / (vAfter - vBefore)
+
 class Compartment(object):
     '''
     Class that implements a neural compartment. For now it is implemented
@@ -155,6 +185,33 @@ class Compartment(object):
         
         return I
 
+    def computeChannelCurrent(self, t, V_mV):
+        '''
+        Computes the currents of the ionic channels of the compartment. It is used
+        when the synaptic currents are computed by a SynapseEngine object.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V_mV**: membrane potential, in mV.
+        '''
+        I = 0.0
+
+        for i in xrange(0, self.numberChannels): I += self.Channels[i].computeCurrent(t, V_mV)
+
+        return I
+
+    def atualizeChannels(self, t):
+        '''
+        Updates the states of all the ionic channels of the compartment. It is
+        used when the states are updated once per time step (gatingUpdate
+        parameter equal to step).
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        for i in xrange(0, self.numberChannels): self.Channels[i].atualizeChannel(t)
+
     def reset(self):
         '''
 
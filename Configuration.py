@@ -49,6 +49,13 @@ The version to which this documentation  refers is from a Python program that ca
 '''
 
 import numpy as np
+import math
+import zlib
+from Expression import compileExpression
+
+## Tolerance, as a fraction of the time step, of the conversion of instants to time steps
+## (see Configuration.tick), for the rounding errors of the instants.
+tickTolerance = 1e-3
 
 class Configuration(object):
     '''
@@ -72,6 +79,85 @@ class Configuration(object):
         self.confArray = open(filename,'r') 
         # This array will store all the contents of the configuration file
         self.confArray = np.genfromtxt(self.confArray, comments='%', dtype = ['S42', 'S60', 'S21'], delimiter = ',') 
+        ## Dictionary with the rows of confArray of each parameter tag (first column of the rmto file),
+        ## in the order of the file. It is built once, so the parameters are found in constant time.
+        self.parameterIndex = dict()
+        ## Dictionary with the rows of confArray of the parameters that have a range along the units,
+        ## whose tags have the form tag:pool-kind. The keys are (tag, pool) and the elements are the 
+        ## rows, in the order of the file.
+        self.unitParameterIndex = dict()
+        for i in xrange(0, len(self.confArray)):
+            name = self.confArray[i][0]
+            self.parameterIndex.setdefault(name, []).append(i)
+            tag, colon, poolKind = name.rpartition(':')
+            pool, dash, kind = poolKind.rpartition('-')
+            if colon and dash and kind in ['', 'S', 'FR', 'FF']:
+                self.unitParameterIndex.setdefault((tag, pool), []).append(i)
+        ## Dictionary with the synapses made by each neural source (see the determineSynapses method).
+        self.synapsesOut = dict()
+        ## Dictionary with the vectors of the parameters with a range along the units, with keys
+        ## (tag, pool) (see the parameterVector method).
+        self.parameterVectors = dict()
+
+        ## String with the implementation of the ionic channels of the motor unit pools. It can be
+        ## *pool* (all the channels of the pool in flat arrays, see ChannelEngine class) or 
+        ## *objects* (one ChannelConductance object per channel). The default is *pool*.
+        self.channelEngine = 'pool'
+        ## String with the implementation of the synapses of the motor unit and interneuron pools.
+        ## It can be *pool* (all the synapses of the pool in flat arrays, see SynapseEngine class)
+        ## or *objects* (the computeCurrent method of each Synapse object). The default is *pool*.
+        self.synapseEngine = 'pool'
+        ## String indicating when the states of the ionic channels are updated. It can be
+        ## *stage* (at each evaluation of the derivative of the membrane potential, four times
+        ## per Runge-Kutta step) or *step* (once per time step, with the states kept constant
+        ## during the stages of the integration of the membrane potential). The default is *stage*.
+        self.gatingUpdate = 'stage'
+        ## String with the method of integration of the membrane potential of the motor unit pools.
+        ## It can be *RK4* (explicit fourth-order Runge-Kutta), *backwardEuler* or *CrankNicolson*
+        ## (implicit, see CableSolver class) or *exponential* (exact propagator of the passive part
+        ## with operator splitting, see PassivePropagator class). With the methods other than RK4 the
+        ## states of the ionic channels are updated once per time step. The implicit methods treat
+        ## the conductances of the ionic channels implicitly only with the channelEngine *pool*; with
+        ## *objects* the channel currents are explicit. The default is *RK4*.
+        self.integrationMethod = 'RK4'
+        ## String indicating how the motor units at rest are treated. It can be *integrate* (all the
+        ## motor units are integrated at every time step) or *skip* (the motor units at rest, with no
+        ## input and with the ionic channels and synapses settled, keep their membrane potential and
+        ## are not integrated until they are woken by an input). With the *RK4* integration
+        ## method only the compartments of the other motor units are evaluated and integrated; with
+        ## the other methods all the compartments are solved and the potential of the motor units
+        ## at rest is restored. The default is *integrate*.
+        self.quiescentUnits = 'integrate'
+        ## String indicating how the instants of the spikes of the motor units and interneurons are
+        ## computed. It can be *step* (the instant of the time step in which the membrane potential 
+        ## is above the threshold) or *interpolated* (the instant of the threshold crossing, linearly
+        ## interpolated inside the time step). The default is *step*.
+        self.spikeTiming = 'step'
+        ## String with the backend of the product of the conductance matrix of the pools and the 
+        ## membrane potential. It can be *csr*, *bsr*, *dia*, *stencil*, *mkl* (see CouplingMatrix class)
+        ## or *auto* (the fastest backend, measured when the pool is built). The default is *auto*.
+        self.spmvBackend = 'auto'
+        ## String with the floating-point precision of the vectors of the simulation (membrane
+        ## potentials, ionic channel states and conductances, synaptic conductances and muscle
+        ## forces). It can be *double* (64 bits) or *single* (32 bits). The instants 
+        ## (pulse ends, spike times) and the activation signal filter, whose gain is too sensitive
+        ## to the rounding of its coefficients, are always in double precision. In a 60 ms 
+        ## simulation of 300 motor units, *single* gave the same spike times as *double* with the 
+        ## step spikeTiming and spike times within 0.001 ms with the interpolated spikeTiming (the
+        ## differences grow along the simulation as the round-off errors accumulate), and a muscle
+        ## force within 1e-7 of its peak value. The default is *double*.
+        self.precision = 'double'
+        ## Integer with the seed of the random numbers drawn to build the system, such as the noise
+        ## added to the parameters of the units (see the parameterVector method). The same seed
+        ## gives the same system. The default is 0.
+        self.seed = 0
+        ## String with the directory where the pools already built are kept, to be read again
+        ## instead of being built (see the BuildCache class). If empty, the pools are always
+        ## built. The default is empty.
+        self.buildCache = ''
+        ## Integer with the number of processes that build the units of each pool (see the
+        ## buildUnits function). If 0, one process per processor is used. The default is 1.
+        self.buildProcesses = 1
         
         for i in xrange(0, len(self.confArray)):
             if self.confArray[i][0] == 'timeStep':
@@ -95,10 +181,56 @@ class Configuration(object):
             if self.confArray[i][0] == 'MUParameterDistribution':
                 ## Distribution of the parameters along the motor units.
                 self.MUParameterDistribution = self.confArray[i][1]
+            if self.confArray[i][0] == 'channelEngine':
+                self.channelEngine = self.confArray[i][1]
+            if self.confArray[i][0] == 'synapseEngine':
+                self.synapseEngine = self.confArray[i][1]
+            if self.confArray[i][0] == 'gatingUpdate':
+                self.gatingUpdate = self.confArray[i][1]
+            if self.confArray[i][0] == 'integrationMethod':
+                self.integrationMethod = self.confArray[i][1]
+            if self.confArray[i][0] == 'quiescentUnits':
+                self.quiescentUnits = self.confArray[i][1]
+            if self.confArray[i][0] == 'spikeTiming':
+                self.spikeTiming = self.confArray[i][1]
+            if self.confArray[i][0] == 'spmvBackend':
+                self.spmvBackend = self.confArray[i][1]
+            if self.confArray[i][0] == 'precision':
+                self.precision = self.confArray[i][1]
+            if self.confArray[i][0] == 'seed':
+                self.seed = int(self.confArray[i][1])
+            if self.confArray[i][0] == 'buildCache':
+                self.buildCache = self.confArray[i][1]
+            if self.confArray[i][0] == 'buildProcesses':
+                self.buildProcesses = int(self.confArray[i][1])
+        ## Floating-point type (numpy.float64 or numpy.float32) of the vectors of the simulation,
+        ## according to the precision parameter.
+        if self.precision == 'single':
+            self.floatType = np.float32
+        else:
+            self.floatType = np.float64
         ## The variable  timeStep divided by two, for computational efficiency.
         self.timeStepByTwo_ms = self.timeStep_ms / 2.0; 
         ## The variable  timeStep divided by six, for computational efficiency.
         self.timeStepBySix_ms = self.timeStep_ms / 6.0; 
+        ## Dictionary with the nerve stimulus of each nerve and pool (see the nerveStimulus method),
+        ## with the parameters used to generate it.
+        self.nerveStimuli = dict()
+
+    def tick(self, t):
+        '''
+        Converts an instant to an integer number of time steps. The events of the
+        simulation (spikes in the nerve, activation of the muscle...) are stored in time
+        steps, so they are matched by comparing integers.
+
+        - Inputs:
+            + **t**: instant, in ms.
+
+        - Output:
+            + Integer with the index of the last time step at or before **t**. The instants
+            less than tickTolerance time steps before a time step are considered in that time step.
+        '''
+        return int(math.floor(t / self.timeStep_ms + tickTolerance))
         
         
     def parameterSet(self, paramTag, pool, index):
@@ -121,54 +253,67 @@ class Configuration(object):
     
     + required parameter value
         '''
-        #get 
-        
+        rows = self.parameterIndex.get(paramTag)
+        if rows and self.confArray[0][2] == '':
+            return self.confArray[rows[0]][1]
+        return self.parameterVector(paramTag, pool)[index]
+
+    def parameterVector(self, paramTag, pool):
+        '''
+        Returns the values of a parameter that has a range along the units of a pool (the rows 
+        paramTag:pool-kind of the rmto file), with one element per unit. The vector is computed 
+        only once for each parameter and pool, so the units of a pool are built in linear time. 
+        The random numbers of the vector are drawn from a generator seeded with the seed
+        parameter and the name of the parameter, so they do not depend on the order in which the
+        parameters are read.
+
+        - Inputs:
+            + **paramTag**: string with the name of the parameter, without the pool.
+
+            + **pool**: pool of the units. For example SOL.
+
+        - Outputs:
+            + read-only vector with the parameter value of each unit of the pool.
+        '''
+        if (paramTag, pool) in self.parameterVectors:
+            return self.parameterVectors[paramTag, pool]
+        randomState = self.randomState(paramTag, pool)
+
         if pool == 'SOL' or pool == 'MG' or pool == 'LG' or pool == 'TA':
-            for i in xrange(0, len(self.confArray)):
-                if self.confArray[i][0] == 'MUnumber_' + pool + '-S':
-                    MUnumber_S = int(self.confArray[i][1])
-                elif self.confArray[i][0] == 'MUnumber_' + pool + '-FR':
-                    MUnumber_FR = int(self.confArray[i][1])
-                elif self.confArray[i][0] == 'MUnumber_' + pool + '-FF':
-                    MUnumber_FF = int(self.confArray[i][1])
+            MUnumber_S = int(self.confArray[self.parameterIndex['MUnumber_' + pool + '-S'][-1]][1])
+            MUnumber_FR = int(self.confArray[self.parameterIndex['MUnumber_' + pool + '-FR'][-1]][1])
+            MUnumber_FF = int(self.confArray[self.parameterIndex['MUnumber_' + pool + '-FF'][-1]][1])
             Nnumber = MUnumber_S + MUnumber_FR + MUnumber_FF 
-        else:
-            for i in xrange(0, len(self.confArray)):
-                if self.confArray[i][0] == 'Number_' + pool:
-                    Nnumber = int(self.confArray[i][1])
+        elif 'Number_' + pool in self.parameterIndex:
+            Nnumber = int(self.confArray[self.parameterIndex['Number_' + pool][-1]][1])
                     
                     
         paramVec_S, paramVec_FR, paramVec_FF, paramVec = np.array([]),np.array([]), np.array([]), np.array([])
 
-        
-        for i in xrange(0, len(self.confArray)):
-            if self.confArray[i][0] == paramTag:
-                if (self.confArray[0][2] == ''):                       
-                    return self.confArray[i][1]
-            else:
-                if self.MUParameterDistribution == 'linear':       
-                    if self.confArray[i][0] == paramTag + ':' + pool + '-S':
-                        paramVec_S = np.linspace(float(self.confArray[i][1]), float(self.confArray[i][2]), MUnumber_S)
-                        paramVec_S = paramVec_S + np.random.randn(len(paramVec_S))
-                        paramVec = paramVec_S
-                    elif self.confArray[i][0] == paramTag + ':' + pool + '-FR':
-                        paramVec_FR = np.linspace(float(self.confArray[i][1]), float(self.confArray[i][2]), MUnumber_FR)
-                    elif self.confArray[i][0] == paramTag + ':' + pool + '-FF':
-                        paramVec_FF = np.linspace(float(self.confArray[i][1]), float(self.confArray[i][2]), MUnumber_FF)
-                    elif self.confArray[i][0] == paramTag + ':' + pool + '-':
-                        paramVec = np.linspace(float(self.confArray[i][1]), float(self.confArray[i][2]), Nnumber)                    
-                elif self.MUParameterDistribution == 'exponential':           
-                    if self.confArray[i][0] == paramTag + ':' + pool + '-S':
-                        paramVec_S = np.array([float(self.confArray[i][1]), float(self.confArray[i][2])])
-                    elif self.confArray[i][0] == paramTag + ':' + pool + '-FR':
-                        paramVec_FR = np.array([float(self.confArray[i][1]), float(self.confArray[i][2])])
-                    elif self.confArray[i][0] == paramTag + ':' + pool + '-FF':
-                        paramVec_FF = np.array([float(self.confArray[i][1]), float(self.confArray[i][2])])
-                    elif self.confArray[i][0] == paramTag + ':' + pool + '-':
-                        try:
-                            paramVec = float(self.confArray[i][1])*np.exp(1.0/Nnumber*np.log(float(self.confArray[i][2])/float(self.confArray[i][1])) * np.linspace(0,Nnumber,Nnumber))
-                        except ZeroDivisionError:
-                            paramVec = np.exp(1.0/Nnumber*np.log(float(self.confArray[i][2]) + 1) * np.linspace(0,Nnumber,Nnumber)) - 1
+        for i in self.unitParameterIndex.get((paramTag, pool), []):
+            if self.MUParameterDistribution == 'linear':       
+                if self.confArray[i][0] == paramTag + ':' + pool + '-S':
+                    paramVec_S = np.linspace(float(self.confArray[i][1]), float(self.confArray[i][2]), MUnumber_S)
+                    paramVec_S = paramVec_S + randomState.randn(len(paramVec_S))
+                    paramVec = paramVec_S
+                elif self.confArray[i][0] == paramTag + ':' + pool + '-FR':
+                    paramVec_FR = np.linspace(float(self.confArray[i][1]), float(self.confArray[i][2]), MUnumber_FR)
+                elif self.confArray[i][0] == paramTag + ':' + pool + '-FF':
+                    paramVec_FF = np.linspace(float(self.confArray[i][1]), float(self.confArray[i][2]), MUnumber_FF)
+                elif self.confArray[i][0] == paramTag + ':' + pool + '-':
+                    paramVec = np.linspace(float(self.confArray[i][1]), float(self.confArray[i][2]), Nnumber)                    
+            elif self.MUParameterDistribution == 'exponential':           
+                if self.confArray[i][0] == paramTag + ':' + pool + '-S':
+                    paramVec_S = np.array([float(self.confArray[i][1]), float(self.confArray[i][2])])
+                elif self.confArray[i][0] == paramTag + ':' + pool + '-FR':
+                    paramVec_FR = np.array([float(self.confArray[i][1]), float(self.confArray[i][2])])
+                elif self.confArray[i][0] == paramTag + ':' + pool + '-FF':
+                    paramVec_FF = np.array([float(self.confArray[i][1]), float(self.confArray[i][2])])
+                elif self.confArray[i][0] == paramTag + ':' + pool + '-':
+                    try:
+                        paramVec = float(self.confArray[i][1])*np.exp(1.0/Nnumber*np.log(float(self.confArray[i][2])/float(self.confArray[i][1])) * np.linspace(0,Nnumber,Nnumber))
+                    except ZeroDivisionError:
+                        paramVec = np.exp(1.0/Nnumber*np.log(float(self.confArray[i][2]) + 1) * np.linspace(0,Nnumber,Nnumber)) - 1
         
         if self.MUParameterDistribution == 'linear':           
             if paramVec_FR.size > 0:
@@ -187,7 +332,24 @@ class Configuration(object):
                                 + paramVec_FF[1]) 
                 
         
-        return paramVec[index]
+        paramVec.flags.writeable = False
+        self.parameterVectors[paramTag, pool] = paramVec
+        return paramVec
+
+    def randomState(self, *names):
+        '''
+        Returns a generator of random numbers (numpy.random.RandomState) seeded with the seed
+        parameter and a list of names, such as the pool and the index of a unit. The same 
+        names give always the same random numbers, independently of the order in which the
+        objects of the system are built.
+
+        - Inputs:
+            + **names**: strings that identify the generator.
+
+        - Output:
+            + numpy.random.RandomState object.
+        '''
+        return np.random.RandomState([self.seed, zlib.crc32(':'.join(names)) & 0xffffffff])
 
     def inputFunctionGet(self, function):
         '''
@@ -195,16 +357,69 @@ class Configuration(object):
         It is used to obtain before the simulation run all the values of the inputs.
 
         - Inputs:
-            + **function**: function from which is desired to obtain its values  during the simulation duration.
+            + **function**: function from which is desired to obtain its values  during the simulation duration,
+            or string with an expression of t (see the Expression class).
         
         - Output:
             + narray with the function values for each instant.
         '''
-        
+        if isinstance(function, str):
+            function = compileExpression(function)
         t = np.arange(0, self.simDuration_ms, self.timeStep_ms)        
         return function(t)
         
      
+    def nerveStimulus(self, nerve, pool):
+        '''
+        Returns the current, in mA, of the electrical stimulus of a nerve at each time step of the
+        simulation. The stimulus is a train of pulses with intensity stimIntensity and duration
+        stimPulseDuration, from stimStart to stimStop. The frequency of the pulses is stimFrequency
+        plus, between stimModulationStart and stimModulationStop, the function stimModulation of t.
+
+        The stimulus is the same for all the units of a pool, so it is generated once and the
+        same vector is returned to all of them. It is generated again only when one of
+        its parameters is changed (with the changeConfigurationParameter method, for example).
+
+        - Inputs:
+            + **nerve**: string with the nerve (*PTN* or *CPN*).
+
+            + **pool**: string with the pool of the units.
+
+        - Output:
+            + read-only vector with the stimulus, in mA, at each time step.
+        '''
+        parameters = tuple([self.parameterSet(name + '_' + nerve, pool, 0)
+                            for name in ['stimFrequency', 'stimPulseDuration', 'stimIntensity',
+                                         'stimStart', 'stimStop', 'stimModulationStart',
+                                         'stimModulationStop', 'stimModulation']])
+        if (nerve, pool) in self.nerveStimuli and self.nerveStimuli[nerve, pool][0] == parameters:
+            return self.nerveStimuli[nerve, pool][1]
+        
+        meanFrequency_Hz, pulseDuration_ms, intensity_mA, start_ms, stop_ms, modulationStart_ms, modulationStop_ms = [float(value) for value in parameters[:-1]]
+
+        steps = np.arange(int(np.rint(self.simDuration_ms / self.timeStep_ms)))
+        t = steps * self.timeStep_ms
+        frequency_Hz = np.full(len(t), meanFrequency_Hz)
+        modulated = (t > modulationStart_ms) & (t < modulationStop_ms) & (t >= start_ms) & (t <= stop_ms)
+        if modulated.any():
+            frequency_Hz[modulated] += compileExpression(parameters[-1])(t[modulated])
+
+        pulse = (t >= start_ms) & (t <= stop_ms) & (frequency_Hz > 0)
+        numberOfSteps = np.rint(1000.0 / frequency_Hz[pulse] / self.timeStep_ms).astype(int)
+        pulse[pulse] = (steps[pulse] - int(np.rint(start_ms / self.timeStep_ms))) % numberOfSteps == 0
+        # Each pulse adds one at its beginning and subtracts one at its end.
+        begin = np.flatnonzero(pulse)
+        end = np.rint(begin + pulseDuration_ms / self.timeStep_ms).astype(int)
+        begin, end = begin[end > begin], end[end > begin]
+        edges = np.zeros(len(t) + 1, dtype = int)
+        np.add.at(edges, begin, 1)
+        np.add.at(edges, np.minimum(end, len(t)), -1)
+        stimulus_mA = np.where(np.cumsum(edges[:-1]) > 0, intensity_mA, 0.0)
+        stimulus_mA.flags.writeable = False
+        
+        self.nerveStimuli[nerve, pool] = (parameters, stimulus_mA)
+        return stimulus_mA
+
     def determineSynapses(self, neuralSource):
         '''
         Function used to determine all the synapses that a given pool makes. It is used in the SynapsesFactory class.
@@ -215,6 +430,8 @@ class Configuration(object):
 - Outputs:
     + array of strings with all the synapses target that the neuralSource will make.
         '''
+        if neuralSource in self.synapsesOut:
+            return [list(synapse) for synapse in self.synapsesOut[neuralSource]]
         Synapses = []
 
         for i in xrange(0, len(self.confArray)):
@@ -227,13 +444,24 @@ class Configuration(object):
                                  self.confArray[i][0][posUnitKind+1:posComp],
                                  self.confArray[i][0][posComp+1:posKind],
                                  self.confArray[i][0][posKind+1:]])
-        return Synapses
+        self.synapsesOut[neuralSource] = Synapses
+        return [list(synapse) for synapse in Synapses]
     
     def changeConfigurationParameter(self, parameter, value1, value2):
         '''
+        Changes the values of a parameter.
+
+        - Inputs:
+            + **parameter**: string with the name of the parameter as in the first column of the rmto file.
+
+            + **value1**: new value of the second column of the rmto file.
+
+            + **value2**: new value of the third column of the rmto file.
         '''
-        for i in xrange(0, len(self.confArray)):
-            if self.confArray[i][0] == parameter:
-                self.confArray[i][1] = value1
-                self.confArray[i][2] = value2
+        for i in self.parameterIndex.get(parameter, []):
+            self.confArray[i][1] = value1
+            self.confArray[i][2] = value2
+        # The connectivity of the synapses and the parameters of the units may have changed.
+        self.synapsesOut = dict()
+        self.parameterVectors = dict()
         
\ No newline at end of file
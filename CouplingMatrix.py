@@ -0,0 +1,242 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import numpy as np
+import scipy.sparse as sparse
+from ctypes import POINTER, c_int, c_char, c_double, byref, cdll
+import time
+
+## Number of products computed by each backend in the benchmark of the auto mode.
+benchmarkRepetitions = 50
+
+
+def loadMKL():
+    '''
+    Loads the Intel MKL runtime library.
+
+    - Output:
+        + The library, or None if it is not available.
+    '''
+    try:
+        return cdll.LoadLibrary('libmkl_rt.so')
+    except OSError:
+        return None
+
+
+def blockDiagonal(blocks, offsets, size):
+    '''
+    Builds the block diagonal matrix of a pool from the matrices of its units, directly in
+    the CSR format. Only the nonzero elements of each block are visited, so the time and
+    the memory grow linearly with the number of units.
+
+    - Inputs:
+        + **blocks**: list with the matrix (dense or sparse) of each unit.
+
+        + **offsets**: index, in the pool matrix, of the first row and column of each block.
+
+        + **size**: number of rows (and columns) of the pool matrix.
+
+    - Output:
+        + Matrix, in the CSR format.
+    '''
+    rows = [np.zeros((0), dtype = int)]
+    columns = [np.zeros((0), dtype = int)]
+    values = [np.zeros((0), dtype = float)]
+    for block, offset in zip(blocks, offsets):
+        block = sparse.coo_matrix(np.atleast_2d(block) if not sparse.issparse(block) else block)
+        rows.append(block.row + offset)
+        columns.append(block.col + offset)
+        values.append(block.data)
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                             shape = (size, size), dtype = float)
+
+
+class CouplingMatrix(object):
+    '''
+    Class that computes the product of the conductance matrix of a pool (the coupling
+    between the compartments) and the vector of membrane potentials. The product can be
+    computed by different backends:
+
+    - *csr*, *bsr* and *dia*: scipy sparse matrices in the respective format.
+    - *stencil*: differences between neighbour compartments, with the three diagonals
+    of the matrix. It is available only when the matrix is tridiagonal.
+    - *mkl*: the mkl_cspblas_dcsrgemv function of the Intel MKL, if the library is present.
+
+    With the backend *auto*, the available backends are benchmarked at the construction
+    and the fastest is chosen.
+    '''
+
+    def __init__(self, conf, G, blockSize = None):
+        '''
+        Constructor
+
+        - Inputs:
+            + **conf**: Configuration object with the simulation parameters.
+
+            + **G**: sparse matrix with the conductances between the compartments of the
+            pool, in \f$\mu\f$S.
+
+            + **blockSize**: integer with the number of compartments of each unit, used by the
+            *bsr* backend. If None, the block size is chosen by scipy.
+        '''
+        self.conf = conf
+        ## Matrix in the CSR format, with the floating-point type of the simulation.
+        self.csr = sparse.csr_matrix(G, dtype = conf.floatType)
+        # The blocks of a BSR matrix store the zeros outside the diagonals.
+        self.csr.eliminate_zeros()
+        self.csr.sort_indices()
+        n = self.csr.shape[0]
+
+        if blockSize is not None and blockSize > 0 and n % blockSize == 0:
+            self.bsr = self.csr.tobsr(blocksize = (blockSize, blockSize))
+        else:
+            self.bsr = self.csr.tobsr()
+        self.dia = self.csr.todia()
+
+        offsets = self.csr.tocoo()
+        offsets = np.unique(offsets.col - offsets.row)
+        ## Indicates whether the matrix is tridiagonal (and the stencil backend is available).
+        self.tridiagonal = n > 0 and bool(np.all(np.abs(offsets) <= 1))
+        if self.tridiagonal:
+            ## Diagonal of the matrix.
+            self.diagonal = self.csr.diagonal()
+            ## Superdiagonal of the matrix (None if it is null).
+            self.upper = self.csr.diagonal(1) if 1 in offsets else None
+            ## Subdiagonal of the matrix (None if it is null).
+            self.lower = self.csr.diagonal(-1) if -1 in offsets else None
+
+        self.bindBackends()
+
+        ## String with the backend used in the product.
+        self.backend = conf.spmvBackend
+        if self.backend == 'auto':
+            self.backend = self.benchmark()
+        elif self.backend not in self.backends:
+            raise ValueError('SpMV backend ' + self.backend + ' is not available.')
+        self.dot = self.backends[self.backend]
+
+    def bindBackends(self):
+        '''
+        Loads the MKL, if it is present, and builds the dictionary with the available backends.
+        '''
+        # The MKL function is the double precision one.
+        self.mkl = loadMKL() if self.conf.floatType == np.float64 else None
+        if self.mkl is not None:
+            self.mklData = np.ascontiguousarray(self.csr.data, dtype = np.double)
+            self.mklIndptr = np.ascontiguousarray(self.csr.indptr, dtype = np.int32)
+            self.mklIndices = np.ascontiguousarray(self.csr.indices, dtype = np.int32)
+            self.mklTrans = c_char(b'N')
+            self.mklRows = c_int(self.csr.shape[0])
+
+        ## Dictionary with the available backends.
+        self.backends = dict()
+        self.backends['csr'] = self.dotCSR
+        self.backends['bsr'] = self.dotBSR
+        self.backends['dia'] = self.dotDIA
+        if self.tridiagonal: self.backends['stencil'] = self.dotStencil
+        if self.mkl is not None: self.backends['mkl'] = self.dotMKL
+
+    def __getstate__(self):
+        '''
+        State of the object to be pickled (see the BuildCache class), without the MKL library
+        and the backends, that are bound again when the object is read.
+        '''
+        state = self.__dict__.copy()
+        for name in ['mkl', 'mklData', 'mklIndptr', 'mklIndices', 'mklTrans', 'mklRows', 'backends', 'dot']:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.bindBackends()
+        # The MKL may not be present where the object is read.
+        if self.backend not in self.backends: self.backend = 'csr'
+        self.dot = self.backends[self.backend]
+
+    def benchmark(self):
+        '''
+        Measures the time of benchmarkRepetitions products with each of the available
+        backends. The backends with results different from the *csr* backend are discarded.
+
+        - Output:
+            + String with the fastest backend.
+        '''
+        V = np.random.RandomState(0).uniform(-10.0, 100.0, self.csr.shape[0]).astype(self.csr.dtype)
+        reference = self.dotCSR(V)
+        # The products are summed in different orders by the backends.
+        rtol = max(1e-10, 100 * np.finfo(self.csr.dtype).eps)
+        atol = max(1e-12, rtol * np.abs(reference).max()) if reference.size else 1e-12
+        best, bestTime = 'csr', float('inf')
+        for name in sorted(self.backends):
+            product = self.backends[name]
+            if not np.allclose(product(V), reference, rtol = rtol, atol = atol):
+                continue
+            tic = time.time()
+            for i in xrange(benchmarkRepetitions): product(V)
+            elapsed = time.time() - tic
+            if elapsed < bestTime:
+                best, bestTime = name, elapsed
+        return best
+
+    def dotCSR(self, V):
+        '''
+        Product with the matrix in the CSR format.
+        '''
+        return self.csr.dot(V)
+
+    def dotBSR(self, V):
+        '''
+        Product with the matrix in the BSR format.
+        '''
+        return self.bsr.dot(V)
+
+    def dotDIA(self, V):
+        '''
+        Product with the matrix in the DIA format.
+        '''
+        return self.dia.dot(V)
+
+    def dotStencil(self, V):
+        '''
+        Product with the three diagonals of the matrix:
+
+        \f{equation}{
+            (GV)_j = G_{j,j-1}V_{j-1} + G_{j,j}V_j + G_{j,j+1}V_{j+1}
+        \f}
+        '''
+        y = self.diagonal * V
+        if self.upper is not None: y[:-1] += self.upper * V[1:]
+        if self.lower is not None: y[1:] += self.lower * V[:-1]
+        return y
+
+    def dotMKL(self, V):
+        '''
+        Product with the mkl_cspblas_dcsrgemv function of the Intel MKL (CSR format,
+        zero-based indexing).
+        '''
+        x = np.ascontiguousarray(V, dtype = np.double)
+        y = np.empty_like(x)
+        self.mkl.mkl_cspblas_dcsrgemv(byref(self.mklTrans), byref(self.mklRows),
+                                      self.mklData.ctypes.data_as(POINTER(c_double)),
+                                      self.mklIndptr.ctypes.data_as(POINTER(c_int)),
+                                      self.mklIndices.ctypes.data_as(POINTER(c_int)),
+                                      x.ctypes.data_as(POINTER(c_double)),
+                                      y.ctypes.data_as(POINTER(c_double)))
+        return y
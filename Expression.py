@@ -0,0 +1,149 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import ast
+import numpy as np
+
+## Dictionary with the functions that can be called in the expressions and the numpy
+## functions that evaluate them. They can be preceded by np., numpy. or math.
+expressionFunctions = {'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'arcsin': np.arcsin,
+                       'asin': np.arcsin, 'arccos': np.arccos, 'acos': np.arccos,
+                       'arctan': np.arctan, 'atan': np.arctan, 'sinh': np.sinh, 'cosh': np.cosh,
+                       'tanh': np.tanh, 'exp': np.exp, 'log': np.log, 'log10': np.log10,
+                       'sqrt': np.sqrt, 'abs': np.abs, 'fabs': np.abs, 'floor': np.floor,
+                       'ceil': np.ceil, 'sign': np.sign, 'minimum': np.minimum,
+                       'maximum': np.maximum, 'where': np.where, 'mod': np.mod,
+                       'heaviside': np.heaviside}
+## Dictionary with the constants that can be used in the expressions.
+expressionConstants = {'pi': np.pi, 'e': np.e}
+## Names of the modules accepted before the functions and constants.
+expressionModules = ['np', 'numpy', 'math']
+## Types of the nodes of the syntax tree accepted in the expressions.
+expressionNodes = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name,
+                   ast.Num, ast.Load, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv,
+                   ast.Mod, ast.Pow, ast.USub, ast.UAdd, ast.Gt, ast.GtE, ast.Lt, ast.LtE,
+                   ast.Eq, ast.NotEq)
+
+## Dictionary with the Expression objects already compiled, with the text as key.
+compiledExpressions = dict()
+
+
+def compileExpression(text):
+    '''
+    Returns the Expression object of a text. Each text is compiled only once, so the
+    objects that use the same expression share the same Expression object.
+
+    - Inputs:
+        + **text**: string with the expression.
+
+    - Output:
+        + Expression object.
+    '''
+    text = text.strip()
+    if text not in compiledExpressions:
+        compiledExpressions[text] = Expression(text)
+    return compiledExpressions[text]
+
+
+class Expression(object):
+    '''
+    Class that implements a function of the time t given by a text of the configuration file,
+    such as the modulation of the frequency of the nerve stimulus or the firing rate of the
+    synaptic noise. For example, *5+0*t* or *10*np.sin(2*pi*t/1000.0)*.
+
+    The text is parsed once and only arithmetic operations, comparisons, the variable t,
+    numbers and the functions and constants of expressionFunctions and expressionConstants
+    are accepted, so the configuration file cannot execute any other code. The expression is
+    evaluated with numpy, so it is computed for all the instants of a vector at once.
+    '''
+
+    def __init__(self, text):
+        '''
+        Constructor
+
+        - Inputs:
+            + **text**: string with the expression, as a function of t (in ms).
+        '''
+        ## String with the expression.
+        self.text = text
+        try:
+            tree = ast.parse(text.strip(), mode = 'eval')
+        except SyntaxError:
+            raise ValueError('Expression ' + text + ' is not valid.')
+        tree = self.removeModules(tree)
+        for node in ast.walk(tree):
+            self.checkNode(node)
+        ## Compiled code of the expression.
+        self.code = compile(tree, '<expression>', 'eval')
+        ## Dictionary with the names that the expression can use.
+        self.namespace = {'__builtins__': {}}
+        self.namespace.update(expressionFunctions)
+        self.namespace.update(expressionConstants)
+
+    def removeModules(self, tree):
+        '''
+        Replaces the functions and constants preceded by a module (np.sin, math.pi...) by
+        their names.
+        '''
+        for node in ast.walk(tree):
+            for field, value in ast.iter_fields(node):
+                if (isinstance(value, ast.Attribute) and isinstance(value.value, ast.Name)
+                    and value.value.id in expressionModules):
+                    setattr(node, field, ast.copy_location(ast.Name(value.attr, ast.Load()), value))
+                elif isinstance(value, list):
+                    for i in xrange(len(value)):
+                        if (isinstance(value[i], ast.Attribute) and isinstance(value[i].value, ast.Name)
+                            and value[i].value.id in expressionModules):
+                            value[i] = ast.copy_location(ast.Name(value[i].attr, ast.Load()), value[i])
+        return tree
+
+    def checkNode(self, node):
+        '''
+        Raises a ValueError if a node of the syntax tree is not accepted in the expressions.
+        '''
+        if not isinstance(node, expressionNodes):
+            raise ValueError('Expression ' + self.text + ' has a forbidden element ('
+                             + type(node).__name__ + ').')
+        if isinstance(node, ast.Name) and node.id != 't' and node.id not in expressionFunctions and node.id not in expressionConstants:
+            raise ValueError('Expression ' + self.text + ' has an unknown name (' + node.id + ').')
+        if isinstance(node, ast.Call):
+            if (not isinstance(node.func, ast.Name) or node.func.id not in expressionFunctions
+                or node.keywords or getattr(node, 'starargs', None) or getattr(node, 'kwargs', None)):
+                raise ValueError('Expression ' + self.text + ' has a forbidden function call.')
+        if isinstance(node, ast.Compare) and len(node.ops) > 1:
+            raise ValueError('Expression ' + self.text + ' has a chained comparison.')
+
+    def evaluate(self, t):
+        '''
+        Evaluates the expression.
+
+        - Inputs:
+            + **t**: instant or vector of instants, in ms.
+
+        - Output:
+            + vector, with the shape of **t**, with the values of the expression.
+        '''
+        value = np.asarray(eval(self.code, self.namespace, {'t': t}), dtype = float)
+        if value.shape != np.shape(t):
+            value = np.full(np.shape(t), value)
+        return value
+
+    def __call__(self, t):
+        return self.evaluate(t)
@@ -19,7 +19,7 @@
 '''
 
 
-from Compartment import Compartment
+from Compartment import Compartment, compSpikeTime
 import numpy as np
 from AxonDelay import AxonDelay
 import math
@@ -29,55 +29,6 @@ import time
 
 
 
-def runge_kutta(derivativeFunction, t, x, timeStep, timeStepByTwo,  timeStepBySix):
-    '''
-    Function to implement the fourth order Runge-Kutta Method to solve numerically a 
-    differential equation.
-
-    - Inputs: 
-        + **derivativeFunction**: function that corresponds to the derivative of the differential equation.
-
-        + **t**: current instant.
-
-        + **x**:  current state value.
-
-        + **timeStep**: time step of the solution of the differential equation, in the same unit of t.
-
-        + **timeStepByTwo**:  timeStep divided by two, for computational efficiency.
-
-        + **timeStepBySix**: timeStep divided by six, for computational efficiency.
-
-    This method is intended to solve the following differential equation:
-
-    \f{equation}{
-        \frac{dx(t)}{dt} = f(t, x(t))
-    \f}
-    First, four derivatives are computed:
-
-    \f{align}{
-        k_1 &= f(t,x(t))\\
-        k_2 &= f(t+\frac{\Delta t}{2}, x(t) + \frac{\Delta t}{2}.k_1)\\
-        k_3 &= f(t+\frac{\Delta t}{2}, x(t) + \frac{\Delta t}{2}.k_2)\\
-        k_4 &= f(t+\Delta t, x(t) + \Delta t.k_3)
-    \f}
-    where \f$\Delta t\f$ is the time step of the numerical solution of the
-    differential equation.
-
-    Then the value of \f$x(t+\Delta t)\f$ is computed with:
-
-    \f{equation}{
-        x(t+\Delta t) = x(t) + \frac{\Delta t}{6}(k_1 + 2k_2 + 2k_3+k_4)
-    \f}
-    '''       
-    k1 = derivativeFunction(t, x)
-    k2 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k1)
-    k3 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k2)
-    k4 = derivativeFunction(t + timeStep, x + timeStep * k3)
-    
-    return x + timeStepBySix * (k1 + k2 + k2 + k3 + k3 + k4)
-
-
-
 class Interneuron(object):
     '''
     Class that implements a motor unit model. Encompasses a motoneuron
@@ -177,6 +128,9 @@ class Interneuron(object):
         self.SynapsesOut = []
         self.transmitSpikesThroughSynapses = []
         self.indicesOfSynapsesOnTarget = []
+
+        if self.conf.spikeTiming == 'interpolated':
+            self.atualizeCompartments = self.atualizeCompartmentsInterpolated
         
     
     def atualizeInterneuron(self, t, v_mV):
@@ -200,6 +154,24 @@ class Interneuron(object):
         if self.v_mV[self.somaIndex] > self.threshold_mV and t-self.tSomaSpike > self.RefPer_ms:
             self.addSomaSpike(t)
 
+    def atualizeCompartmentsInterpolated(self, t, v_mV):
+        '''
+        Atualize all neural compartments. The instant of the spike is the instant of 
+        the threshold crossing, interpolated between the membrane potential before and 
+        after the time step (see compSpikeTime). It is used when the spikeTiming parameter
+        is interpolated.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **v_mV**: vector with the membrane potential, in mV, of all compartments
+            at the end of the time step.
+        '''
+        if v_mV[self.somaIndex] > self.threshold_mV and t-self.tSomaSpike > self.RefPer_ms:
+            self.addSomaSpike(compSpikeTime(t, self.v_mV[self.somaIndex], v_mV[self.somaIndex],
+                                            self.threshold_mV, self.conf.timeStep_ms))
+        self.v_mV[:] = v_mV
+
     def addSomaSpike(self, t):
         '''
         When the soma potential is above the threshold a spike is added to the soma.
@@ -223,4 +195,14 @@ class Interneuron(object):
         for i in xrange(len(self.indicesOfSynapsesOnTarget)):
             self.transmitSpikesThroughSynapses[i].receiveSpike(t, self.indicesOfSynapsesOnTarget[i])
 
+    def transmitSpikesRouter(self, t):
+        '''
+        Transmits the spike through the SpikeRouter, that replaces the transmitSpikes
+        method when all the targets of the unit are in synapse engines.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        self.router.transmit(t, self.routerIndex)
+
         
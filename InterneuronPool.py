@@ -21,18 +21,12 @@
 
 import numpy as np
 from Interneuron import Interneuron
-from scipy.sparse import lil_matrix
+from CouplingMatrix import CouplingMatrix, blockDiagonal
+from SynapseEngine import SynapseEngine
+from RungeKutta import RungeKuttaWorkspace
 
  
 
-def runge_kutta(derivativeFunction,t, x, timeStep, timeStepByTwo, timeStepBySix):
-    k1 = derivativeFunction(t, x)
-    k2 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k1)
-    k3 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k2)
-    k4 = derivativeFunction(t + timeStep, x + timeStep * k3)
-    
-    return x + timeStepBySix * (np.add(np.add(np.add(k1, k2, order = 'C'), np.add(k2, k3, order='C')), np.add(k3, k4, order='C'), order='C'))
-
 class InterneuronPool(object):
     '''
     Class that implements a motor unit pool. Encompasses a set of motor
@@ -70,40 +64,40 @@ class InterneuronPool(object):
         self.poolSomaSpikes = np.array([])
         ##
 
-        # This is used to get values from Interneuron.py and make computations
-        # in InterneuronPool.py
-        # TODO create it all here instead?
-        self.totalNumberOfCompartments = 0
-
-        for i in xrange(self.Nnumber):
-            self.totalNumberOfCompartments = self.totalNumberOfCompartments \
-                + self.unit[i].compNumber
+        compNumber = np.array([self.unit[i].compNumber for i in xrange(self.Nnumber)], dtype = int)
+        ## Number of compartments of all the interneurons.
+        self.totalNumberOfCompartments = int(compNumber.sum())
+        ## Vector with the index, in the pool vectors, of the first compartment of each interneuron.
+        self.compOffset = np.cumsum(compNumber) - compNumber
 
         self.v_mV = np.zeros((self.totalNumberOfCompartments),
-                             dtype = np.double)
-             
-        self.G = lil_matrix((self.totalNumberOfCompartments,
-                          self.totalNumberOfCompartments), dtype = float)
-        self.iInjected = np.zeros_like(self.v_mV, dtype = 'd')
-        self.capacitanceInv = np.zeros_like(self.v_mV, dtype = 'd')
+                             dtype = self.conf.floatType)
+        self.iInjected = np.zeros_like(self.v_mV)
+        self.capacitanceInv = np.zeros_like(self.v_mV)
         self.iIonic = np.full_like(self.v_mV, 0.0)
-        self.EqCurrent_nA = np.zeros_like(self.v_mV, dtype = 'd')
+        self.EqCurrent_nA = np.zeros_like(self.v_mV)
 
         # Retrieving data from Interneuron class
         for i in xrange(self.Nnumber):
-            self.v_mV[i*self.unit[i].compNumber:i*self.unit[i].compNumber \
-                    +self.unit[i].v_mV.shape[0]] = self.unit[i].v_mV
-            # With only one compartment, it is a diagonal matrix
-            self.G[i,i] = self.unit[i].G
-            self.capacitanceInv[i*self.unit[i].compNumber: \
-                    i*self.unit[i].compNumber \
-                    +self.unit[i].capacitanceInv.shape[0]] \
-                    = self.unit[i].capacitanceInv
-            self.EqCurrent_nA[i*self.unit[i].compNumber: \
-                    i*self.unit[i].compNumber \
-                    +self.unit[i].EqCurrent_nA.shape[0]] \
-                    = self.unit[i].EqCurrent_nA
-
+            compartments = slice(self.compOffset[i], self.compOffset[i] + compNumber[i])
+            self.v_mV[compartments] = self.unit[i].v_mV
+            self.capacitanceInv[compartments] = self.unit[i].capacitanceInv
+            self.EqCurrent_nA[compartments] = self.unit[i].EqCurrent_nA
+        ## Conductance matrix of the pool, in the CSR format, with the matrices of the
+        ## interneurons on its diagonal.
+        self.G = blockDiagonal([self.unit[i].G for i in xrange(self.Nnumber)], self.compOffset,
+                               self.totalNumberOfCompartments)
+        ## CouplingMatrix object that computes the product of the matrix G and the membrane potential.
+        self.coupling = CouplingMatrix(self.conf, self.G)
+        ## RungeKuttaWorkspace object with the vectors used in the integration of the membrane potential.
+        self.integrator = RungeKuttaWorkspace(self.totalNumberOfCompartments, self.conf.floatType)
+        ## List of tuples (compartment index, Synapse object) with the synapses of the pool that
+        ## receive at least one synaptic conductance. It is built at the first call of dVdt, 
+        ## after the synapses are built by the SynapsesFactory.
+        self.synapsesIn = None
+        ## SynapseEngine object with the synapses of synapsesIn. It is built with synapsesIn, and
+        ## is None when the synapses are computed by the Synapse objects.
+        self.synapseEngine = None
 
         print 'Interneuron Pool of ' + pool + ' ' + group + ' built'
 
@@ -117,25 +111,52 @@ class InterneuronPool(object):
             + **t**: current instant, in ms.
 
         '''
+        if self.conf.gatingUpdate == 'step': self.atualizeChannels(t)
         
-        np.clip(runge_kutta(self.dVdt, t, self.v_mV, self.conf.timeStep_ms,
-                            self.conf.timeStepByTwo_ms,
-                            self.conf.timeStepBySix_ms),
-                            -30.0, 120.0, self.v_mV)
+        np.clip(self.integrator.step(self.dVdt, t, self.v_mV, self.conf.timeStep_ms,
+                                     self.conf.timeStepByTwo_ms,
+                                     self.conf.timeStepBySix_ms),
+                                     -30.0, 120.0, self.v_mV)
         
         for i in xrange(self.Nnumber):
-            self.unit[i].atualizeInterneuron(t, self.v_mV[i*self.unit[i].compNumber:(i+1)*self.unit[i].compNumber])
+            self.unit[i].atualizeInterneuron(t, self.v_mV[self.compOffset[i]:self.compOffset[i]+self.unit[i].compNumber])
 
-    def dVdt(self, t, V): 
-        #k = 0
+    def atualizeChannels(self, t):
+        '''
+        Updates the states of the ionic channels of all the interneurons. It is
+        called once per time step, before the integration of the membrane
+        potential, when the gatingUpdate parameter is step.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
         for i in xrange(self.Nnumber):
             for j in xrange(self.unit[i].compNumber):
-                self.iIonic.itemset(i*self.unit[0].compNumber+j,
-                                    self.unit[i].compartment[j].computeCurrent(t,
-                                                                               V.item(i*self.unit[0].compNumber+j)))
-                #k += 1
-        return (self.iIonic + self.G.dot(V) + self.iInjected
-                + self.EqCurrent_nA) * self.capacitanceInv
+                self.unit[i].compartment[j].atualizeChannels(t)
+
+    def dVdt(self, t, V, out = None): 
+        #k = 0
+        if self.synapsesIn is None: self.listSynapsesIn()
+        if self.synapseEngine is None:
+            for i in xrange(self.Nnumber):
+                for j in xrange(self.unit[i].compNumber):
+                    self.iIonic.itemset(self.compOffset[i]+j,
+                                        self.unit[i].compartment[j].computeCurrent(t,
+                                                                                   V.item(self.compOffset[i]+j)))
+                    #k += 1
+        else:
+            for i in xrange(self.Nnumber):
+                for j in xrange(self.unit[i].compNumber):
+                    self.iIonic.itemset(self.compOffset[i]+j,
+                                        self.unit[i].compartment[j].computeChannelCurrent(t,
+                                                                                          V.item(self.compOffset[i]+j)))
+            self.synapseEngine.computeCurrent(t, V, self.iIonic)
+        if out is None: out = np.empty_like(V)
+        np.add(self.iIonic, self.coupling.dot(V), out)
+        out += self.iInjected
+        out += self.EqCurrent_nA
+        out *= self.capacitanceInv
+        return out
         '''
         self.GPU.csrmv('N', self.m, self.n, self.nnz,  1.0, self.descr, self.csrVal, self.csrRowPtr, self.csrColInd, V, 0.0, self.dVdtValue)              
         
@@ -143,6 +164,19 @@ class InterneuronPool(object):
                 + self.EqCurrent_nA) * self.capacitanceInv
         '''
 
+    def listSynapsesIn(self):
+        '''
+        Lists the synapses of the pool that receive at least one synaptic conductance.
+        '''
+        self.synapsesIn = []
+        for i in xrange(self.Nnumber):
+            for j in xrange(self.unit[i].compNumber):
+                for synapse in self.unit[i].compartment[j].SynapsesIn:
+                    if synapse.numberOfIncomingSynapses:
+                        self.synapsesIn.append((self.compOffset[i] + j, synapse))
+        if self.conf.synapseEngine == 'pool':
+            self.synapseEngine = SynapseEngine(self.conf, self.synapsesIn, self.totalNumberOfCompartments)
+
     def listSpikes(self):
         '''
         List the spikes that occurred in the soma and in
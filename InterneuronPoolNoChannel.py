@@ -22,17 +22,10 @@
 import numpy as np
 from InterneuronNoChannel import InterneuronNoChannel
 from scipy.sparse import lil_matrix
+from RungeKutta import RungeKuttaWorkspace
 
  
 
-def runge_kutta(derivativeFunction,t, x, timeStep, timeStepByTwo, timeStepBySix):
-    k1 = derivativeFunction(t, x)
-    k2 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k1)
-    k3 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k2)
-    k4 = derivativeFunction(t + timeStep, x + timeStep * k3)
-    
-    return x + timeStepBySix * (np.add(np.add(np.add(k1, k2, order = 'C'), np.add(k2, k3, order='C')), np.add(k3, k4, order='C'), order='C'))
-
 class InterneuronPoolNoChannel(object):
     '''
     Class that implements a motor unit pool. Encompasses a set of motor
@@ -103,6 +96,8 @@ class InterneuronPoolNoChannel(object):
                     i*self.unit[i].compNumber \
                     +self.unit[i].EqCurrent_nA.shape[0]] \
                     = self.unit[i].EqCurrent_nA
+        ## RungeKuttaWorkspace object with the vectors used in the integration of the membrane potential.
+        self.integrator = RungeKuttaWorkspace(self.totalNumberOfCompartments)
 
 
         print 'Interneuron Pool of ' + pool + ' ' + group + ' built'
@@ -118,15 +113,15 @@ class InterneuronPoolNoChannel(object):
 
         '''
         
-        np.clip(runge_kutta(self.dVdt, t, self.v_mV, self.conf.timeStep_ms,
-                            self.conf.timeStepByTwo_ms,
-                            self.conf.timeStepBySix_ms),
-                            -30.0, 120.0, self.v_mV)
+        np.clip(self.integrator.step(self.dVdt, t, self.v_mV, self.conf.timeStep_ms,
+                                     self.conf.timeStepByTwo_ms,
+                                     self.conf.timeStepBySix_ms),
+                                     -30.0, 120.0, self.v_mV)
         
         for i in xrange(self.Nnumber):
             self.unit[i].atualizeInterneuron(t, self.v_mV[i*self.unit[i].compNumber:(i+1)*self.unit[i].compNumber])
 
-    def dVdt(self, t, V): 
+    def dVdt(self, t, V, out = None): 
         #k = 0
         for i in xrange(self.Nnumber):
             for j in xrange(self.unit[i].compNumber):
@@ -134,8 +129,12 @@ class InterneuronPoolNoChannel(object):
                                     self.unit[i].compartment[j].computeCurrent(t,
                                                                                V.item(i*self.unit[0].compNumber+j)))
                 #k += 1
-        return (self.iIonic + self.G.dot(V) + self.iInjected
-                + self.EqCurrent_nA) * self.capacitanceInv
+        if out is None: out = np.empty_like(V)
+        np.add(self.iIonic, self.G.dot(V), out)
+        out += self.iInjected
+        out += self.EqCurrent_nA
+        out *= self.capacitanceInv
+        return out
         '''
         self.GPU.csrmv('N', self.m, self.n, self.nnz,  1.0, self.descr, self.csrVal, self.csrRowPtr, self.csrColInd, V, 0.0, self.dVdtValue)              
         
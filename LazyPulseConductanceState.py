@@ -0,0 +1,160 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import math
+from PulseConductanceState import PulseConductanceState, compValOn, compValOff
+
+## Distance from the asymptotic value below which a state is considered settled.
+## After this instant the state value is set to its asymptotic value (0 or 1) and
+## no exponential is computed until the next change of state.
+settleTolerance = 1e-12
+
+
+def compSettleTime(v0, asymptote, rate, t0):
+    '''
+    Computes the instant at which the state reaches its asymptotic value, within
+    the settleTolerance.
+
+    - Inputs:
+        + **v0**: value of the state at the instant **t0**.
+
+        + **asymptote**: asymptotic value of the state (0 or 1).
+
+        + **rate**: rate, in 1/ms, of the exponential (\f$\alpha\f$ or \f$\beta\f$).
+
+        + **t0**: instant, in ms, of the last change of state.
+
+    - Output:
+        + Instant, in ms, from which the state is considered settled.
+
+    It is computed as:
+
+    \f{equation}{
+        t_s = t_0 + \frac{1}{r}\ln\left(\frac{|v_0 - v_{\infty}|}{tol}\right)
+    \f}
+    '''
+    distance = math.fabs(v0 - asymptote)
+    if distance <= settleTolerance:
+        return t0
+    if rate <= 0:
+        return float('inf')
+    return t0 + math.log(distance / settleTolerance) / rate
+
+
+class LazyPulseConductanceState(PulseConductanceState):
+    '''
+    Implements the Destexhe pulse approximation of the solution of
+    the states of the Hodgkin-Huxley neuron model, with lazy evaluation.
+    Between two changes of state the value follows an exponential from the
+    instant and the value of the last change of state (\f$t_0\f$, \f$v_0\f$).
+    Only these two numbers are stored and the value is computed in closed form
+    when it is queried. After the state settles at its asymptotic value no
+    arithmetic is performed until the next change of state.
+    '''
+
+    def __init__(self, kind, conf, pool, neuronKind, compKind, index):
+        '''
+        Initializes the lazy pulse conductance state. The inputs are the same of
+        the PulseConductanceState class.
+        '''
+        PulseConductanceState.__init__(self, kind, conf, pool, neuronKind, compKind, index)
+        ## Instant, in ms, of the last change of state.
+        self.t0_ms = 0.0
+        ## Value of the state at the instant of the last change of state.
+        self.v0 = 0.0
+        self.computeSettleTime()
+        self.computeStateValue = self.computeStateValueLazy
+
+    def isGrowing(self):
+        '''
+        Returns True if the state is going to 1 (*activation* states during the pulse and
+        *inactivation* states before and after the pulse) and False if it is going to 0.
+        '''
+        return self.state == (self.actType == 'activation')
+
+    def closedFormValue(self, t):
+        '''
+        Computes the value of the state at the instant **t**, from the
+        last change of state.
+
+        - Input:
+            + **t**: instant, in ms.
+        '''
+        if t >= self.tSettle_ms:
+            if self.isGrowing(): return 1.0
+            else: return 0.0
+        if self.isGrowing():
+            return compValOff(self.v0, self.alpha_ms1, self.beta_ms1, t, self.t0_ms)
+        else:
+            return compValOn(self.v0, self.alpha_ms1, self.beta_ms1, t, self.t0_ms)
+
+    def computeSettleTime(self):
+        '''
+        Computes the instant, in ms, from which the state is considered settled.
+        '''
+        if self.isGrowing():
+            ## Instant, in ms, from which the state is considered settled.
+            self.tSettle_ms = compSettleTime(self.v0, 1.0, self.alpha_ms1, self.t0_ms)
+        else:
+            self.tSettle_ms = compSettleTime(self.v0, 0.0, self.beta_ms1, self.t0_ms)
+        ## Indicates whether the value of the state was already set to its asymptotic value.
+        self.settled = False
+
+    def changeState(self, t):
+        '''
+        Void function that modify the current situation (true/false)
+        of the state. The value of the state at the instant **t** becomes
+        the initial value of the next exponential.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        self.v0 = self.closedFormValue(t)
+        self.t0_ms = t
+        PulseConductanceState.changeState(self, t)
+        self.computeSettleTime()
+
+    def computeStateValueLazy(self, t):
+        '''
+        Compute the state value at the instant **t** in closed form. If the pulse ended
+        before **t**, the change of state is placed at the end of the pulse.
+
+        - Input:
+            + **t**: current instant, in ms.
+        '''
+        if self.state and t > self.endOfPulse_ms:
+            tEnd = self.endOfPulse_ms
+            self.v0 = self.closedFormValue(tEnd)
+            self.t0_ms = tEnd
+            PulseConductanceState.changeState(self, t)
+            self.computeSettleTime()
+        if t < self.tSettle_ms:
+            self.value = self.closedFormValue(t)
+        elif not self.settled:
+            self.value = self.closedFormValue(t)
+            self.settled = True
+
+    def reset(self):
+        '''
+        '''
+        PulseConductanceState.reset(self)
+        self.t0_ms = 0.0
+        self.v0 = 0.0
+        self.computeSettleTime()
@@ -99,56 +99,6 @@ def compGCouplingMatrix(gc):
             
     return GC
 
-#@profile
-def runge_kutta(derivativeFunction, t, x, timeStep, timeStepByTwo,  timeStepBySix):
-    '''
-    Function to implement the fourth order Runge-Kutta Method to solve numerically a 
-    differential equation.
-
-    - Inputs: 
-        + **derivativeFunction**: function that corresponds to the derivative of the differential equation.
-
-        + **t**: current instant.
-
-        + **x**:  current state value.
-
-        + **timeStep**: time step of the solution of the differential equation, in the same unit of t.
-
-        + **timeStepByTwo**:  timeStep divided by two, for computational efficiency.
-
-        + **timeStepBySix**: timeStep divided by six, for computational efficiency.
-
-    This method is intended to solve the following differential equation:
-
-    \f{equation}{
-        \frac{dx(t)}{dt} = f(t, x(t))
-    \f}
-    First, four derivatives are computed:
-
-    \f{align}{
-        k_1 &= f(t,x(t))\\
-        k_2 &= f(t+\frac{\Delta t}{2}, x(t) + \frac{\Delta t}{2}.k_1)\\
-        k_3 &= f(t+\frac{\Delta t}{2}, x(t) + \frac{\Delta t}{2}.k_2)\\
-        k_4 &= f(t+\Delta t, x(t) + \Delta t.k_3)
-    \f}
-    where \f$\Delta t\f$ is the time step of the numerical solution of the
-    differential equation.
-
-    Then the value of \f$x(t+\Delta t)\f$ is computed with:
-
-    \f{equation}{
-        x(t+\Delta t) = x(t) + \frac{\Delta t}{6}(k_1 + 2k_2 + 2k_3+k_4)
-    \f}
-    '''       
-    k1 = derivativeFunction(t, x)
-    k2 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k1)
-    k3 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k2)
-    k4 = derivativeFunction(t + timeStep, x + timeStep * k3)
-    
-    return x + timeStepBySix * (k1 + k2 + k2 + k3 + k3 + k4)
-    #return x + timeStep * (k1)
-
-
 class MotorUnitNoChannel(object):
     '''
     Class that implements a motor unit model. Encompasses a motoneuron
@@ -213,10 +163,12 @@ class MotorUnitNoChannel(object):
         self.position_mm = conf.parameterSet('position', pool, index)
         
         # EMG data
+        # The random numbers of each motor unit are drawn from its own generator.
+        randomState = conf.randomState('MotorUnit', pool, str(index))
         self.MUSpatialDistribution = conf.parameterSet('MUSpatialDistribution',pool, 0)       
         if self.MUSpatialDistribution == 'random':
-            radius = (muscleThickness/2) * np.random.uniform(0.0, 1.0)
-            angle = 2.0 * math.pi * np.random.uniform(0.0, 1.0)
+            radius = (muscleThickness/2) * randomState.uniform(0.0, 1.0)
+            angle = 2.0 * math.pi * randomState.uniform(0.0, 1.0)
 		
         x = radius * math.sin(angle)
         y = radius * math.cos(angle)
@@ -234,7 +186,7 @@ class MotorUnitNoChannel(object):
         self.timeWidening = 1 + conf.EMGWidening_mm1 * self.distance_mm
         
         ## Type of the Hermitez-Rodiguez curve. It can be 1 or 2.
-        self.hrType = np.random.random_integers(1,2)
+        self.hrType = randomState.random_integers(1,2)
         
         ## MUAP amplitude in mV.
         self.ampEMG_mV = conf.parameterSet('EMGAmplitude', pool, index)
@@ -339,32 +291,9 @@ class MotorUnitNoChannel(object):
         else:
             self.Delay = AxonDelay(conf, self.nerve, pool, delayLength, -1, index)
             self.stimulusCompartment = -1    
-        # Nerve stimulus function    
-        self.stimulusMeanFrequency_Hz = float(conf.parameterSet('stimFrequency_' + self.nerve, pool, 0))
-        self.stimulusPulseDuration_ms = float(conf.parameterSet('stimPulseDuration_' + self.nerve, pool, 0))
-        self.stimulusIntensity_mA = float(conf.parameterSet('stimIntensity_' + self.nerve, pool, 0))
-        self.stimulusStart_ms = float(conf.parameterSet('stimStart_' + self.nerve, pool, 0))
-        self.stimulusStop_ms = float(conf.parameterSet('stimStop_' + self.nerve, pool, 0))
-        self.stimulusModulationStart_ms = float(conf.parameterSet('stimModulationStart_' + self.nerve, pool, 0))
-        self.stimulusModulationStop_ms = float(conf.parameterSet('stimModulationStop_' + self.nerve, pool, 0))
-
-        exec 'def axonStimModulation(t): return '   +  conf.parameterSet('stimModulation_' + self.nerve, pool, 0)
-        
-        startStep = int(np.rint(self.stimulusStart_ms / self.conf.timeStep_ms))
-        self.axonStimModulation = axonStimModulation
-        ## Vector with the nerve stimulus, in mA.
-        self.nerveStimulus_mA = np.zeros((int(np.rint(conf.simDuration_ms/conf.timeStep_ms)), 1), dtype = float)
-        for i in xrange(len(self.nerveStimulus_mA)):
-                if (i * self.conf.timeStep_ms >= self.stimulusStart_ms and  i * self.conf.timeStep_ms <= self.stimulusStop_ms):
-                    if (i * self.conf.timeStep_ms > self.stimulusModulationStart_ms and  i * self.conf.timeStep_ms < self.stimulusModulationStop_ms):
-                        stimulusFrequency_Hz = self.stimulusMeanFrequency_Hz + axonStimModulation(i * self.conf.timeStep_ms)
-                    else:
-                        stimulusFrequency_Hz = self.stimulusMeanFrequency_Hz
-                    if stimulusFrequency_Hz > 0:
-                        stimulusPeriod_ms = 1000.0 / stimulusFrequency_Hz
-                        numberOfSteps = int(np.rint(stimulusPeriod_ms / self.conf.timeStep_ms))
-                        if ((i - startStep) % numberOfSteps == 0):
-                            self.nerveStimulus_mA[i:int(np.rint(i+self.stimulusPulseDuration_ms / self.conf.timeStep_ms))] = self.stimulusIntensity_mA
+        ## Vector with the nerve stimulus, in mA, at each time step. It is the same vector
+        ## for all the units of the pool (see the nerveStimulus method of the Configuration class).
+        self.nerveStimulus_mA = conf.nerveStimulus(self.nerve, pool)
         
         # 
         ## Vector with the instants of spikes at the soma.
@@ -373,6 +302,8 @@ class MotorUnitNoChannel(object):
         self.lastCompSpikeTrain = []
         ## Vector with the instants of spikes at the terminal.
         self.terminalSpikeTrain = []
+        ## Time step of the last spike at the terminal (-inf before the first spike).
+        self.terminalSpikeStep = float('-inf')
                 
         
         # contraction DataMUnumber_S = int(conf.parameterSet('MUnumber_S_' + pool, pool, 0))
@@ -451,12 +382,14 @@ class MotorUnitNoChannel(object):
             + **t**: current instant, in ms.
         '''
 
-        if -1e-3 < (t - self.Delay.terminalSpikeTrain) < 1e-3: 
+        step = self.conf.tick(t)
+        if step == self.Delay.terminalSpikeStep: 
             self.terminalSpikeTrain.append([t, self.index])
+            self.terminalSpikeStep = step
                    
         
         # Check whether there is antidromic impulse reaching soma or RC
-        if self.Delay.indexAntidromicSpike < len(self.Delay.antidromicSpikeTrain) and -1e-2 < (t - self.Delay.antidromicSpikeTrain[self.Delay.indexAntidromicSpike]) < 1e-2: 
+        if self.Delay.indexAntidromicSpike < len(self.Delay.antidromicSpikeSteps) and step == self.Delay.antidromicSpikeSteps[self.Delay.indexAntidromicSpike]: 
 
             # Considers only MN-RC connections
             self.transmitSpikes(t)
@@ -471,7 +404,7 @@ class MotorUnitNoChannel(object):
            
         
         if self.stimulusCompartment == 'delay':
-            self.Delay.atualizeStimulus(t, self.nerveStimulus_mA[int(np.rint(t/self.conf.timeStep_ms))])
+            self.Delay.atualizeStimulus(step, self.nerveStimulus_mA[step])
 
     def transmitSpikes(self, t):
         '''
@@ -481,6 +414,16 @@ class MotorUnitNoChannel(object):
         for i in xrange(len(self.indicesOfSynapsesOnTarget)):
             self.transmitSpikesThroughSynapses[i].receiveSpike(t, self.indicesOfSynapsesOnTarget[i])
 
+    def transmitSpikesRouter(self, t):
+        '''
+        Transmits the spike through the SpikeRouter, that replaces the transmitSpikes
+        method when all the targets of the unit are in synapse engines.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        self.router.transmit(t, self.routerIndex)
+
     def getEMG(self, t):
         '''
 
@@ -509,28 +452,11 @@ class MotorUnitNoChannel(object):
 
     def createStimulus(self):
         '''
-
+        Gets the nerve stimulus again from the Configuration object, after a change of
+        the stimulus parameters. The stimulus is generated only once for all the units
+        of the pool.
         '''
-        self.stimulusMeanFrequency_Hz = float(self.conf.parameterSet('stimFrequency_' + self.nerve, self.pool, 0))
-        self.stimulusPulseDuration_ms = float(self.conf.parameterSet('stimPulseDuration_' + self.nerve, self.pool, 0))
-        self.stimulusIntensity_mA = float(self.conf.parameterSet('stimIntensity_' + self.nerve, self.pool, 0))
-        self.stimulusStart_ms = float(self.conf.parameterSet('stimStart_' + self.nerve, self.pool, 0))
-        self.stimulusStop_ms = float(self.conf.parameterSet('stimStop_' + self.nerve, self.pool, 0))
-        self.stimulusModulationStart_ms = float(self.conf.parameterSet('stimModulationStart_' + self.nerve, self.pool, 0))
-        self.stimulusModulationStop_ms = float(self.conf.parameterSet('stimModulationStop_' + self.nerve, self.pool, 0))
-
-        startStep = int(np.rint(self.stimulusStart_ms / self.conf.timeStep_ms))
-        for i in xrange(len(self.nerveStimulus_mA)):
-            if (i * self.conf.timeStep_ms >= self.stimulusStart_ms and  i * self.conf.timeStep_ms <= self.stimulusStop_ms):
-                if (i * self.conf.timeStep_ms > self.stimulusModulationStart_ms and  i * self.conf.timeStep_ms < self.stimulusModulationStop_ms):
-                    stimulusFrequency_Hz = self.stimulusMeanFrequency_Hz + self.axonStimModulation(i * self.conf.timeStep_ms)
-                else:
-                    stimulusFrequency_Hz = self.stimulusMeanFrequency_Hz
-                if stimulusFrequency_Hz > 0:
-                    stimulusPeriod_ms = 1000.0 / stimulusFrequency_Hz
-                    numberOfSteps = int(np.rint(stimulusPeriod_ms / self.conf.timeStep_ms))
-                    if ((i - startStep) % numberOfSteps == 0):
-                        self.nerveStimulus_mA[i:int(np.rint(i+1.0 / self.conf.timeStep_ms))] = self.stimulusIntensity_mA
+        self.nerveStimulus_mA = self.conf.nerveStimulus(self.nerve, self.pool)
 
 
     def reset(self):
@@ -552,6 +478,8 @@ class MotorUnitNoChannel(object):
         self.lastCompSpikeTrain = []
         ## Vector with the instants of spikes at the terminal.
         self.terminalSpikeTrain = []
+        ## Time step of the last spike at the terminal (-inf before the first spike).
+        self.terminalSpikeStep = float('-inf')
 
 
 
@@ -21,62 +21,26 @@ from MuscularActivation import MuscularActivation
 from MuscleNoHill import MuscleNoHill
 from MuscleHill import MuscleHill
 from MuscleSpindle import MuscleSpindle
-from scipy.sparse import lil_matrix
+from ChannelEngine import ChannelEngine
+from CableSolver import CableSolver
+from PassivePropagator import PassivePropagator
+from CouplingMatrix import CouplingMatrix, blockDiagonal
+from SynapseEngine import SynapseEngine
+from AxonDelayBank import AxonDelayBank
+from BuildCache import BuildCache
+from ParallelBuild import buildUnits
+from RungeKutta import RungeKuttaWorkspace
+from scipy.sparse.linalg import spsolve
 #import pyculib.sparse as pcu
 import time
 #from numba import jit, prange
 
-def SpMV_viaMKL( A, x, numberOfBlocks, sizeOfBlock ):
-    '''
-    Wrapper to Intel's SpMV
-    (Sparse Matrix-Vector multiply)
-    For medium-sized matrices, this is 4x faster
-    than scipy's default implementation
-    Stephen Becker, April 24 2014
-    stephen.beckr@gmail.com
-    '''
-
-    import numpy as np
-    import scipy.sparse as sparse
-    from ctypes import POINTER,c_void_p,c_int,c_char,c_double,byref,cdll
-    mkl = cdll.LoadLibrary("libmkl_rt.so")
-
-    SpMV = mkl.mkl_cspblas_dbsrgemv
-    # Dissecting the "cspblas_dcsrgemv" name:
-    # "c" - for "c-blas" like interface (as opposed to fortran)
-    #    Also means expects sparse arrays to use 0-based indexing, which python does
-    # "sp"  for sparse
-    # "d"   for double-precision
-    # "csr" for compressed row format
-    # "ge"  for "general", e.g., the matrix has no special structure such as symmetry
-    # "mv"  for "matrix-vector" multiply
-
-    
-
-    # The data of the matrix
-    data    = A.data.ctypes.data_as(POINTER(c_double))
-    indptr  = A.indptr.ctypes.data_as(POINTER(c_int))
-    indices = A.indices.ctypes.data_as(POINTER(c_int))
-
-    # Allocate output, using same conventions as input
-
-    
-    y = np.empty(numberOfBlocks*sizeOfBlock,dtype=np.double,order='F')  
-
-    np_x = x.ctypes.data_as(POINTER(c_double))
-    np_y = y.ctypes.data_as(POINTER(c_double))
-    # now call MKL. This returns the answer in np_y, which links to y
-    SpMV(byref(c_char("N")), byref(c_int(numberOfBlocks)), byref(c_int(sizeOfBlock)), data ,indptr, indices, np_x, np_y ) 
-
-    return y
-
-def runge_kutta(derivativeFunction,t, x, timeStep, timeStepByTwo, timeStepBySix):
-    k1 = derivativeFunction(t, x)
-    k2 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k1)
-    k3 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k2)
-    k4 = derivativeFunction(t + timeStep, x + timeStep * k3)
-    
-    return x + timeStepBySix * (np.add(np.add(np.add(k1, k2, order = 'C'), np.add(k2, k3, order='C')), np.add(k3, k4, order='C'), order='C'))
+## Distance of the membrane potential, in mV, from its resting value, below which a
+## compartment is considered at rest when the quiescentUnits parameter is skip.
+quiescentVoltageTolerance_mV = 1e-6
+## Distance of the gating states and of the synaptic fractions of receptors from their
+## asymptotic values below which they are considered settled.
+quiescentStateTolerance = 1e-9
 
 class MotorUnitPool(object):
     '''
@@ -110,57 +74,160 @@ class MotorUnitPool(object):
         self.muscleThickness_mm = float(self.conf.parameterSet('thickness:' + pool, pool, 0))
 
         ## Dictionary of MotorUnit objects.
-        self.unit = dict()
-        
-        
-        for i in xrange(0, self.MUnumber): 
-            if i < MUnumber_S:
-                self.unit[i] = MotorUnit(conf, pool, i, 'S', self.muscleThickness_mm, conf.skinThickness_mm)
-            elif i < MUnumber_S + MUnumber_FR:
-                self.unit[i] = MotorUnit(conf, pool, i, 'FR', self.muscleThickness_mm, conf.skinThickness_mm)
-            else:
-                self.unit[i] = MotorUnit(conf, pool, i, 'FF', self.muscleThickness_mm, conf.skinThickness_mm)
-
-        # This is used to get values from MotorUnit.py and make computations
-        # in MotorUnitPool.py
-        # TODO create it all here instead?
-        self.totalNumberOfCompartments = 0
-
-        for i in xrange(self.MUnumber):
-            self.totalNumberOfCompartments = self.totalNumberOfCompartments \
-                + self.unit[i].compNumber
+        self.unit = None
+        # The motor units built with the same configuration are read from the build cache.
+        if conf.buildCache:
+            cache = BuildCache(conf)
+            self.unit = cache.load('MotorUnitPool-' + pool)
+            if self.unit is not None:
+                print 'Motor units of the pool ' + pool + ' read from the build cache'
+        if self.unit is None:
+            arguments = []
+            for i in xrange(0, self.MUnumber): 
+                if i < MUnumber_S:
+                    arguments.append((pool, i, 'S', self.muscleThickness_mm, conf.skinThickness_mm))
+                elif i < MUnumber_S + MUnumber_FR:
+                    arguments.append((pool, i, 'FR', self.muscleThickness_mm, conf.skinThickness_mm))
+                else:
+                    arguments.append((pool, i, 'FF', self.muscleThickness_mm, conf.skinThickness_mm))
+            self.unit = dict(enumerate(buildUnits(conf, MotorUnit, arguments)))
+            if conf.buildCache: cache.save('MotorUnitPool-' + pool, self.unit)
+
+        compNumber = np.array([self.unit[i].compNumber for i in xrange(self.MUnumber)], dtype = int)
+        ## Number of compartments of all the motor units.
+        self.totalNumberOfCompartments = int(compNumber.sum())
+        ## Vector with the index, in the pool vectors, of the first compartment of each motor
+        ## unit. The motor units can have different numbers of compartments.
+        self.compOffset = np.cumsum(compNumber) - compNumber
 
         self.v_mV = np.zeros((self.totalNumberOfCompartments),
-                             dtype = np.double)
-             
-        self.G = lil_matrix((self.totalNumberOfCompartments,
-                          self.totalNumberOfCompartments), dtype = float)
-        self.iInjected = np.zeros_like(self.v_mV, dtype = 'd')
-        self.capacitanceInv = np.zeros_like(self.v_mV, dtype = 'd')
+                             dtype = self.conf.floatType)
+        self.iInjected = np.zeros_like(self.v_mV)
+        self.capacitanceInv = np.zeros_like(self.v_mV)
         self.iIonic = np.full_like(self.v_mV, 0.0)
-        self.EqCurrent_nA = np.zeros_like(self.v_mV, dtype = 'd')
+        self.EqCurrent_nA = np.zeros_like(self.v_mV)
 
         # Retrieving data from Motorneuron class
-        # Vectors or matrices from Motorneuron compartments are copied,
-        # populating larger vectors or matrices that will be used for computations
+        # Vectors from Motorneuron compartments are copied,
+        # populating larger vectors that will be used for computations
+        for i in xrange(self.MUnumber):
+            compartments = slice(self.compOffset[i], self.compOffset[i] + compNumber[i])
+            self.v_mV[compartments] = self.unit[i].v_mV
+            self.capacitanceInv[compartments] = self.unit[i].capacitanceInv
+            self.EqCurrent_nA[compartments] = self.unit[i].EqCurrent_nA
+        ## Conductance matrix of the pool, in the CSR format, with the matrices of the motor
+        ## units on its diagonal.
+        self.G = blockDiagonal([self.unit[i].G for i in xrange(self.MUnumber)], self.compOffset,
+                               self.totalNumberOfCompartments)
+        ## Number of compartments of each motor unit, used as the block size of the bsr backend.
+        ## It is None when the motor units have different numbers of compartments.
+        if self.MUnumber and np.all(compNumber == compNumber[0]):
+            self.sizeOfBlock = int(compNumber[0])
+        else:
+            self.sizeOfBlock = None
+        ## CouplingMatrix object that computes the product of the matrix G and the membrane potential.
+        self.coupling = CouplingMatrix(self.conf, self.G, self.sizeOfBlock)
+        ## RungeKuttaWorkspace object with the vectors used in the integration of the membrane potential.
+        self.integrator = RungeKuttaWorkspace(self.totalNumberOfCompartments, self.conf.floatType)
+
+        ## ChannelEngine object with the ionic channels of all the motor units. It is None
+        ## when the channels are computed by the ChannelConductance objects.
+        if self.conf.channelEngine == 'pool':
+            self.channelEngine = ChannelEngine(self.conf, self.unit, self.compOffset,
+                                               self.totalNumberOfCompartments)
+        else:
+            self.channelEngine = None
         for i in xrange(self.MUnumber):
-            self.v_mV[i*self.unit[i].compNumber:i*self.unit[i].compNumber \
-                    +self.unit[i].v_mV.shape[0]] = self.unit[i].v_mV
-            # Consists of smaller matrices on its diagonal
-            self.G[i*self.unit[i].compNumber:i*self.unit[i].compNumber \
-                    +self.unit[i].G.shape[0], \
-                    i*self.unit[i].compNumber:i*self.unit[i].compNumber \
-                    +self.unit[i].G.shape[1]] = self.unit[i].G
-            self.capacitanceInv[i*self.unit[i].compNumber: \
-                    i*self.unit[i].compNumber \
-                    +self.unit[i].capacitanceInv.shape[0]] \
-                    = self.unit[i].capacitanceInv
-            self.EqCurrent_nA[i*self.unit[i].compNumber: \
-                    i*self.unit[i].compNumber \
-                    +self.unit[i].EqCurrent_nA.shape[0]] \
-                    = self.unit[i].EqCurrent_nA
-        self.sizeOfBlock = int(self.totalNumberOfCompartments/self.MUnumber)
-        self.G = self.G.tobsr(blocksize=(self.sizeOfBlock, self.sizeOfBlock)) 
+            self.unit[i].channelEngine = self.channelEngine
+            self.unit[i].compOffset = self.compOffset[i]
+        ## Vector with the index of the motor unit of each compartment.
+        self.compUnit = np.repeat(np.arange(self.MUnumber), compNumber)
+        ## Vector with the instant, in ms, of the last spike of each compartment. The vectors 
+        ## v_mV and tSpikes of each motor unit are views of the pool vectors.
+        self.tSpikes = np.zeros((self.totalNumberOfCompartments), dtype = np.float64)
+        for i in xrange(self.MUnumber):
+            compartments = slice(self.compOffset[i], self.compOffset[i] + self.unit[i].compNumber)
+            self.unit[i].v_mV = self.v_mV[compartments]
+            self.unit[i].tSpikes = self.tSpikes[compartments]
+        ## Vector with the threshold, in mV, of each compartment.
+        self.threshold_mV = self.unitParameter('threshold_mV')
+        ## Vector with the refractory period, in ms, of each compartment.
+        self.refractoryPeriod_ms = self.unitParameter('MNRefPer_ms')
+        ## Boolean vector indicating the compartments in which the spikes are detected
+        ## (from the soma to the last compartment of each motor unit).
+        self.spikeComp = np.ones((self.totalNumberOfCompartments), dtype = bool)
+        for i in xrange(self.MUnumber):
+            self.spikeComp[self.compOffset[i]:self.compOffset[i] + self.unit[i].somaIndex] = False
+        ## Vector with the membrane potential, in mV, at the beginning of the time step. It is
+        ## used to interpolate the instant of the spikes when the spikeTiming parameter is interpolated.
+        self.vBefore_mV = np.zeros((self.totalNumberOfCompartments), dtype = float)
+        ## List with the indices of the motor units stimulated in the part of the nerve modelled
+        ## as a delay.
+        self.delayUnits = [i for i in xrange(self.MUnumber) if self.unit[i].stimulusCompartment == 'delay']
+        ## AxonDelayBank with the AxonDelay objects of the motor units of delayUnits.
+        self.delayBank = AxonDelayBank(self.conf, [self.unit[i].Delay for i in self.delayUnits])
+        ## CableSolver object with the implicit solver of the membrane potential. It is None
+        ## when the membrane potential is integrated with the Runge-Kutta method.
+        if self.conf.integrationMethod in ('backwardEuler', 'CrankNicolson'):
+            self.cableSolver = CableSolver(self.conf, self.unit, self.compOffset,
+                                           self.capacitanceInv, self.conf.integrationMethod)
+        else:
+            self.cableSolver = None
+        ## PassivePropagator object with the exact propagator of the passive part of the
+        ## membrane potential equation. It is None when the integrationMethod is not exponential.
+        if self.conf.integrationMethod == 'exponential':
+            self.propagator = PassivePropagator(self.conf, self.unit, self.compOffset,
+                                                self.capacitanceInv)
+        else:
+            self.propagator = None
+        ## List of tuples (compartment index, Synapse object) with the synapses of the pool that
+        ## receive at least one synaptic conductance. It is built at the first call of dVdt, 
+        ## after the synapses are built by the SynapsesFactory.
+        self.synapsesIn = None
+        ## SynapseEngine object with the synapses of synapsesIn. It is built with synapsesIn, and
+        ## is None when the synapses are computed by the Synapse objects.
+        self.synapseEngine = None
+        ## List with the indices of the motor units integrated in the current time step. When the
+        ## quiescentUnits parameter is skip, the motor units at rest are not in this list.
+        self.integratedUnits = range(self.MUnumber)
+        ## List with the synapses (see synapsesIn) of the motor units integrated in the current time step.
+        self.integratedSynapsesIn = None
+        ## Boolean vector indicating the motor units at rest, not integrated in the current time step.
+        self.quiescentUnit = np.zeros((self.MUnumber), dtype = bool)
+        ## Vector with the indices of the compartments of the motor units of integratedUnits.
+        self.activeComp = np.arange(self.totalNumberOfCompartments)
+        if self.conf.quiescentUnits == 'skip':
+            ## Vector with the resting membrane potential, in mV, of each compartment, with the 
+            ## ionic channels closed and no input (\f$GV + I_{eq} = 0\f$).
+            self.vRest_mV = spsolve(self.G.tocsc(), -self.EqCurrent_nA).astype(self.conf.floatType)
+            ## Tolerances of the membrane potential, in mV, and of the states used to find the
+            ## motor units at rest. In single precision they are widened to a few units of
+            ## round-off, since the potential at rest only reaches vRest_mV within round-off.
+            eps = np.finfo(self.conf.floatType).eps
+            self.voltageTolerance_mV = max(quiescentVoltageTolerance_mV,
+                                           8 * eps * np.abs(self.vRest_mV).max()
+                                           if self.totalNumberOfCompartments else 0.0)
+            self.stateTolerance = max(quiescentStateTolerance, 8 * eps)
+            ## Boolean vector indicating the compartments of the motor units at rest.
+            self.quiescentComp = np.zeros((self.totalNumberOfCompartments), dtype = bool)
+            ## Vector with the position, in activeComp, of the first compartment of each
+            ## motor unit of integratedUnits.
+            self.activeOffset = self.compOffset.tolist()
+            ## List of tuples (position in activeComp, Synapse object) with the synapses of
+            ## the motor units of integratedUnits. It is used with the channel engine when
+            ## the synapses are computed by the Synapse objects.
+            self.activeSynapsesIn = None
+            ## Conductance matrix (CSR) of the compartments of activeComp.
+            self.activeG = self.coupling.csr
+            ## RungeKuttaWorkspace object used in the integration of the compartments of activeComp.
+            self.activeIntegrator = self.integrator
+            ## Vector with the inverse of the capacitance of the compartments of activeComp.
+            self.activeCapacitanceInv = self.capacitanceInv
+            ## Vector with the sum of the injected and equilibrium currents, in nA, of the
+            ## compartments of activeComp in the current time step.
+            self.activeInjected_nA = np.zeros_like(self.v_mV)
+            ## Vector with the ionic and synaptic currents, in nA, of the compartments of activeComp.
+            self.activeIonic = np.zeros_like(self.v_mV)
         '''
         self.G  = pcu.csr_matrix(self.G)
         self.GPU = pcu.Sparse(0)
@@ -210,14 +277,41 @@ class MotorUnitPool(object):
         - Inputs:
             + **t**: current instant, in ms.
         '''
+        if self.conf.quiescentUnits == 'skip': self.findIntegratedUnits()
+
+        if self.integratedUnits:
+            # Only the Runge-Kutta method integrates the active compartments alone. The
+            # implicit and split methods solve all the compartments, and the potential of
+            # the motor units at rest is restored afterwards.
+            restore = self.conf.quiescentUnits == 'skip' and (self.cableSolver is not None or
+                                                             self.propagator is not None)
+            if restore: vQuiescent_mV = self.v_mV[self.quiescentComp]
+            if self.conf.spikeTiming == 'interpolated': self.vBefore_mV[:] = self.v_mV
+            if self.conf.gatingUpdate == 'step': self.atualizeChannels(t)
+
+            if self.cableSolver is not None:
+                np.clip(self.implicitStep(t), -30.0, 120.0, self.v_mV)
+            elif self.propagator is not None:
+                np.clip(self.splitStep(t), -30.0, 120.0, self.v_mV)
+            elif len(self.activeComp) < self.totalNumberOfCompartments:
+                comps = self.activeComp
+                self.activeInjected_nA = self.iInjected[comps] + self.EqCurrent_nA[comps]
+                self.v_mV[comps] = np.clip(self.activeIntegrator.step(self.dVdtActive, t, self.v_mV[comps],
+                                                                      self.conf.timeStep_ms,
+                                                                      self.conf.timeStepByTwo_ms,
+                                                                      self.conf.timeStepBySix_ms),
+                                           -30.0, 120.0)
+            else:
+                np.clip(self.integrator.step(self.dVdt, t, self.v_mV, self.conf.timeStep_ms,
+                                             self.conf.timeStepByTwo_ms,
+                                             self.conf.timeStepBySix_ms),
+                                             -30.0, 120.0, self.v_mV)
+
+            if restore: self.v_mV[self.quiescentComp] = vQuiescent_mV
 
-        np.clip(runge_kutta(self.dVdt, t, self.v_mV, self.conf.timeStep_ms,
-                            self.conf.timeStepByTwo_ms,
-                            self.conf.timeStepBySix_ms),
-                            -30.0, 120.0, self.v_mV)
+            self.atualizeSpikes(t)
                             
-        for i in xrange(self.MUnumber):
-            self.unit[i].atualizeMotorUnit(t, self.v_mV[i*self.unit[i].compNumber:(i+1)*self.unit[i].compNumber])
+        if self.delayUnits: self.atualizeDelays(t)
         self.Activation.atualizeActivationSignal(t, self.unit)
         self.Muscle.atualizeForce(self.Activation.activation_Sat)
         self.spindle.atualizeMuscleSpindle(t, self.Muscle.lengthNorm,
@@ -225,21 +319,323 @@ class MotorUnitPool(object):
                                            self.Muscle.accelerationNorm, 
                                            31, 33)
     
-    def dVdt(self, t, V): 
-        
+    def atualizeSpikes(self, t):
+        '''
+        Finds the spikes of all the compartments of the pool in the current time step. The
+        threshold crossings and the refractory periods are checked for all the compartments
+        at once, and the states of the ionic channels of the compartments that fired are
+        changed together. Only the motor units that fired are visited, to add the spikes 
+        to their spike trains (see the registerCompartmentSpike method of the MotorUnit class).
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        spiking = self.v_mV > self.threshold_mV
+        spiking &= self.spikeComp
+        spiking &= t - self.tSpikes > self.refractoryPeriod_ms
+        if self.conf.quiescentUnits == 'skip': spiking &= np.logical_not(self.quiescentComp)
+        comps = np.flatnonzero(spiking)
+        if not len(comps): return
+
+        if self.conf.spikeTiming == 'interpolated':
+            # The same interpolation as compSpikeTime.
+            vBefore = self.vBefore_mV[comps]
+            threshold = self.threshold_mV[comps]
+            tSpike = np.full(len(comps), t)
+            crossing = vBefore < threshold
+            tSpike[crossing] = (t + self.conf.timeStep_ms * (threshold[crossing] - vBefore[crossing])
+                                / (self.v_mV[comps[crossing]] - vBefore[crossing]))
+            self.tSpikes[comps] = tSpike
+        else:
+            self.tSpikes[comps] = t
+
+        for comp in comps:
+            i = self.compUnit[comp]
+            self.unit[i].registerCompartmentSpike(self.tSpikes[comp], comp - self.compOffset[i])
+            if self.channelEngine is None:
+                self.unit[i].changeCompartmentState(self.tSpikes[comp], comp - self.compOffset[i])
+        if self.channelEngine is not None:
+            self.channelEngine.changeState(self.tSpikes, spiking)
+
+    def atualizeDelays(self, t):
+        '''
+        Atualizes the delays of the nerve of all the motor units (see the atualizeDelay
+        method of the MotorUnit class) with the AxonDelayBank. Only the motor units with
+        a spike arriving at the terminal or at the spinal cord are visited.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        step = self.conf.tick(t)
+        for k in self.delayBank.terminalSpikes(step):
+            self.unit[self.delayUnits[k]].addTerminalSpike(t, step)
+        antidromic = self.delayBank.antidromicSpikes(step)
+        if len(antidromic):
+            received = [self.unit[self.delayUnits[k]].receiveAntidromicSpike(t) for k in antidromic]
+            self.delayBank.popEvents('antidromic', antidromic[np.array(received, dtype = bool)])
+        # All the units of the pool share the same nerve stimulus.
+        self.delayBank.atualizeStimulus(step, self.unit[self.delayUnits[0]].nerveStimulus_mA[step])
+
+    def unitParameter(self, name):
+        '''
+        Vector with a parameter of the motor units repeated for each compartment.
+
+        - Inputs:
+            + **name**: string with the name of the attribute of the MotorUnit objects.
+        '''
+        return np.repeat([getattr(self.unit[i], name) for i in xrange(self.MUnumber)],
+                         [self.unit[i].compNumber for i in xrange(self.MUnumber)]).astype(float)
+
+    def atualizeChannels(self, t):
+        '''
+        Updates the states of the ionic channels of all the motor units. It is
+        called once per time step, before the integration of the membrane
+        potential, when the gatingUpdate parameter is step.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        if self.channelEngine is None:
+            for i in self.integratedUnits:
+                for j in xrange(self.unit[i].compNumber):
+                    self.unit[i].compartment[j].atualizeChannels(t)
+        elif len(self.activeComp) < self.totalNumberOfCompartments:
+            self.channelEngine.atualizeActiveChannels(t)
+        else:
+            self.channelEngine.atualizeChannels(t)
+
+    def dVdt(self, t, V, out = None): 
+        '''
+        Compute the potential derivative of all compartments of the motor unit pool.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V**: Vector with the current potential value of all neural
+            compartments of the pool.
+
+            + **out**: vector where the derivative is written. If None, a new
+            vector is allocated.
+        '''
+        self.computeIonicCurrent(t, V)
+        if out is None: out = np.empty_like(V)
+        np.add(self.iIonic, self.coupling.dot(V), out)
+        out += self.iInjected
+        out += self.EqCurrent_nA
+        out *= self.capacitanceInv
+        return out
+
+    def dVdtActive(self, t, V, out):
+        '''
+        Compute the potential derivative of the compartments of the motor units that are
+        integrated in the current time step (see the findIntegratedUnits method). It is the
+        version of the dVdt method used when the quiescentUnits parameter is skip.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V**: Vector with the current potential value of the compartments of activeComp.
+
+            + **out**: vector where the derivative is written.
+        '''
+        self.computeActiveIonicCurrent(t, V)
+        np.add(self.activeIonic, self.activeG.dot(V), out)
+        out += self.activeInjected_nA
+        out *= self.activeCapacitanceInv
+        return out
+
+    def computeActiveIonicCurrent(self, t, V):
+        '''
+        Computes the ionic and synaptic currents of the compartments of the motor units that
+        are integrated in the current time step and stores them in the activeIonic vector.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V**: Vector with the current potential value of the compartments of activeComp.
+        '''
+        if self.channelEngine is None:
+            for i, offset in zip(self.integratedUnits, self.activeOffset):
+                for j in xrange(self.unit[i].compNumber):
+                    if self.synapseEngine is None:
+                        current = self.unit[i].compartment[j].computeCurrent(t, V.item(offset+j))
+                    else:
+                        current = self.unit[i].compartment[j].computeChannelCurrent(t, V.item(offset+j))
+                    self.activeIonic.itemset(offset+j, current)
+        else:
+            self.activeIonic[:] = self.channelEngine.computeActiveCurrent(t, V)
+            if self.synapseEngine is None:
+                for position, synapse in self.activeSynapsesIn:
+                    self.activeIonic.itemset(position, self.activeIonic.item(position)
+                                             + synapse.computeCurrent(t, V.item(position)))
+        if self.synapseEngine is not None:
+            self.synapseEngine.computeActiveCurrent(t, V, self.activeIonic)
+
+    def computeIonicCurrent(self, t, V):
+        '''
+        Computes the ionic and synaptic currents of all compartments of the motor unit pool
+        and stores them in the iIonic vector.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V**: Vector with the current potential value of all neural
+            compartments of the pool.
+        '''
+        if self.integratedSynapsesIn is None: self.listSynapsesIn()
+        if self.channelEngine is None:
+            if self.synapseEngine is None:
+                for i in self.integratedUnits:
+                    for j in xrange(self.unit[i].compNumber):
+                        self.iIonic.itemset(self.compOffset[i]+j,
+                                            self.unit[i].compartment[j].computeCurrent(t,
+                                                                                       V.item(self.compOffset[i]+j)))
+            else:
+                for i in self.integratedUnits:
+                    for j in xrange(self.unit[i].compNumber):
+                        self.iIonic.itemset(self.compOffset[i]+j,
+                                            self.unit[i].compartment[j].computeChannelCurrent(t,
+                                                                                              V.item(self.compOffset[i]+j)))
+                self.synapseEngine.computeCurrent(t, V, self.iIonic)
+        else:
+            self.iIonic[:] = self.channelEngine.computeCurrent(t, V)
+            if self.synapseEngine is None:
+                for comp, synapse in self.integratedSynapsesIn:
+                    self.iIonic.itemset(comp, self.iIonic.item(comp) + synapse.computeCurrent(t, V.item(comp)))
+            else:
+                self.synapseEngine.computeCurrent(t, V, self.iIonic)
+
+    def implicitStep(self, t):
+        '''
+        Computes the membrane potential of all compartments of the motor unit pool
+        at the instant **t** + timeStep with the implicit method of the CableSolver object.
+        With the channel engine (channelEngine parameter *pool*), the conductances of the
+        ionic channels are treated implicitly. With the ChannelConductance objects
+        (channelEngine *objects*), the currents of the ionic channels are treated explicitly,
+        and only the conductance matrix G is implicit. The synaptic currents are always 
+        explicit. The ionic channels are evaluated once per time step.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        self.computeIonicCurrent(t, self.v_mV)
+        if self.channelEngine is None:
+            return self.cableSolver.atualizePotential(self.v_mV, np.zeros_like(self.v_mV),
+                                                      self.iIonic + self.iInjected + self.EqCurrent_nA,
+                                                      self.conf.timeStep_ms)
+        gTotal = self.channelEngine.gTotal_muS
+        return self.cableSolver.atualizePotential(self.v_mV, gTotal,
+                                                  self.iIonic + gTotal * self.v_mV
+                                                  + self.iInjected + self.EqCurrent_nA,
+                                                  self.conf.timeStep_ms)
+
+    def splitStep(self, t):
+        '''
+        Computes the membrane potential of all compartments of the motor unit pool
+        at the instant **t** + timeStep with operator splitting. The passive part (conductance
+        matrix, injected and equilibrium currents) is advanced with the exact propagator of the
+        PassivePropagator object and the ionic and synaptic currents, evaluated once per time step,
+        are integrated with the conductances fixed.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        self.computeIonicCurrent(t, self.v_mV)
+        if self.channelEngine is None:
+            gTotal = np.zeros_like(self.v_mV)
+        else:
+            gTotal = self.channelEngine.gTotal_muS
+        return self.propagator.atualizePotential(self.v_mV, gTotal, self.iIonic,
+                                                 self.iInjected + self.EqCurrent_nA)
+
+    def listSynapsesIn(self):
+        '''
+        Lists the synapses of the pool that receive at least one synaptic conductance.
+        '''
+        self.synapsesIn = []
         for i in xrange(self.MUnumber):
             for j in xrange(self.unit[i].compNumber):
-                self.iIonic.itemset(i*self.unit[0].compNumber+j,
-                                    self.unit[i].compartment[j].computeCurrent(t,
-                                                                               V.item(i*self.unit[0].compNumber+j)))
-        return (self.iIonic + self.G.dot(V) + self.iInjected
-                + self.EqCurrent_nA) * self.capacitanceInv
-        
-        
-             
-        #return (self.iIonic + SpMV_viaMKL(self.G,V,self.MUnumber, self.sizeOfBlock) + self.iInjected
-        #        + self.EqCurrent_nA) * self.capacitanceInv
-       
+                for synapse in self.unit[i].compartment[j].SynapsesIn:
+                    if synapse.numberOfIncomingSynapses:
+                        self.synapsesIn.append((self.compOffset[i] + j, synapse))
+        self.integratedSynapsesIn = self.synapsesIn
+        if self.conf.synapseEngine == 'pool':
+            self.synapseEngine = SynapseEngine(self.conf, self.synapsesIn, self.totalNumberOfCompartments)
+
+    def findIntegratedUnits(self):
+        '''
+        Finds the motor units that must be integrated in the current time step, when the
+        quiescentUnits parameter is skip. A motor unit is quiescent, and is not integrated,
+        when all its compartments are at the resting potential, with no injected current, 
+        with all the states of the ionic channels settled at their asymptotic values and 
+        with no synaptic conductance or synaptic pulse waiting in the Synapse queues. The 
+        membrane potential of a quiescent motor unit stays at its resting value, so it is
+        kept constant. The motor unit is woken by the next incoming spike, injected 
+        current or change of state of its ionic channels. When the set of motor units 
+        changes, the compartments evaluated and integrated are chosen again (see the 
+        setActiveCompartments method).
+        '''
+        if self.synapsesIn is None: self.listSynapsesIn()
+        active = np.logical_or(np.abs(self.v_mV - self.vRest_mV) > self.voltageTolerance_mV,
+                               self.iInjected != 0)
+        activeUnit = np.bincount(self.compUnit[active], minlength = self.MUnumber) > 0
+        # The channels and synapses are only checked when some motor unit is at rest.
+        if not activeUnit.all():
+            if self.channelEngine is None:
+                for i in xrange(self.MUnumber):
+                    if activeUnit[i]: continue
+                    for j in xrange(self.unit[i].compNumber):
+                        for channel in self.unit[i].compartment[j].Channels:
+                            for condState in channel.condState:
+                                if (condState.state or
+                                    abs(condState.value - (condState.actType != 'activation'))
+                                    > self.stateTolerance):
+                                    active[self.compOffset[i] + j] = True
+            else:
+                active |= self.channelEngine.unsettledCompartments(self.stateTolerance)
+            if self.synapseEngine is None:
+                for comp, synapse in self.synapsesIn:
+                    if (synapse.inQueue or synapse.outQueue or
+                        abs(synapse.Ron) + abs(synapse.Roff) > self.stateTolerance):
+                        active[comp] = True
+            else:
+                active |= self.synapseEngine.activeCompartments(self.stateTolerance)
+            activeUnit = np.bincount(self.compUnit[active], minlength = self.MUnumber) > 0
+
+        if np.array_equal(activeUnit, np.logical_not(self.quiescentUnit)): return
+        self.quiescentUnit = np.logical_not(activeUnit)
+        self.quiescentComp = self.quiescentUnit[self.compUnit]
+        self.integratedUnits = np.flatnonzero(activeUnit).tolist()
+        self.setActiveCompartments(np.flatnonzero(np.logical_not(self.quiescentComp)))
+
+    def setActiveCompartments(self, comps):
+        '''
+        Builds the vectors and the conductance matrix used in the integration of the
+        compartments of the motor units of integratedUnits, and chooses the compartments
+        evaluated by the channel and synapse engines.
+
+        - Inputs:
+            + **comps**: vector with the indices of the compartments of the motor units of
+            integratedUnits.
+        '''
+        self.activeComp = comps
+        self.activeOffset = np.searchsorted(comps, self.compOffset[self.integratedUnits]).tolist()
+        if len(comps) < self.totalNumberOfCompartments:
+            self.activeG = self.coupling.csr[comps][:, comps]
+            self.activeIntegrator = RungeKuttaWorkspace(len(comps), self.conf.floatType)
+            self.activeCapacitanceInv = self.capacitanceInv[comps]
+            self.activeIonic = np.zeros_like(self.activeCapacitanceInv)
+        if self.channelEngine is not None:
+            self.channelEngine.setActiveCompartments(comps)
+        if self.synapseEngine is not None:
+            self.synapseEngine.setActiveCompartments(comps)
+        else:
+            activeComp = np.logical_not(self.quiescentComp)
+            self.integratedSynapsesIn = [(comp, synapse) for comp, synapse in self.synapsesIn
+                                         if activeComp[comp]]
+            position = np.searchsorted(comps, [comp for comp, synapse in self.integratedSynapsesIn])
+            self.activeSynapsesIn = zip(position.tolist(), [synapse for comp, synapse
+                                                            in self.integratedSynapsesIn])
 
     def listSpikes(self):
         '''
@@ -286,5 +682,15 @@ class MotorUnitPool(object):
         self.emg = np.zeros((int(np.rint(self.conf.simDuration_ms/self.conf.timeStep_ms)), 1), dtype=float)
 
         for i in xrange(self.MUnumber): self.unit[i].reset()
+        self.delayBank.reset()
+        self.integratedUnits = range(self.MUnumber)
+        self.integratedSynapsesIn = self.synapsesIn
+        self.quiescentUnit.fill(False)
+        if self.conf.quiescentUnits == 'skip':
+            self.quiescentComp.fill(False)
+            if self.synapsesIn is not None:
+                self.setActiveCompartments(np.arange(self.totalNumberOfCompartments))
+        if self.channelEngine is not None: self.channelEngine.reset()
+        if self.synapseEngine is not None: self.synapseEngine.reset()
         self.Activation.reset()
         self.Muscle.reset()
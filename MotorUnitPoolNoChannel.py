@@ -21,7 +21,9 @@ from MuscularActivation import MuscularActivation
 from MuscleNoHill import MuscleNoHill
 from MuscleHill import MuscleHill
 from MuscleSpindle import MuscleSpindle
+from PassivePropagator import PassivePropagator
 from scipy.sparse import lil_matrix
+from RungeKutta import RungeKuttaWorkspace
 #import pyculib.sparse as pcu
 import time
 #from numba import jit, prange
@@ -70,14 +72,6 @@ def SpMV_viaMKL( A, x, numberOfBlocks, sizeOfBlock ):
 
     return y
 
-def runge_kutta(derivativeFunction,t, x, timeStep, timeStepByTwo, timeStepBySix):
-    k1 = derivativeFunction(t, x)
-    k2 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k1)
-    k3 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k2)
-    k4 = derivativeFunction(t + timeStep, x + timeStep * k3)
-    
-    return x + timeStepBySix * (np.add(np.add(np.add(k1, k2, order = 'C'), np.add(k2, k3, order='C')), np.add(k3, k4, order='C'), order='C'))
-
 class MotorUnitPoolNoChannel(object):
     '''
     Class that implements a motor unit pool. Encompasses a set of motor
@@ -161,6 +155,17 @@ class MotorUnitPoolNoChannel(object):
                     = self.unit[i].EqCurrent_nA
         self.sizeOfBlock = int(self.totalNumberOfCompartments/self.MUnumber)
         self.G = self.G.tobsr(blocksize=(self.sizeOfBlock, self.sizeOfBlock)) 
+        ## RungeKuttaWorkspace object with the vectors used in the integration of the membrane potential.
+        self.integrator = RungeKuttaWorkspace(self.totalNumberOfCompartments)
+        ## PassivePropagator object with the exact propagator of the compartments. It is None 
+        ## when the integrationMethod is not exponential. The compartments have no ionic channels,
+        ## so with the synaptic currents constant during the time step the solution is exact.
+        if self.conf.integrationMethod == 'exponential':
+            self.propagator = PassivePropagator(self.conf, self.unit,
+                                                [i*self.unit[i].compNumber for i in xrange(self.MUnumber)],
+                                                self.capacitanceInv)
+        else:
+            self.propagator = None
         '''
         self.G  = pcu.csr_matrix(self.G)
         self.GPU = pcu.Sparse(0)
@@ -211,10 +216,15 @@ class MotorUnitPoolNoChannel(object):
             + **t**: current instant, in ms.
         '''
 
-        np.clip(runge_kutta(self.dVdt, t, self.v_mV, self.conf.timeStep_ms,
-                            self.conf.timeStepByTwo_ms,
-                            self.conf.timeStepBySix_ms),
-                            -30.0, 120.0, self.v_mV)
+        if self.propagator is None:
+            np.clip(self.integrator.step(self.dVdt, t, self.v_mV, self.conf.timeStep_ms,
+                                         self.conf.timeStepByTwo_ms,
+                                         self.conf.timeStepBySix_ms),
+                                         -30.0, 120.0, self.v_mV)
+        else:
+            self.computeSynapticCurrent(t, self.v_mV)
+            np.clip(self.propagator.propagate(self.v_mV, self.iIonic + self.iInjected + self.EqCurrent_nA),
+                    -30.0, 120.0, self.v_mV)
                             
         for i in xrange(self.MUnumber):
             self.unit[i].atualizeMotorUnit(t, self.v_mV[i*self.unit[i].compNumber:(i+1)*self.unit[i].compNumber])
@@ -225,15 +235,15 @@ class MotorUnitPoolNoChannel(object):
                                            self.Muscle.accelerationNorm, 
                                            31, 33)
     
-    def dVdt(self, t, V): 
+    def dVdt(self, t, V, out = None): 
         
-        for i in xrange(self.MUnumber):
-            for j in xrange(self.unit[i].compNumber):
-                self.iIonic.itemset(i*self.unit[0].compNumber+j,
-                                    self.unit[i].compartment[j].computeCurrent(t,
-                                                                               V.item(i*self.unit[0].compNumber+j)))
-        return (self.iIonic + self.G.dot(V) + self.iInjected
-                + self.EqCurrent_nA) * self.capacitanceInv
+        self.computeSynapticCurrent(t, V)
+        if out is None: out = np.empty_like(V)
+        np.add(self.iIonic, self.G.dot(V), out)
+        out += self.iInjected
+        out += self.EqCurrent_nA
+        out *= self.capacitanceInv
+        return out
         
         
              
@@ -241,6 +251,23 @@ class MotorUnitPoolNoChannel(object):
         #        + self.EqCurrent_nA) * self.capacitanceInv
        
 
+    def computeSynapticCurrent(self, t, V):
+        '''
+        Computes the synaptic currents of all compartments of the motor unit pool
+        and stores them in the iIonic vector.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V**: Vector with the current potential value of all neural
+            compartments of the pool.
+        '''
+        for i in xrange(self.MUnumber):
+            for j in xrange(self.unit[i].compNumber):
+                self.iIonic.itemset(i*self.unit[0].compNumber+j,
+                                    self.unit[i].compartment[j].computeCurrent(t,
+                                                                               V.item(i*self.unit[0].compNumber+j)))
+
     def listSpikes(self):
         '''
         List the spikes that occurred in the soma and in
@@ -30,9 +30,9 @@ class MuscleNoHill(object):
         self.MUtypeInumber = MUtypeInumber
 
         ## Twitch- tetanus relationship (see atualizeForceNoHill function explanation)
-        self.twTet = np.zeros((self.MUnumber, 1), dtype = float)
+        self.twTet = np.zeros((self.MUnumber, 1), dtype = self.conf.floatType)
         ## Amplitude of the muscle unit twitch, in N (see atualizeForceNoHill function explanation).
-        self.twitchAmp_N = np.zeros((self.MUnumber, 1), dtype = float)
+        self.twitchAmp_N = np.zeros((self.MUnumber, 1), dtype = self.conf.floatType)
 
         for i in xrange(0, self.MUnumber):
             self.twitchAmp_N[i] = unit[i].TwitchAmp_N
@@ -41,7 +41,7 @@ class MuscleNoHill(object):
         ## the muscle reach when the Hill model is not used. 
         self.maximumActivationForce = self.twitchAmp_N * self.twTet    
         ## Muscle force along time, in N.
-        self.force = np.zeros((int(np.rint(conf.simDuration_ms/conf.timeStep_ms)), 1), dtype = float)
+        self.force = np.zeros((int(np.rint(conf.simDuration_ms/conf.timeStep_ms)), 1), dtype = self.conf.floatType)
         
         self.timeIndex = 0
 
@@ -116,6 +116,6 @@ class MuscleNoHill(object):
         '''
 
         '''
-        self.force = np.zeros((int(np.rint(self.conf.simDuration_ms/self.conf.timeStep_ms)), 1), dtype = float)        
+        self.force = np.zeros((int(np.rint(self.conf.simDuration_ms/self.conf.timeStep_ms)), 1), dtype = self.conf.floatType)        
         self.timeIndex = 0
         
\ No newline at end of file
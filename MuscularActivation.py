@@ -134,8 +134,10 @@ class MuscularActivation(object):
         self.an[3*self.MUindices] = self.activation_nonSat[self.MUindices]
         self.an[3*self.MUindices+2] =  0
 
+        # The spikes that arrived at the terminals in the previous time step.
+        step = self.conf.tick(t) - 1
         for i in xrange(self.MUnumber):
-            if unit[i].terminalSpikeTrain and -1e-6 < (t - self.conf.timeStep_ms - unit[i].terminalSpikeTrain[-1][0]) < 1e-6: 
+            if unit[i].terminalSpikeStep == step: 
                 MUspike = np.append(MUspike,i)
                
         self.an[3*MUspike+2] = self.diracDeltaValue[MUspike]
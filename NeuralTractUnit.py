@@ -75,8 +75,7 @@ class NeuralTractUnit(object):
             + **FR**:
         '''
 
-        self.spikesGenerator.atualizeGenerator(t, FR, GammaOrder)
-        if self.terminalSpikeTrain and -1e-3 < (t - self.terminalSpikeTrain[-1][0]) < 1e-3:
+        if self.spikesGenerator.atualizeGenerator(t, FR, GammaOrder):
             self.transmitSpikes(t)
 
     def transmitSpikes(self, t):
@@ -87,6 +86,16 @@ class NeuralTractUnit(object):
         for i in xrange(len(self.indicesOfSynapsesOnTarget)):
             self.transmitSpikesThroughSynapses[i].receiveSpike(t, self.indicesOfSynapsesOnTarget[i])
 
+    def transmitSpikesRouter(self, t):
+        '''
+        Transmits the spike through the SpikeRouter, that replaces the transmitSpikes
+        method when all the targets of the unit are in synapse engines.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+        '''
+        self.router.transmit(t, self.routerIndex)
+
     def reset(self):
         self.spikesGenerator.reset()
         self.terminalSpikeTrain = self.spikesGenerator.points
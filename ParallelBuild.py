@@ -0,0 +1,85 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import multiprocessing
+from BuildCache import BuildCache
+
+## Minimum number of units built by each process. Smaller pools are built serially, since
+## starting the processes would take longer than building the units.
+minimumUnitsPerProcess = 20
+
+## Configuration object and class of the units built by the worker processes. They are
+## inherited by the processes when they are started (fork), so they are not sent to them.
+workerConf = None
+workerConstructor = None
+
+
+def buildChunk(arguments):
+    '''
+    Builds the units of a list of arguments in a worker process and returns them as a
+    string written by the BuildCache.dumps method, so the Configuration object and the
+    nerve stimulus vectors are replaced by the ones of the main process.
+    '''
+    units = [workerConstructor(workerConf, *unitArguments) for unitArguments in arguments]
+    return BuildCache(workerConf).dumps(units)
+
+
+def buildUnits(conf, constructor, arguments):
+    '''
+    Builds the units of a pool, in parallel when the buildProcesses parameter is greater
+    than 1. The units are split in consecutive chunks, one per process. Since each unit
+    draws its random numbers from its own generator (see the randomState method of the
+    Configuration class), the units are the same for any number of processes.
+
+    - Inputs:
+        + **conf**: Configuration object with the simulation parameters.
+
+        + **constructor**: class of the units, such as MotorUnit or AfferentUnit.
+
+        + **arguments**: list with the tuple of arguments, after conf, of the constructor
+        of each unit.
+
+    - Output:
+        + List with the units, in the order of **arguments**.
+    '''
+    global workerConf, workerConstructor
+    processes = conf.buildProcesses if conf.buildProcesses > 0 else multiprocessing.cpu_count()
+    processes = min(processes, len(arguments) // minimumUnitsPerProcess)
+    if processes <= 1:
+        return [constructor(conf, *unitArguments) for unitArguments in arguments]
+
+    chunkSize = -(-len(arguments) // processes)
+    chunks = [arguments[i:i + chunkSize] for i in xrange(0, len(arguments), chunkSize)]
+    workerConf = conf
+    workerConstructor = constructor
+    workers = multiprocessing.Pool(processes)
+    try:
+        results = workers.map(buildChunk, chunks, 1)
+    finally:
+        workers.close()
+        workers.join()
+        workerConf = None
+        workerConstructor = None
+
+    cache = BuildCache(conf)
+    units = []
+    for result in results:
+        units.extend(cache.loads(result))
+    return units
@@ -0,0 +1,173 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import numpy as np
+from scipy.linalg import expm
+
+
+class PassivePropagator(object):
+    '''
+    Class that implements the exact discrete-time propagator of the passive (linear)
+    part of the membrane potential equation of the compartments of a pool:
+
+    \f{equation}{
+        \frac{dV}{dt} = C^{-1}\left(GV + I\right)
+    \f}
+    where \f$I\f$ is constant during the time step. The propagator
+    \f$e^{A\Delta t}\f$, with \f$A = C^{-1}G\f$, is computed once for each unit at the
+    construction. The units with the same number of compartments are grouped, so
+    each time step is a batched product of small matrices.
+    '''
+
+    def __init__(self, conf, unit, compOffset, capacitanceInv):
+        '''
+        Constructor
+
+        - Inputs:
+            + **conf**: Configuration object with the simulation parameters.
+
+            + **unit**: dictionary with the units of the pool. Each unit has the matrix G,
+            with the conductances of the compartments of the unit.
+
+            + **compOffset**: vector with the index, in the pool vectors, of the first
+            compartment of each unit.
+
+            + **capacitanceInv**: vector with the inverse of the capacitance, in 1/nF, of
+            all the compartments of the pool.
+        '''
+        self.conf = conf
+        ## Time step, in ms, used to compute the propagators.
+        self.timeStep_ms = conf.timeStep_ms
+        ## Vector with the inverse of the capacitance, in 1/nF, of all the compartments.
+        self.capacitanceInv = np.asarray(capacitanceInv, dtype = conf.floatType)
+
+        byCompNumber = dict()
+        for i in xrange(len(unit)):
+            byCompNumber.setdefault(unit[i].compNumber, []).append(i)
+
+        ## List of tuples (index, P, Q), one for each number of compartments. The index is
+        ## the matrix (unit x compartment) with the indices in the pool vectors, P is the
+        ## propagator \f$e^{A\Delta t}\f$ of each unit and Q is the matrix
+        ## \f$\int_0^{\Delta t}e^{As}ds\,C^{-1}\f$, that multiplies the constant current. They are
+        ## computed in double precision and stored with the floating-point type of the simulation.
+        self.groups = []
+        for n in sorted(byCompNumber):
+            units = byCompNumber[n]
+            index = np.array([compOffset[i] + np.arange(n) for i in units], dtype = int)
+            P = np.empty((len(units), n, n), dtype = conf.floatType)
+            Q = np.empty_like(P)
+            for k, i in enumerate(units):
+                P[k], Q[k] = self.computePropagator(np.asarray(unit[i].G, dtype = float).reshape((n, n)),
+                                                    np.asarray(capacitanceInv, dtype = float)[index[k]])
+            self.groups.append((index, P, Q))
+
+    def computePropagator(self, G, capacitanceInv):
+        '''
+        Computes the propagator of one unit from the exponential of the augmented matrix:
+
+        \f{equation}{
+            \exp\left(\left[\begin{array}{cc}A & I\\0 & 0\end{array}\right]\Delta t\right) =
+            \left[\begin{array}{cc}e^{A\Delta t} & \int_0^{\Delta t}e^{As}ds\\0 & I\end{array}\right]
+        \f}
+
+        - Inputs:
+            + **G**: conductance matrix of the unit, in \f$\mu\f$S.
+
+            + **capacitanceInv**: vector with the inverse of the capacitance, in 1/nF, of the
+            compartments of the unit.
+
+        - Output:
+            + the propagator \f$e^{A\Delta t}\f$ and the matrix \f$\int_0^{\Delta t}e^{As}ds\,C^{-1}\f$.
+        '''
+        n = G.shape[0]
+        M = np.zeros((2*n, 2*n), dtype = float)
+        M[:n, :n] = capacitanceInv[:, np.newaxis] * G * self.timeStep_ms
+        M[:n, n:] = np.eye(n) * self.timeStep_ms
+        E = expm(M)
+        return E[:n, :n], E[:n, n:] * capacitanceInv[np.newaxis, :]
+
+    def propagate(self, V, iConstant):
+        '''
+        Computes the membrane potential after one time step of the passive part.
+
+        - Inputs:
+            + **V**: vector with the membrane potential, in mV, of all the compartments.
+
+            + **iConstant**: vector with the current, in nA, of each compartment, constant
+            during the time step.
+
+        - Output:
+            + vector with the membrane potential, in mV, at the next instant.
+        '''
+        Vnew = np.empty_like(V)
+        for index, P, Q in self.groups:
+            Vnew[index] = (np.einsum('kij,kj->ki', P, V[index])
+                           + np.einsum('kij,kj->ki', Q, iConstant[index]))
+        return Vnew
+
+    def activeStep(self, V, gTotal, iActive, timeStep):
+        '''
+        Integrates the active part of the membrane potential equation, with the conductances
+        and the synaptic currents fixed during **timeStep**:
+
+        \f{equation}{
+            V(t+h) = V(t) + \frac{1 - e^{-kh}}{k}C^{-1}I_{active}(t), \quad k = C^{-1}g_{total}
+        \f}
+        that becomes an Euler step when \f$k = 0\f$.
+
+        - Inputs:
+            + **V**: vector with the membrane potential, in mV.
+
+            + **gTotal**: vector with the conductance, in \f$\mu\f$S, of the active currents.
+
+            + **iActive**: vector with the active current, in nA, at **V**.
+
+            + **timeStep**: length, in ms, of the step.
+        '''
+        k = gTotal * self.capacitanceInv
+        factor = np.full_like(k, timeStep)
+        moving = k > 0
+        factor[moving] = -np.expm1(-k[moving] * timeStep) / k[moving]
+        return V + factor * self.capacitanceInv * iActive
+
+    def atualizePotential(self, V, gTotal, iActive, iPassive):
+        '''
+        Computes the membrane potential of all the compartments after one time step with the
+        Strang splitting: half step of the active part, the exact propagator of the passive part
+        and another half step of the active part. The active current is linear in V with the
+        conductances fixed, so it is not evaluated again in the second half step.
+
+        - Inputs:
+            + **V**: vector with the membrane potential, in mV, at the current instant.
+
+            + **gTotal**: vector with the conductance, in \f$\mu\f$S, of the active currents.
+
+            + **iActive**: vector with the active (ionic and synaptic) current, in nA, at **V**.
+
+            + **iPassive**: vector with the constant current of the passive part (injected
+            and equilibrium currents), in nA.
+
+        - Output:
+            + vector with the membrane potential, in mV, at the next instant.
+        '''
+        halfStep = self.timeStep_ms / 2.0
+        Vhalf = self.activeStep(V, gTotal, iActive, halfStep)
+        Vprop = self.propagate(Vhalf, iPassive)
+        return self.activeStep(Vprop, gTotal, iActive + gTotal * (V - Vprop), halfStep)
@@ -29,13 +29,15 @@ import math
 
 
 #@jit
-def  gammaPoint(GammaOrder):
+def  gammaPoint(GammaOrder, randomState = numpy.random):
     '''
     Generates a number according to a Gamma Distribution with an integer order **GammaOrder**.
 
     - Inputs:
         + **GammaOrder**: integer order of the Gamma distribution.
 
+        + **randomState**: generator of random numbers. The default is the numpy generator.
+
        
     - Outputs:
         + The number generated from the Gamma distribution.
@@ -52,14 +54,14 @@ def  gammaPoint(GammaOrder):
      
      
 
-    return - 1.0/GammaOrder * np.log(np.prod(numpy.random.uniform(0.0, 1.0, size=GammaOrder)))
+    return - 1.0/GammaOrder * np.log(np.prod(randomState.uniform(0.0, 1.0, size=GammaOrder)))
 
 class PointProcessGenerator(object):
     '''
     Generator of point processes.
     '''
     
-    def __init__(self,  index):
+    def __init__(self,  index, randomState = numpy.random):
         '''
         Constructor
 
@@ -67,6 +69,9 @@ class PointProcessGenerator(object):
             + **GammaOrder**: integer order of the Gamma distribution.
 
             + **index**: integer corresponding to the unit order in the pool.
+
+            + **randomState**: generator of random numbers of the initial threshold. The
+            default is the numpy generator.
         '''
        
         ## Integer corresponding to the unit order in the pool to which this
@@ -75,7 +80,7 @@ class PointProcessGenerator(object):
 
         ## Auxiliary variable cummulating a value that indicates
         ## whether there will be a new spike or not.
-        self.threshold = gammaPoint(1)
+        self.threshold = gammaPoint(1, randomState)
 
         
         ## List of spike instants of the generator.
@@ -88,11 +93,16 @@ class PointProcessGenerator(object):
             + **t**: current instant, in ms.
 
             + **firingRate**: instant firing rate, in spikes/s.
+
+        - Output:
+            + True if a spike was generated at the instant **t**.
         '''
-        if self.threshold <= 0 and t != 0:
+        spike = self.threshold <= 0 and t != 0
+        if spike:
             self.points.append([t, self.index])
             self.threshold = gammaPoint(GammaOrder)
         self.threshold -= firingRate
+        return spike
 
     def reset(self):
         self.points = []
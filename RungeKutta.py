@@ -0,0 +1,130 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import numpy as np
+
+
+def runge_kutta(derivativeFunction, t, x, timeStep, timeStepByTwo,  timeStepBySix):
+    '''
+    Function to implement the fourth order Runge-Kutta Method to solve numerically a
+    differential equation.
+
+    - Inputs:
+        + **derivativeFunction**: function that corresponds to the derivative of the differential equation.
+
+        + **t**: current instant.
+
+        + **x**:  current state value.
+
+        + **timeStep**: time step of the solution of the differential equation, in the same unit of t.
+
+        + **timeStepByTwo**:  timeStep divided by two, for computational efficiency.
+
+        + **timeStepBySix**: timeStep divided by six, for computational efficiency.
+
+    This method is intended to solve the following differential equation:
+
+    \f{equation}{
+        \frac{dx(t)}{dt} = f(t, x(t))
+    \f}
+    First, four derivatives are computed:
+
+    \f{align}{
+        k_1 &= f(t,x(t))\\
+        k_2 &= f(t+\frac{\Delta t}{2}, x(t) + \frac{\Delta t}{2}.k_1)\\
+        k_3 &= f(t+\frac{\Delta t}{2}, x(t) + \frac{\Delta t}{2}.k_2)\\
+        k_4 &= f(t+\Delta t, x(t) + \Delta t.k_3)
+    \f}
+    where \f$\Delta t\f$ is the time step of the numerical solution of the
+    differential equation.
+
+    Then the value of \f$x(t+\Delta t)\f$ is computed with:
+
+    \f{equation}{
+        x(t+\Delta t) = x(t) + \frac{\Delta t}{6}(k_1 + 2k_2 + 2k_3+k_4)
+    \f}
+    '''
+    k1 = derivativeFunction(t, x)
+    k2 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k1)
+    k3 = derivativeFunction(t + timeStepByTwo, x + timeStepByTwo * k2)
+    k4 = derivativeFunction(t + timeStep, x + timeStep * k3)
+
+    return x + timeStepBySix * (k1 + k2 + k2 + k3 + k3 + k4)
+
+
+class RungeKuttaWorkspace(object):
+    '''
+    Class that implements the fourth order Runge-Kutta Method (see the runge_kutta
+    function) with preallocated vectors for the derivatives and for the intermediate
+    states. The stages are computed in place, so no vector is allocated at each time step.
+    The derivative function must write the derivative in the vector given as its third
+    argument: derivativeFunction(t, x, out).
+    '''
+
+    def __init__(self, size, dtype = float):
+        '''
+        Constructor
+
+        - Inputs:
+            + **size**: integer with the number of elements of the state vector.
+
+            + **dtype**: type of the elements of the state vector.
+        '''
+        ## Vectors with the derivatives of the four stages.
+        self.k1 = np.zeros((size), dtype = dtype)
+        self.k2 = np.zeros_like(self.k1)
+        self.k3 = np.zeros_like(self.k1)
+        self.k4 = np.zeros_like(self.k1)
+        ## Vector with the state of the intermediate stages.
+        self.xStage = np.zeros_like(self.k1)
+        ## Vector with the state at the end of the time step.
+        self.xNext = np.zeros_like(self.k1)
+
+    def step(self, derivativeFunction, t, x, timeStep, timeStepByTwo,  timeStepBySix):
+        '''
+        Computes the state after one time step. The inputs are the same as the
+        runge_kutta function, and the operations are done in the same order, so the
+        results are identical.
+
+        - Output:
+            + The vector xNext, with the state at the instant t + timeStep. It is
+            overwritten at the next call.
+        '''
+        k1, k2, k3, k4, xStage, xNext = self.k1, self.k2, self.k3, self.k4, self.xStage, self.xNext
+
+        derivativeFunction(t, x, k1)
+        np.multiply(k1, timeStepByTwo, xStage)
+        xStage += x
+        derivativeFunction(t + timeStepByTwo, xStage, k2)
+        np.multiply(k2, timeStepByTwo, xStage)
+        xStage += x
+        derivativeFunction(t + timeStepByTwo, xStage, k3)
+        np.multiply(k3, timeStep, xStage)
+        xStage += x
+        derivativeFunction(t + timeStep, xStage, k4)
+
+        np.add(k1, k2, xNext)
+        xNext += k2
+        xNext += k3
+        xNext += k3
+        xNext += k4
+        xNext *= timeStepBySix
+        xNext += x
+        return xNext
@@ -0,0 +1,135 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import numpy as np
+
+
+class SpikeRouter(object):
+    '''
+    Class that delivers the spikes of all the presynaptic units to the synapse engines
+    (see SynapseEngine) of the pools with a routing table in CSR layout: the targets of
+    the unit with router index u are the elements self.unitPtr[u]:self.unitPtr[u+1] of the
+    vectors targetEngine (index of the engine) and targetConductance (index of the
+    individual conductance in the engine). The table is built once, after all the
+    synapses were built by SynapsesFactory, from the lists transmitSpikesThroughSynapses
+    and indicesOfSynapsesOnTarget of the units.
+
+    The spikes transmitted by the units are buffered and are scattered to the engines in
+    a single vectorized operation for each engine, at the next evaluation of any of the
+    synapse engines. The units with a target without synapse engine keep transmitting
+    their spikes through the Synapse objects.
+    '''
+
+    def __init__(self, conf, pools):
+        '''
+        Constructor
+
+        - Inputs:
+            + **conf**: Configuration object with the simulation parameters.
+
+            + **pools**: list of all the pools in the system.
+        '''
+        self.conf = conf
+        for i in xrange(len(pools)):
+            if hasattr(pools[i], 'listSynapsesIn') and pools[i].synapsesIn is None:
+                pools[i].listSynapsesIn()
+
+        ## List of the synapse engines that receive spikes from the router.
+        self.engines = []
+        engineIndex = dict()
+        ## List of the units whose spikes are delivered by the router, in the
+        ## order of their router index.
+        self.units = []
+        unitTargets = [0]
+        targetEngine = []
+        targetConductance = []
+        for i in xrange(len(pools)):
+            for j in xrange(len(pools[i].unit)):
+                unit = pools[i].unit[j]
+                if not hasattr(unit, 'transmitSpikesRouter') or not unit.transmitSpikesThroughSynapses:
+                    continue
+                synapses = unit.transmitSpikesThroughSynapses
+                if any(getattr(synapse, 'engine', None) is None for synapse in synapses):
+                    continue
+                for synapse, k in zip(synapses, unit.indicesOfSynapsesOnTarget):
+                    if id(synapse.engine) not in engineIndex:
+                        engineIndex[id(synapse.engine)] = len(self.engines)
+                        self.engines.append(synapse.engine)
+                    targetEngine.append(engineIndex[id(synapse.engine)])
+                    targetConductance.append(synapse.engine.synapsePtr[synapse.engineIndex] + k)
+                unitTargets.append(len(synapses))
+                unit.router = self
+                unit.routerIndex = len(self.units)
+                unit.transmitSpikes = unit.transmitSpikesRouter
+                self.units.append(unit)
+
+        ## Vector with the index of the first target of each unit (CSR layout).
+        self.unitPtr = np.cumsum(unitTargets, dtype = int)
+        ## Vector with the index, in the list engines, of the engine of each target.
+        self.targetEngine = np.array(targetEngine, dtype = int)
+        ## Vector with the index, in its engine, of the individual conductance of each target.
+        self.targetConductance = np.array(targetConductance, dtype = int)
+        for engine in self.engines:
+            engine.router = self
+
+        ## List with the router index of the units that transmitted a spike since the last delivery.
+        self.pendingUnits = []
+        ## List with the instants, in ms, of the spikes of pendingUnits.
+        self.pendingTimes = []
+
+        print 'The spikes of ' + str(len(self.units)) + ' units are routed to ' + str(len(self.engines)) + ' synapse engines'
+
+    def transmit(self, t, unit):
+        '''
+        Buffers a spike of a unit. The spike is delivered at the next call of the flush method.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **unit**: integer with the router index of the unit.
+        '''
+        self.pendingUnits.append(unit)
+        self.pendingTimes.append(t)
+
+    def flush(self):
+        '''
+        Delivers the buffered spikes to the synapse engines. The targets of all the
+        buffered spikes are gathered from the routing table, in the order in which the
+        spikes were transmitted, and each engine receives its spikes with a single call
+        of its receiveSpikes method.
+        '''
+        if not self.pendingUnits: return
+        units = np.array(self.pendingUnits, dtype = int)
+        times = np.array(self.pendingTimes, dtype = float)
+        self.pendingUnits = []
+        self.pendingTimes = []
+
+        first = self.unitPtr[units]
+        counts = self.unitPtr[units + 1] - first
+        targets = (np.arange(counts.sum()) + np.repeat(first - np.cumsum(counts) + counts, counts))
+        times = np.repeat(times, counts)
+        engines = self.targetEngine[targets]
+        conductances = self.targetConductance[targets]
+        if len(self.engines) == 1:
+            self.engines[0].receiveSpikes(times, conductances)
+        else:
+            for k in xrange(len(self.engines)):
+                spikes = engines == k
+                if spikes.any(): self.engines[k].receiveSpikes(times[spikes], conductances[spikes])
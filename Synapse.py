@@ -392,6 +392,14 @@ class Synapse(object):
 
         self.inQueue = deque([])
         self.outQueue = deque([])
+        ## Largest delay, in ms, between the instant of the beginning or of the end of a pulse and
+        ## the instant in which it is processed. When the spikeTiming parameter is step the
+        ## instants are multiples of the time step and must match; when it is interpolated the
+        ## pulses are processed at the first evaluation of the synapse after their instants.
+        if conf.spikeTiming == 'interpolated':
+            self.lateTolerance_ms = float('inf')
+        else:
+            self.lateTolerance_ms = 1e-3
 
         self.dynamicGmax = np.array([])
         ## List of individual conductance constribution
@@ -425,10 +433,10 @@ class Synapse(object):
                                            dtype=float) * float("-inf")
             self.conductanceState = np.zeros_like(self.gmax_muS,
                                                   dtype=int)
-            self.ri = np.zeros_like(self.gmax_muS, dtype=float)
+            self.ri = np.zeros_like(self.gmax_muS, dtype=self.conf.floatType)
             self.ti = np.zeros_like(self.gmax_muS, dtype=float)
-            self.dynamicGmax = np.zeros_like(self.gmax_muS, dtype=float)
-            self.synContrib = self.gmax_muS / self.gMaxTot_muS
+            self.dynamicGmax = np.zeros_like(self.gmax_muS, dtype=self.conf.floatType)
+            self.synContrib = (self.gmax_muS / self.gMaxTot_muS).astype(self.conf.floatType)
             self.computeCurrent = self.computeCurrent2
         
         return self.computeConductance(t) * (self.EqPot_mV - V_mV)
@@ -459,12 +467,12 @@ class Synapse(object):
         
         idxBeginPulse = []
         
-        while len(self.inQueue) and  -1e-3 < t - self.tBeginOfPulse[self.inQueue[0]] < 1e-3:
+        while len(self.inQueue) and  -1e-3 < t - self.tBeginOfPulse[self.inQueue[0]] < self.lateTolerance_ms:
             idxBeginPulse.append(self.inQueue.popleft())
 
         idxEndPulse = []
                 
-        while len(self.outQueue) and -1e-3 < t - self.tEndOfPulse[self.outQueue[0]] < 1e-3:
+        while len(self.outQueue) and -1e-3 < t - self.tEndOfPulse[self.outQueue[0]] < self.lateTolerance_ms:
             idxEndPulse.append(self.outQueue.popleft())        
 
         if len(idxBeginPulse):
@@ -549,6 +557,18 @@ class Synapse(object):
         self.tBeginOfPulse[synapseNumber] = t + self.delay_ms[synapseNumber]
         self.inQueue.append(synapseNumber)
 
+    def receiveSpikeEngine(self, t, synapseNumber):
+        '''
+        The same function of receiveSpike, when the synapse is computed by a
+        SynapseEngine object. It overrides the receiveSpike function.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **synapseNumber**: integer with the index of the conductance in the synapse.
+        '''
+        self.engine.receiveSpike(t, self.engineIndex, synapseNumber)
+
     def addConductance(self, gmax, delay, dynamics, variation, timeConstant):
         '''
         Adds a synaptic conductance to the compartment. As the computation 
@@ -593,7 +613,7 @@ class Synapse(object):
                                        dtype=float) * float("-inf")
         self.conductanceState = np.zeros_like(self.gmax_muS,
                                               dtype=int)
-        self.ri = np.zeros_like(self.gmax_muS, dtype=float)
+        self.ri = np.zeros_like(self.gmax_muS, dtype=self.conf.floatType)
         self.ti = np.zeros_like(self.gmax_muS, dtype=float)
-        self.dynamicGmax = np.zeros_like(self.gmax_muS, dtype=float)
-        self.synContrib = self.gmax_muS / self.gMaxTot_muS
+        self.dynamicGmax = np.zeros_like(self.gmax_muS, dtype=self.conf.floatType)
+        self.synContrib = (self.gmax_muS / self.gMaxTot_muS).astype(self.conf.floatType)
@@ -0,0 +1,473 @@
+'''
+    Neuromuscular simulator in Python.
+    Copyright (C) 2018  Renato Naville Watanabe
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact: renato.watanabe@usp.br
+'''
+
+import numpy as np
+import math
+from Synapse import compDynamicGmax
+
+## Tolerance, in ms, of the instants of the pulse events. An event at the instant
+## \f$t_e\f$ is processed at the first evaluation of the synapses after \f$t_e\f$ - eventTolerance_ms.
+eventTolerance_ms = 1e-3
+
+
+class SynapseEngine(object):
+    '''
+    Class that implements all the summed synapses of a pool with flat arrays
+    (structure of arrays). The variables of each summed synapse (Ron, Roff, Non...)
+    are stored in vectors with one element per synapse, and the variables of the
+    individual conductances in vectors with one element per conductance, in CSR
+    layout: the conductances of the synapse s are the elements
+    self.synapsePtr[s]:self.synapsePtr[s+1]. The decay of the synapses and the
+    synaptic currents are computed with a few vectorized expressions, and the
+    beginnings and ends of pulses of all the synapses are applied in batches. It is
+    the vectorized version of the computeCurrent method of the Synapse class.
+
+    The pulse events are delivered by a calendar queue: a ring buffer with one slot
+    for each half time step (the instants in which the synapses are evaluated by the
+    Runge-Kutta method), long enough for the largest delay plus the pulse duration.
+    Each event is inserted in the slot of its instant, and each evaluation drains
+    the slots that became due, so the cost is proportional to the number of events.
+    '''
+
+    def __init__(self, conf, synapses, totalNumberOfCompartments):
+        '''
+        Constructor
+
+        - Inputs:
+            + **conf**: Configuration object with the simulation parameters.
+
+            + **synapses**: list of tuples (compartment index, Synapse object) with the synapses
+            of the pool that receive at least one synaptic conductance.
+
+            + **totalNumberOfCompartments**: integer with the number of compartments of the pool.
+        '''
+        self.conf = conf
+        ## Number of compartments of the pool.
+        self.totalNumberOfCompartments = totalNumberOfCompartments
+        ## Number of summed synapses.
+        self.synapseNumber = len(synapses)
+
+        ## Vector with the compartment index, in the pool vectors, of each synapse.
+        self.synapseComp = np.array([comp for comp, synapse in synapses], dtype = int)
+        ## Vector with the equilibrium potential, in mV, of each synapse.
+        self.EqPot_mV = np.array([synapse.EqPot_mV for comp, synapse in synapses], dtype = float)
+        ## Vector with the sum of the individual conductances, in \f$\mu\f$S, of each synapse.
+        self.gMaxTot_muS = np.array([synapse.gMaxTot_muS for comp, synapse in synapses], dtype = float)
+        ## Vector with the value of \f$\exp(-\Delta t/\tau_{on})\f$ of each synapse.
+        self.ExpOn = np.array([synapse.ExpOn for comp, synapse in synapses], dtype = float)
+        ## Vector with the value of \f$\exp(-\Delta t/\tau_{off})\f$ of each synapse.
+        self.ExpOff = np.array([synapse.ExpOff for comp, synapse in synapses], dtype = float)
+        ## Vector with the value of \f$r_{\infty}\f$ of each synapse.
+        self.rInf = np.array([synapse.rInf for comp, synapse in synapses], dtype = float)
+        ## Vector with the pulse duration, in ms, of each synapse.
+        self.tPeak_ms = np.array([synapse.tPeak_ms for comp, synapse in synapses], dtype = float)
+        ## Vector with the time constant after a pulse, in ms, of each synapse.
+        self.tauOff = np.array([synapse.tauOff for comp, synapse in synapses], dtype = float)
+        ## Vector with the value of the exponential at the end of the pulse of each synapse.
+        self.expFinish = np.array([synapse.expFinish for comp, synapse in synapses], dtype = float)
+
+        ## Vector with the index of the first conductance of each synapse (CSR layout).
+        self.synapsePtr = np.zeros((self.synapseNumber + 1), dtype = int)
+        self.synapsePtr[1:] = np.cumsum([len(synapse.gmax_muS) for comp, synapse in synapses])
+        ## Number of individual conductances.
+        self.numberOfConductances = int(self.synapsePtr[-1])
+        ## Vector with the synapse of each individual conductance.
+        self.conductanceSynapse = np.repeat(np.arange(self.synapseNumber),
+                                            np.diff(self.synapsePtr))
+
+        ## Vector with the maximal conductance, in \f$\mu\f$S, of each individual conductance.
+        self.gmax_muS = np.concatenate([np.zeros((0))] + [synapse.gmax_muS for comp, synapse in synapses])
+        ## Vector with the transmission delay, in ms, of each individual conductance.
+        self.delay_ms = np.concatenate([np.zeros((0))] + [synapse.delay_ms for comp, synapse in synapses])
+        ## Vector with the variation factor of the dynamics of each individual conductance.
+        self.variation = np.concatenate([np.zeros((0))] + [synapse.variation for comp, synapse in synapses])
+        ## Vector with the time constant, in ms, of the dynamics of each individual conductance.
+        self.timeConstant_ms = np.concatenate([np.zeros((0))] + [synapse.timeConstant_ms
+                                                                 for comp, synapse in synapses])
+
+        ## List of tuples (compartment indices, synapse indices) with the synapses grouped so
+        ## that each compartment appears once in each group. The currents are added group by
+        ## group, in the same order as the synapses of each compartment.
+        self.layers = []
+        layer = np.zeros((self.synapseNumber), dtype = int)
+        count = dict()
+        for s in xrange(self.synapseNumber):
+            layer[s] = count.get(self.synapseComp[s], 0)
+            count[self.synapseComp[s]] = layer[s] + 1
+        for k in xrange(int(layer.max()) + 1 if self.synapseNumber else 0):
+            indices = np.flatnonzero(layer == k)
+            self.layers.append((self.synapseComp[indices], indices))
+
+        ## Duration, in ms, of each slot of the calendar queue (half time step).
+        self.slotLength_ms = conf.timeStep_ms / 2.0
+        ## Number of slots of the calendar queue.
+        self.slotNumber = 2
+        if self.numberOfConductances:
+            self.slotNumber += int(math.ceil((self.delay_ms.max() + self.tPeak_ms.max())
+                                             / self.slotLength_ms))
+
+        ## SpikeRouter that delivers the spikes to the engine (None if the spikes are
+        ## received through the Synapse objects).
+        self.router = None
+
+        self.setActiveCompartments(np.arange(self.totalNumberOfCompartments))
+        self.reset()
+
+        for s in xrange(self.synapseNumber):
+            synapse = synapses[s][1]
+            synapse.engine = self
+            synapse.engineIndex = s
+            synapse.receiveSpike = synapse.receiveSpikeEngine
+
+    def computeCurrent(self, t, V_mV, iIonic):
+        '''
+        Computes the currents of all the synapses of the pool and adds them to
+        the currents of the compartments.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V_mV**: vector with the membrane potential, in mV, of all the compartments of the pool.
+
+            + **iIonic**: vector with the current, in nA, of each compartment, to which the
+            synaptic currents are added.
+        '''
+        if self.router is not None and self.router.pendingUnits: self.router.flush()
+
+        self.Ron = self.Ron * self.ExpOn + self.Non * self.rInf * (1 - self.ExpOn)
+        self.Roff *= self.ExpOff
+
+        slot = int(round(t / self.slotLength_ms))
+        if slot >= self.lastSlot:
+            if self.scheduledEvents: self.atualizePulses(t, slot)
+            self.lastSlot = slot
+
+        current = self.gMaxTot_muS * (self.Ron + self.Roff) * (self.EqPot_mV - V_mV[self.synapseComp])
+        for comps, indices in self.layers:
+            iIonic[comps] += current[indices]
+
+    def setActiveCompartments(self, comps):
+        '''
+        Chooses the compartments whose synapses are evaluated by the computeActiveCurrent
+        method, used when the motor units at rest are skipped (quiescentUnits parameter).
+
+        - Inputs:
+            + **comps**: vector with the indices, in increasing order, of the compartments.
+        '''
+        active = np.zeros((self.totalNumberOfCompartments), dtype = bool)
+        active[comps] = True
+        ## Vector with the indices of the synapses of the active compartments.
+        self.activeSynapses = np.flatnonzero(active[self.synapseComp])
+        ## Vector with the position of the compartment of each active synapse in the
+        ## vector of active compartments.
+        self.activeSynapseComp = np.searchsorted(comps, self.synapseComp[self.activeSynapses])
+        ## List of tuples (positions in the vector of active compartments, positions in
+        ## the vector of active synapses), with the same groups as the layers attribute.
+        self.activeLayers = []
+        for layerComps, indices in self.layers:
+            positions = np.searchsorted(self.activeSynapses, indices[active[layerComps]])
+            if len(positions):
+                self.activeLayers.append((self.activeSynapseComp[positions], positions))
+
+    def computeActiveCurrent(self, t, V_mV, iIonic):
+        '''
+        Computes the currents of the synapses of the active compartments (see the
+        setActiveCompartments method) and adds them to the currents of these compartments.
+        The pulses of all the synapses begin and end as in the computeCurrent method.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **V_mV**: vector with the membrane potential, in mV, of the active compartments.
+
+            + **iIonic**: vector with the current, in nA, of each active compartment, to which
+            the synaptic currents are added.
+        '''
+        if self.router is not None and self.router.pendingUnits: self.router.flush()
+
+        active = self.activeSynapses
+        self.Ron[active] = (self.Ron[active] * self.ExpOn[active]
+                            + self.Non[active] * self.rInf[active] * (1 - self.ExpOn[active]))
+        self.Roff[active] *= self.ExpOff[active]
+
+        slot = int(round(t / self.slotLength_ms))
+        if slot >= self.lastSlot:
+            if self.scheduledEvents: self.atualizePulses(t, slot)
+            self.lastSlot = slot
+
+        current = (self.gMaxTot_muS[active] * (self.Ron[active] + self.Roff[active])
+                   * (self.EqPot_mV[active] - V_mV[self.activeSynapseComp]))
+        for comps, indices in self.activeLayers:
+            iIonic[comps] += current[indices]
+
+    def atualizePulses(self, t, slot):
+        '''
+        Drains the slots of the calendar queue up to **slot** and applies the beginnings
+        and the ends of pulses in batches. The ends of pulses of conductances that began 
+        a new pulse after the event was inserted are discarded.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **slot**: integer with the slot of the current instant.
+        '''
+        idxBeginPulse = []
+        tBeginPulse = []
+        idxEndPulse = []
+        for k in xrange(self.lastSlot, min(slot, self.lastSlot + self.slotNumber - 1) + 1):
+            i = k % self.slotNumber
+            if self.beginEvents[i]:
+                for idx, tBegin in self.beginEvents[i]:
+                    idxBeginPulse.append(idx)
+                    tBeginPulse.append(tBegin)
+                self.beginEvents[i] = []
+            if self.endEvents[i]:
+                idxEndPulse.extend(self.endEvents[i])
+                self.endEvents[i] = []
+
+        if idxBeginPulse:
+            idxBeginPulse = np.array(idxBeginPulse, dtype = int)
+            self.removeEvents(idxBeginPulse)
+            self.startConductance(t, idxBeginPulse, np.array(tBeginPulse, dtype = float))
+        if idxEndPulse:
+            idxEndPulse = np.array(idxEndPulse, dtype = int)
+            self.removeEvents(idxEndPulse)
+            idxEndPulse = idxEndPulse[(self.conductanceState[idxEndPulse] != 0) &
+                                      (self.endSlot[idxEndPulse] <= slot)]
+            # A conductance can have two ends due when the queue is drained after a long gap.
+            first = np.unique(idxEndPulse, return_index = True)[1]
+            if len(first) < len(idxEndPulse): idxEndPulse = idxEndPulse[np.sort(first)]
+            if len(idxEndPulse): self.stopConductance(t, idxEndPulse)
+
+    def eventSlot(self, tEvent):
+        '''
+        Slot of the calendar queue of an event at the instant **tEvent** (scalar or vector),
+        in ms, never earlier than the last slot drained. The last slot is drained again at the 
+        next evaluation, since the first stage of a time step is at the same instant as the 
+        last stage of the previous one.
+        '''
+        return np.maximum(np.floor((tEvent - eventTolerance_ms) / self.slotLength_ms).astype(int) + 1,
+                          self.lastSlot)
+
+    def insertEvent(self, kind, slot, event):
+        '''
+        Inserts an event in a calendar queue. The queues are enlarged if the slot is
+        beyond their length.
+
+        - Inputs:
+            + **kind**: string with the kind of event. It can be *begin* (beginEvents
+            queue) or *end* (endEvents queue).
+
+            + **slot**: integer with the slot of the event.
+
+            + **event**: event to be inserted.
+        '''
+        if slot - self.lastSlot >= self.slotNumber: self.enlargeCalendar(slot - self.lastSlot + 1)
+        if kind == 'begin':
+            self.beginEvents[slot % self.slotNumber].append(event)
+        else:
+            self.endEvents[slot % self.slotNumber].append(event)
+
+    def enlargeCalendar(self, slotNumber):
+        '''
+        Enlarges the calendar queue to at least **slotNumber** slots, keeping the events.
+        '''
+        newNumber = max(slotNumber, 2 * self.slotNumber)
+        for name in ('beginEvents', 'endEvents'):
+            events = getattr(self, name)
+            newEvents = [[] for k in xrange(newNumber)]
+            for k in xrange(self.lastSlot, self.lastSlot + self.slotNumber):
+                newEvents[k % newNumber] = events[k % self.slotNumber]
+            setattr(self, name, newEvents)
+        self.slotNumber = newNumber
+
+    def removeEvents(self, idx):
+        '''
+        Updates the number of events waiting in the calendar queue after the events of the
+        conductances **idx** are removed.
+        '''
+        np.subtract.at(self.scheduled, self.conductanceSynapse[idx], 1)
+        self.scheduledEvents -= len(idx)
+
+    def startConductance(self, t, idxBeginPulse, tBeginPulse):
+        '''
+        Begins the pulse of a set of individual conductances. It is the vectorized version
+        of the startConductance method of the Synapse class.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **idxBeginPulse**: vector with the indices of the conductances.
+
+            + **tBeginPulse**: vector with the instants, in ms, in which the pulses were scheduled
+            to begin.
+        '''
+        synapse = self.conductanceSynapse[idxBeginPulse]
+        dynG = self.dynamicGmax
+        synCont = self.synContrib
+
+        dynG[idxBeginPulse] = compDynamicGmax(t, self.gmax_muS[idxBeginPulse],
+                                              self.tLastPulse[idxBeginPulse],
+                                              self.timeConstant_ms[idxBeginPulse],
+                                              dynG[idxBeginPulse],
+                                              self.variation[idxBeginPulse])
+        synCont[idxBeginPulse] = dynG[idxBeginPulse] / self.gMaxTot_muS[synapse]
+
+        on = self.conductanceState[idxBeginPulse] != 0
+
+        turningOn = np.logical_not(on)
+        if turningOn.any():
+            idx = idxBeginPulse[turningOn]
+            synapseOn = synapse[turningOn]
+            self.conductanceState[idx] = 1
+            self.ri[idx] *= np.exp((self.ti[idx] + self.tPeak_ms[synapseOn] - t) / self.tauOff[synapseOn])
+            np.add.at(self.Non, synapseOn, synCont[idx])
+            self.ti[idx] = t
+            synGain = self.ri[idx] * synCont[idx]
+            np.add.at(self.Ron, synapseOn, synGain)
+            np.subtract.at(self.Roff, synapseOn, synGain)
+
+        self.tEndOfPulse[idxBeginPulse] = t + self.tPeak_ms[synapse]
+        self.tLastPulse[idxBeginPulse] = tBeginPulse
+        # The end of the previous pulse of the conductances already on is discarded
+        # when drained, since their endSlot changes.
+        self.endSlot[idxBeginPulse] = self.eventSlot(self.tEndOfPulse[idxBeginPulse])
+        for i in xrange(len(idxBeginPulse)):
+            self.insertEvent('end', self.endSlot[idxBeginPulse[i]], idxBeginPulse[i])
+        np.add.at(self.scheduled, synapse, 1)
+        self.scheduledEvents += len(idxBeginPulse)
+
+    def stopConductance(self, t, idxEndPulse):
+        '''
+        Ends the pulse of a set of individual conductances. It is the vectorized version
+        of the stopConductance method of the Synapse class.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **idxEndPulse**: vector with the indices of the conductances.
+        '''
+        synapse = self.conductanceSynapse[idxEndPulse]
+        self.ri[idxEndPulse] = (self.rInf[synapse] + (self.ri[idxEndPulse] - self.rInf[synapse])
+                                * self.expFinish[synapse])
+        synLost = self.ri[idxEndPulse] * self.synContrib[idxEndPulse]
+        np.subtract.at(self.Ron, synapse, synLost)
+        np.add.at(self.Roff, synapse, synLost)
+        np.subtract.at(self.Non, synapse, self.synContrib[idxEndPulse])
+        self.tEndOfPulse[idxEndPulse] = -10000
+        self.conductanceState[idxEndPulse] = 0
+
+    def receiveSpike(self, t, synapse, synapseNumber):
+        '''
+        Schedules the beginning of the pulse of an individual conductance.
+
+        - Inputs:
+            + **t**: current instant, in ms.
+
+            + **synapse**: integer with the index of the synapse in the engine.
+
+            + **synapseNumber**: integer with the index of the conductance in the synapse.
+        '''
+        idx = self.synapsePtr[synapse] + synapseNumber
+        tBegin = t + self.delay_ms[idx]
+        self.insertEvent('begin', self.eventSlot(tBegin), (idx, tBegin))
+        self.scheduled[synapse] += 1
+        self.scheduledEvents += 1
+
+    def receiveSpikes(self, t, idx):
+        '''
+        Schedules the beginning of the pulses of a set of individual conductances. It is
+        the vectorized version of the receiveSpike method, used by the SpikeRouter. The
+        events are inserted in the calendar queue in the order of **idx**.
+
+        - Inputs:
+            + **t**: vector with the instants, in ms, of the spikes.
+
+            + **idx**: vector with the indices of the conductances.
+        '''
+        tBegin = t + self.delay_ms[idx]
+        slots = self.eventSlot(tBegin)
+        if slots.max() - self.lastSlot >= self.slotNumber:
+            self.enlargeCalendar(slots.max() - self.lastSlot + 1)
+        order = np.argsort(slots, kind = 'mergesort')
+        slots = slots[order]
+        events = zip(idx[order].tolist(), tBegin[order].tolist())
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(slots)) + 1, [len(slots)]))
+        for k in xrange(len(bounds) - 1):
+            self.beginEvents[slots[bounds[k]] % self.slotNumber].extend(events[bounds[k]:bounds[k+1]])
+        np.add.at(self.scheduled, self.conductanceSynapse[idx], 1)
+        self.scheduledEvents += len(idx)
+
+    def activeCompartments(self, tolerance):
+        '''
+        Indicates the compartments with at least one synapse with a pulse waiting
+        or with a bound receptor fraction (Ron + Roff) larger than **tolerance**.
+
+        - Inputs:
+            + **tolerance**: value of Ron + Roff below which the synapse is considered at rest.
+
+        - Outputs:
+            + Boolean vector with one element for each compartment of the pool.
+        '''
+        if self.router is not None and self.router.pendingUnits: self.router.flush()
+        active = np.abs(self.Ron) + np.abs(self.Roff) > tolerance
+        active |= self.scheduled > 0
+        return np.bincount(self.synapseComp[active],
+                           minlength = self.totalNumberOfCompartments) > 0
+
+    def reset(self):
+        '''
+        Reset the synapses in the same way as the reset method of the Synapse class.
+        The spikes buffered in the router are delivered before, so they are discarded.
+        '''
+        if self.router is not None: self.router.flush()
+        ## Vectors with the variables Ron, Roff and Non (see Synapse) of each synapse.
+        self.Ron = np.zeros((self.synapseNumber), dtype = float)
+        self.Roff = np.zeros_like(self.Ron)
+        self.Non = np.zeros_like(self.Ron)
+        ## Calendar queue of the beginnings of pulses. Each slot is a list of tuples
+        ## (conductance index, instant of the beginning of the pulse in ms).
+        self.beginEvents = [[] for k in xrange(self.slotNumber)]
+        ## Calendar queue of the ends of pulses. Each slot is a list of conductance indices.
+        self.endEvents = [[] for k in xrange(self.slotNumber)]
+        ## Last slot drained from the calendar queues.
+        self.lastSlot = 0
+        ## Vector with the number of events waiting in the calendar queues for each synapse.
+        self.scheduled = np.zeros((self.synapseNumber), dtype = int)
+        ## Total number of events waiting in the calendar queues.
+        self.scheduledEvents = 0
+
+        ## Vectors with the instants, in ms, of the end and of the beginning of the last pulse
+        ## of each individual conductance.
+        self.tEndOfPulse = np.full((self.numberOfConductances), float('-inf'))
+        self.tLastPulse = np.full_like(self.tEndOfPulse, float('-inf'))
+        ## Vector with the slot of the calendar queue of the end of the pulse of each conductance.
+        self.endSlot = np.zeros((self.numberOfConductances), dtype = int)
+        ## Vector indicating whether each individual conductance is during a pulse (1) or not (0).
+        self.conductanceState = np.zeros((self.numberOfConductances), dtype = int)
+        ## Vector with the fraction of bound receptors of each individual conductance.
+        self.ri = np.zeros((self.numberOfConductances), dtype = self.conf.floatType)
+        ## Vector with the instant, in ms, of the beginning of the last pulse of each conductance.
+        self.ti = np.zeros((self.numberOfConductances), dtype = float)
+        ## Vector with the dynamic maximal conductance, in \f$\mu\f$S, of each individual conductance.
+        self.dynamicGmax = np.zeros((self.numberOfConductances), dtype = self.conf.floatType)
+        ## Vector with the contribution of each individual conductance to the summed synapse
+        ## (\f$g_i/G_{max}\f$).
+        self.synContrib = (self.gmax_muS / self.gMaxTot_muS[self.conductanceSynapse]).astype(self.conf.floatType)
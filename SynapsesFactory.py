@@ -20,9 +20,11 @@
 
 
 import numpy as np
+import scipy.sparse as sparse
 
 from NeuralTract import NeuralTract
 from SynapticNoise import SynapticNoise
+from SpikeRouter import SpikeRouter
 
 class SynapsesFactory(object):
     '''
@@ -30,7 +32,7 @@ class SynapsesFactory(object):
     '''
 
 
-    def __init__(self, conf, pools):
+    def __init__(self, conf, pools, connectivityFile = None):
         '''
         Constructor
 
@@ -39,105 +41,54 @@ class SynapsesFactory(object):
 
             + **pools**: list of all the pools in the system.
 
-        
+            + **connectivityFile**: name of a .npz file saved by the saveConnectivity
+            method. If given, the synapses are read from the file instead of being drawn,
+            so the same network is built again. The default is None.
         '''
         ## Total number of synapses in the system.
         self.numberOfSynapses = 0
         #pools.append(NeuralTract(conf, 'NoiseRC'))
 
+        ## Dictionary with the candidate targets of each synapse rule (see the candidates method).
+        self.candidateTable = dict()
+        ## List of the Synapse objects that receive conductances, and dictionary with
+        ## the index of each one in the list.
+        self.targets = []
+        self.targetIndex = dict()
+        ## List of the units that transmit spikes through the new conductances, and dictionary
+        ## with the index of each one in the list.
+        self.sources = []
+        self.sourceIndex = dict()
+        ## Lists with the vectors of the new conductances (source unit, target Synapse object,
+        ## maximum conductance, delay, variation and time constant), in the order in which
+        ## they are added.
+        self.newSource, self.newTarget, self.newGmax, self.newDelay = [], [], [], []
+        self.newVariation, self.newTimeConstant, self.newDynamics = [], [], []
 
         for poolOut in xrange(len(pools)):
-            for unitOut in xrange(len(pools[poolOut].unit)):
-                pools[poolOut].unit[unitOut].SynapsesOut = conf.determineSynapses(pools[poolOut].pool + '-' + 
-                                                                                  pools[poolOut].unit[unitOut].kind)
-                #print pools[poolOut].pool
-                #print pools[poolOut].unit[unitOut].SynapsesOut
-                for synapseIn in xrange(len(pools[poolOut].unit[unitOut].SynapsesOut)):
-                    conn = float(conf.parameterSet('Con:' + pools[poolOut].pool + '-' 
-                                                   + pools[poolOut].unit[unitOut].kind + '>'
-                                                   + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][0]
-                                                   + '-'
-                                                   + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][1]
-                                                   + '@'
-                                                   + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][2]
-                                                   + '|'
-                                                   + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][3],
-                                                   '', 0)) / 100.0
-                    gmax = float(conf.parameterSet('gmax:' + pools[poolOut].pool + '-'
-                                                   + pools[poolOut].unit[unitOut].kind + '>'
-                                                   + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][0]
-                                                   + '-'
-                                                   + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][1]
-                                                   + '@'
-                                                   + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][2]
-                                                   + '|'
-                                                   + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][3],
-                                                   '', 0))
-                    delay = float(conf.parameterSet('delay:' + pools[poolOut].pool + '-'
-                                                    + pools[poolOut].unit[unitOut].kind + '>'
-                                                    + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][0]
-                                                    + '-'
-                                                    + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][1]
-                                                    + '@'
-                                                    + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][2]
-                                                    + '|'
-                                                    + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][3],
-                                                    '', 0))
-                    declineFactor = float(conf.parameterSet('dec:' + pools[poolOut].pool + '-'
-                                                    + pools[poolOut].unit[unitOut].kind + '>'
-                                                    + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][0]
-                                                    + '-'
-                                                    + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][1]
-                                                    + '@'
-                                                    + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][2]
-                                                    + '|'
-                                                    + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][3],
-                                                    '', 0))
-                    dyn = conf.parameterSet('dyn:' + pools[poolOut].pool + '-'
-                                            + pools[poolOut].unit[unitOut].kind + '>'
-                                            + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][0]
-                                            + '-' + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][1]
-                                            + '@' + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][2]
-                                            + '|' + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][3],
-                                            '', 0)
-                    if dyn != 'None':
-                        var = float(conf.parameterSet('var:' + pools[poolOut].pool + '-'
-                                                      + pools[poolOut].unit[unitOut].kind + '>'
-                                                      + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][0]
-                                                      + '-' + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][1]
-                                                      + '@' + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][2]
-                                                      + '|' + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][3],
-                                                      '', 0))
-                        tau = float(conf.parameterSet('tau:' + pools[poolOut].pool + '-'
-                                                      + pools[poolOut].unit[unitOut].kind + '>'
-                                                      + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][0]
-                                                      + '-' + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][1]
-                                                      + '@' + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][2]
-                                                      + '|' + pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][3],
-                                                      '', 0))
-                    else:
-                        var = 0
-                        tau = 100000
+            units = pools[poolOut].unit
+            first = 0
+            while first < len(units) and connectivityFile is None:
+                # Consecutive units of the same kind make the same synapses, so their
+                # connectivity is drawn at once.
+                last = first + 1
+                while last < len(units) and units[last].kind == units[first].kind: last += 1
+                for unitOut in xrange(first, last):
+                    units[unitOut].SynapsesOut = conf.determineSynapses(pools[poolOut].pool + '-' + units[unitOut].kind)
+                columns = []
+                for rule in units[first].SynapsesOut:
+                    parameters = self.ruleParameters(conf, pools[poolOut].pool + '-' + units[first].kind, rule, 100000)
                     for poolIn in xrange(len(pools)):
-                        if (pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][0].find(pools[poolIn].pool)>=0):
-                            for unitIn in xrange(len(pools[poolIn].unit)):
-                                for compartmentIn in xrange(len(pools[poolIn].unit[unitIn].compartment)):
-                                    if pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][0] == pools[poolIn].pool and pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][1] == pools[poolIn].unit[unitIn].kind and pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][2] == pools[poolIn].unit[unitIn].compartment[compartmentIn].kind:
-                                        if np.random.uniform(0.0, 1.0) <= conn:
-                                            for synapse in xrange(len(pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn)): 
-                                                if pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn[synapse].kind == pools[poolOut].unit[unitOut].SynapsesOut[synapseIn][3]:
-                                                    if np.isfinite(declineFactor):
-                                                        neuronsDistance = np.abs(pools[poolIn].unit[unitIn].position_mm
-                                                                                    - pools[poolOut].unit[unitOut].position_mm)
-                                                        weight = declineFactor / (declineFactor + neuronsDistance**2)
-                                                    else:
-                                                        weight = 1
-                                                    pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn[synapse].addConductance(gmax*weight, delay, dyn, var, tau)
-                                                    pools[poolOut].unit[unitOut].transmitSpikesThroughSynapses.append(pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn[synapse])                                                            
-                                                    pools[poolOut].unit[unitOut].indicesOfSynapsesOnTarget.append(len(pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn[synapse].gmax_muS) - 1)
-                                                    self.numberOfSynapses += 1
-
-        print 'All the ' + str(self.numberOfSynapses) +  ' synapses were built'
+                        if rule[0] == pools[poolIn].pool:
+                            columns.append((parameters, self.candidates(pools, poolIn, rule)))
+                self.numberOfSynapses += self.connect([units[unitOut] for unitOut in xrange(first, last)], columns, None)
+                first = last
+            if connectivityFile is not None:
+                for unitOut in xrange(len(units)):
+                    units[unitOut].SynapsesOut = conf.determineSynapses(pools[poolOut].pool + '-' + units[unitOut].kind)
+
+        if connectivityFile is None:
+            print 'All the ' + str(self.numberOfSynapses) +  ' synapses were built'
 
 
         ## Total number of synaptic noises in the system.
@@ -147,61 +98,317 @@ class SynapsesFactory(object):
         for synapseIn in xrange(len(NoiseSynapsesOut)):
             pools[len(pools)] = SynapticNoise(conf, NoiseSynapsesOut[synapseIn][0])
             poolOut = len(pools) - 1
-            gmax = float(conf.parameterSet('gmax:Noise>' + NoiseSynapsesOut[synapseIn][0] 
-                                           + '-' + NoiseSynapsesOut[synapseIn][1]
-                                           + '@' + NoiseSynapsesOut[synapseIn][2] + '|'
-                                           + NoiseSynapsesOut[synapseIn][3],
-                                           '', 0))
-            delay = float(conf.parameterSet('delay:Noise>' + NoiseSynapsesOut[synapseIn][0]
-                                            + '-' + NoiseSynapsesOut[synapseIn][1]
-                                            + '@' + NoiseSynapsesOut[synapseIn][2] + '|'
-                                            + NoiseSynapsesOut[synapseIn][3],
-                                            '', 0))
-            declineFactor = float(conf.parameterSet('dec:Noise>' + NoiseSynapsesOut[synapseIn][0]
-                                                    + '-' + NoiseSynapsesOut[synapseIn][1]
-                                                    + '@' + NoiseSynapsesOut[synapseIn][2] + '|'
-                                                    + NoiseSynapsesOut[synapseIn][3],
-                                                    '', 0))
-            dyn = conf.parameterSet('dyn:Noise>' + NoiseSynapsesOut[synapseIn][0] 
-                                    + '-' + NoiseSynapsesOut[synapseIn][1]
-                                    + '@' + NoiseSynapsesOut[synapseIn][2] + '|'
-                                    + NoiseSynapsesOut[synapseIn][3],
-                                    '', 0)
-            if dyn != 'None':
-                var = float(conf.parameterSet('var:Noise>' + NoiseSynapsesOut[synapseIn][0]
-                                              + '-' + NoiseSynapsesOut[synapseIn][1]
-                                              + '@' + NoiseSynapsesOut[synapseIn][2] + '|' 
-                                              + NoiseSynapsesOut[synapseIn][3],
-                                              '', 0))
-                tau = float(conf.parameterSet('tau:Noise>' + NoiseSynapsesOut[synapseIn][0]
-                                              + '-' + NoiseSynapsesOut[synapseIn][1]
-                                              + '@' + NoiseSynapsesOut[synapseIn][2]
-                                              + '|' + NoiseSynapsesOut[synapseIn][3],
-                                              '', 0))
-            else:
-                var = 0
-                tau = 10000
-            for unitOut in xrange(len(pools[poolOut].unit)):
-                for poolIn in xrange(len(pools)):
-                    if NoiseSynapsesOut[synapseIn][0] == pools[poolIn].pool and pools[poolIn].kind != 'SN':
-                        for unitIn in xrange(len(pools[poolIn].unit)):
-                            for compartmentIn in xrange(len(pools[poolIn].unit[unitIn].compartment)):
-                                if NoiseSynapsesOut[synapseIn][1] == pools[poolIn].unit[unitIn].kind and NoiseSynapsesOut[synapseIn][2] == pools[poolIn].unit[unitIn].compartment[compartmentIn].kind and pools[poolIn].unit[unitIn].index == pools[poolOut].unit[unitOut].index:
-                                    for synapse in xrange(len(pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn)): 
-                                        if pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn[synapse].kind == NoiseSynapsesOut[synapseIn][3]:
-                                            if np.isfinite(declineFactor):
-                                                neuronsDistance = np.abs(pools[poolIn].unit[unitIn].position_mm
-                                                                            - pools[poolOut].unit[unitOut].position_mm)
-                                                weight = declineFactor / (declineFactor + neuronsDistance**2)
-                                            else:
-                                                weight = 1
-                                            pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn[synapse].addConductance(gmax*weight, delay, dyn, var, tau)
-                                            pools[poolOut].unit[unitOut].transmitSpikesThroughSynapses.append(pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn[synapse])                                                            
-                                            pools[poolOut].unit[unitOut].indicesOfSynapsesOnTarget.append(len(pools[poolIn].unit[unitIn].compartment[compartmentIn].SynapsesIn[synapse].gmax_muS) - 1)
-                                            self.numberOfSynapticNoise += 1
-                  
+            if connectivityFile is not None: continue
+            parameters = self.ruleParameters(conf, 'Noise', NoiseSynapsesOut[synapseIn], 10000)
+            columns = []
+            for poolIn in xrange(len(pools)):
+                if NoiseSynapsesOut[synapseIn][0] == pools[poolIn].pool and pools[poolIn].kind != 'SN':
+                    columns.append((parameters, self.candidates(pools, poolIn, NoiseSynapsesOut[synapseIn])))
+            units = [pools[poolOut].unit[unitOut] for unitOut in xrange(len(pools[poolOut].unit))]
+            # Each noise unit connects to the unit with the same index.
+            self.numberOfSynapticNoise += self.connect(units, columns, 'index')
+
+        if connectivityFile is not None:
+            self.loadConnectivity(connectivityFile, pools)
+            print 'All the ' + str(self.numberOfSynapses) +  ' synapses were read from ' + connectivityFile
+        self.buildConductances()
+
+        print 'All the ' + str(self.numberOfSynapticNoise) +  ' synaptic noises were built'
+
+        ## SpikeRouter that delivers the spikes of the units to the synapse engines of the
+        ## pools (None if the synapses are simulated by the Synapse objects).
+        if conf.synapseEngine == 'pool':
+            self.router = SpikeRouter(conf, pools)
+        else:
+            self.router = None
+        
+    def ruleParameters(self, conf, source, rule, timeConstant):
+        '''
+        Reads the parameters of a synapse rule from the configuration file.
+
+        - Inputs:
+            + **conf**: Configuration object with the simulation parameters.
+
+            + **source**: string with the source of the synapses (pool-kind or Noise).
+
+            + **rule**: list with the target pool, unit kind, compartment and synapse
+            kind (see the determineSynapses method of the Configuration class).
+
+            + **timeConstant**: time constant, in ms, of the synapses without dynamics.
+
+        - Output:
+            + dictionary with the probability of connection (conn), the maximum conductance
+            (gmax), the delay, the decline factor (dec), the dynamics (dyn), the variation (var) 
+            and the time constant (tau) of the synapses.
+        '''
+        if source == 'Noise':
+            name = 'Noise>' + rule[0] + '-' + rule[1] + '@' + rule[2] + '|' + rule[3]
+        else:
+            name = source + '>' + rule[0] + '-' + rule[1] + '@' + rule[2] + '|' + rule[3]
+        parameters = dict()
+        if source != 'Noise':
+            parameters['conn'] = float(conf.parameterSet('Con:' + name, '', 0)) / 100.0
+        parameters['gmax'] = float(conf.parameterSet('gmax:' + name, '', 0))
+        parameters['delay'] = float(conf.parameterSet('delay:' + name, '', 0))
+        parameters['dec'] = float(conf.parameterSet('dec:' + name, '', 0))
+        parameters['dyn'] = conf.parameterSet('dyn:' + name, '', 0)
+        if parameters['dyn'] != 'None':
+            parameters['var'] = float(conf.parameterSet('var:' + name, '', 0))
+            parameters['tau'] = float(conf.parameterSet('tau:' + name, '', 0))
+        else:
+            parameters['var'] = 0
+            parameters['tau'] = timeConstant
+        return parameters
+
+    def candidates(self, pools, poolIn, rule):
+        '''
+        Finds the compartments of a pool that are targets of a synapse rule. The
+        candidates of each rule are found only once.
+
+        - Inputs:
+            + **pools**: list of all the pools in the system.
+
+            + **poolIn**: index of the target pool.
+
+            + **rule**: list with the target pool, unit kind, compartment and synapse kind.
+
+        - Output:
+            + tuple with the list of the target units of the candidates and the list with
+            the Synapse objects of each candidate.
+        '''
+        key = (poolIn,) + tuple(rule)
+        if key not in self.candidateTable:
+            units, synapses = [], []
+            for unitIn in xrange(len(pools[poolIn].unit)):
+                unit = pools[poolIn].unit[unitIn]
+                if unit.kind != rule[1]: continue
+                for compartmentIn in xrange(len(unit.compartment)):
+                    compartment = unit.compartment[compartmentIn]
+                    if compartment.kind == rule[2]:
+                        units.append(unit)
+                        synapses.append([synapse for synapse in compartment.SynapsesIn if synapse.kind == rule[3]])
+            self.candidateTable[key] = (units, synapses)
+        return self.candidateTable[key]
 
+    def connect(self, units, columns, match):
+        '''
+        Connects a group of source units to the candidate targets of their synapse rules.
+        The connectivity of all the (unit, candidate) pairs is drawn with a single call of
+        np.random.uniform, in the same order as one draw per pair, unit by unit.
+
+        - Inputs:
+            + **units**: list with the source units.
+
+            + **columns**: list of tuples with the parameters of a rule and its candidates
+            (see the candidates method).
+
+            + **match**: None, for connections drawn with the probability conn, or *index*,
+            for connections between the units with the same index.
+
+        - Output:
+            + number of conductances added.
+        '''
+        rules = [parameters for parameters, candidates in columns]
+        candidateUnits = [unit for parameters, (targetUnits, synapseLists) in columns for unit in targetUnits]
+        synapses = [synapseList for parameters, (targetUnits, synapseLists) in columns for synapseList in synapseLists]
+        if not units or not candidateUnits: return 0
+        # Index, in the list rules, of the rule of each candidate.
+        rule = np.repeat(np.arange(len(columns)), [len(targetUnits) for parameters, (targetUnits, synapseLists) in columns])
+        if match == 'index':
+            connected = (np.array([unit.index for unit in units])[:, np.newaxis] 
+                         == np.array([unit.index for unit in candidateUnits])[np.newaxis, :])
+        else:
+            conn = np.array([parameters['conn'] for parameters in rules])[rule]
+            connected = np.random.uniform(0.0, 1.0, (len(units), len(candidateUnits))) <= conn
+        source, candidate = np.nonzero(connected)
         
+        # Each candidate can have more than one Synapse object of the kind of the rule.
+        count = np.array([len(synapseList) for synapseList in synapses], dtype = int)[candidate]
+        source, candidate = np.repeat(source, count), np.repeat(candidate, count)
+        if not len(source): return 0
+        order = np.arange(len(source)) - np.repeat(np.cumsum(count) - count, count)
+        candidateTargets = np.array([self.addTarget(synapse) for synapseList in synapses for synapse in synapseList], dtype = int)
+        candidatePtr = np.cumsum([0] + [len(synapseList) for synapseList in synapses])
+        target = candidateTargets[candidatePtr[candidate] + order]
+
+        rule = rule[candidate]
+        declineFactor = np.array([parameters['dec'] for parameters in rules])[rule]
+        weight = np.ones(len(source))
+        finite = np.isfinite(declineFactor)
+        if finite.any():
+            candidatePosition_mm = np.zeros((len(candidateUnits)), dtype = float)
+            for k in np.unique(candidate[finite]):
+                candidatePosition_mm[k] = candidateUnits[k].position_mm
+            sourcePosition_mm = np.array([unit.position_mm for unit in units], dtype = float)
+            neuronsDistance = np.abs(candidatePosition_mm[candidate[finite]] - sourcePosition_mm[source[finite]])
+            weight[finite] = declineFactor[finite] / (declineFactor[finite] + neuronsDistance**2)
+        variation = np.array([1.0 - parameters['var'] if parameters['dyn'] == 'Depressing' else 1.0 + parameters['var'] 
+                              for parameters in rules])
 
-        print 'All the ' + str(self.numberOfSynapticNoise) +  ' synaptic noises were built'                   
-        
\ No newline at end of file
+        self.newSource.append(np.array([self.addSource(unit) for unit in units], dtype = int)[source])
+        self.newTarget.append(target)
+        self.newGmax.append(np.array([parameters['gmax'] for parameters in rules])[rule] * weight)
+        self.newDelay.append(np.array([parameters['delay'] for parameters in rules], dtype = float)[rule])
+        self.newVariation.append(variation[rule])
+        self.newTimeConstant.append(np.array([parameters['tau'] for parameters in rules], dtype = float)[rule])
+        self.newDynamics.extend([rules[k]['dyn'] for k in rule])
+        return len(source)
+
+    def addTarget(self, synapse):
+        '''
+        Index of a Synapse object in the list targets.
+        '''
+        if id(synapse) not in self.targetIndex:
+            self.targetIndex[id(synapse)] = len(self.targets)
+            self.targets.append(synapse)
+        return self.targetIndex[id(synapse)]
+
+    def addSource(self, unit):
+        '''
+        Index of a unit in the list sources.
+        '''
+        if id(unit) not in self.sourceIndex:
+            self.sourceIndex[id(unit)] = len(self.sources)
+            self.sources.append(unit)
+        return self.sourceIndex[id(unit)]
+
+    def buildConductances(self):
+        '''
+        Adds the new conductances to the Synapse objects, with one allocation of the vectors
+        of each Synapse object, in the same order as the addConductance method of the Synapse
+        class would do, and fills the lists transmitSpikesThroughSynapses and 
+        indicesOfSynapsesOnTarget of the source units.
+        '''
+        ## Vectors with the source unit (index in the list sources), the target Synapse object
+        ## (index in the list targets), the maximum conductance, in \f$\mu\f$S, the delay, in ms,
+        ## the variation, the time constant, in ms, and the dynamics of each conductance of the
+        ## network, in the order in which they were added (see the connectivity attribute).
+        self.source = np.concatenate([np.zeros(0, dtype = int)] + self.newSource)
+        self.target = np.concatenate([np.zeros(0, dtype = int)] + self.newTarget)
+        self.gmax_muS = np.concatenate([np.zeros(0)] + self.newGmax)
+        self.delay_ms = np.concatenate([np.zeros(0)] + self.newDelay)
+        self.variation = np.concatenate([np.zeros(0)] + self.newVariation)
+        self.timeConstant_ms = np.concatenate([np.zeros(0)] + self.newTimeConstant)
+        self.dynamics = np.array(self.newDynamics, dtype = str)
+        # Only the units and Synapse objects with conductances are kept, in the order in
+        # which they first appear, so a network read from a file has the same indices.
+        self.sources, self.source = self.renumber(self.sources, self.source)
+        self.targets, self.target = self.renumber(self.targets, self.target)
+        self.sourceIndex = dict([(id(self.sources[i]), i) for i in xrange(len(self.sources))])
+        self.targetIndex = dict([(id(self.targets[i]), i) for i in xrange(len(self.targets))])
+        ## Sparse matrix (scipy.sparse.coo_matrix), with one row for each source unit and one 
+        ## column for each target Synapse object, with the maximum conductance, in \f$\mu\f$S, of
+        ## each conductance of the network. The elements are in the same order as the vectors
+        ## source, target, delay_ms, variation, timeConstant_ms and dynamics.
+        self.connectivity = sparse.coo_matrix((self.gmax_muS, (self.source, self.target)),
+                                              shape = (len(self.sources), len(self.targets)))
+        self.newSource, self.newTarget, self.newGmax, self.newDelay = [], [], [], []
+        self.newVariation, self.newTimeConstant, self.newDynamics = [], [], []
+
+        source, target, gmax = self.source, self.target, self.gmax_muS
+        delay, variation, timeConstant = self.delay_ms, self.variation, self.timeConstant_ms
+
+        byTarget = np.argsort(target, kind = 'mergesort')
+        targetPtr = np.concatenate(([0], np.cumsum(np.bincount(target, minlength = len(self.targets)))))
+        indexOnTarget = np.empty(len(target), dtype = int)
+        for i in xrange(len(self.targets)):
+            synapse = self.targets[i]
+            new = byTarget[targetPtr[i]:targetPtr[i+1]]
+            if not len(new): continue
+            indexOnTarget[new] = len(synapse.gmax_muS) + np.arange(len(new))
+            # The total conductance is accumulated in the same order as by addConductance.
+            synapse.gMaxTot_muS = np.cumsum(np.concatenate(([synapse.gMaxTot_muS], gmax[new])))[-1]
+            synapse.numberOfIncomingSynapses += len(new)
+            synapse.gmax_muS = np.concatenate((synapse.gmax_muS, gmax[new]))
+            synapse.delay_ms = np.concatenate((synapse.delay_ms, delay[new]))
+            synapse.dynamics.extend(self.dynamics[new].tolist())
+            synapse.variation = np.concatenate((synapse.variation, variation[new]))
+            synapse.timeConstant_ms = np.concatenate((synapse.timeConstant_ms, timeConstant[new]))
+
+        bySource = np.argsort(source, kind = 'mergesort')
+        sourcePtr = np.concatenate(([0], np.cumsum(np.bincount(source, minlength = len(self.sources)))))
+        for i in xrange(len(self.sources)):
+            new = bySource[sourcePtr[i]:sourcePtr[i+1]]
+            self.sources[i].transmitSpikesThroughSynapses.extend([self.targets[k] for k in target[new]])
+            self.sources[i].indicesOfSynapsesOnTarget.extend(indexOnTarget[new].tolist())
+
+    def renumber(self, objects, index):
+        '''
+        Keeps only the objects of a list that are in the vector **index**, in the order in which
+        they first appear in **index**.
+
+        - Output:
+            + the new list of objects and the vector **index** with the indices in the new list.
+        '''
+        values, first, inverse = np.unique(index, return_index = True, return_inverse = True)
+        order = np.argsort(first, kind = 'mergesort')
+        rank = np.empty(len(values), dtype = int)
+        rank[order] = np.arange(len(values))
+        return [objects[values[k]] for k in order], rank[inverse]
+
+    def locations(self, pools):
+        '''
+        Dictionaries with the location in the pools of the units, (pool, unit), and of the
+        Synapse objects, (pool, unit, compartment, synapse), with the id of the objects as keys.
+        '''
+        units, synapses = dict(), dict()
+        for pool in xrange(len(pools)):
+            for unit in xrange(len(pools[pool].unit)):
+                units[id(pools[pool].unit[unit])] = (pool, unit)
+                compartments = getattr(pools[pool].unit[unit], 'compartment', [])
+                for compartment in xrange(len(compartments)):
+                    for synapse in xrange(len(compartments[compartment].SynapsesIn)):
+                        synapses[id(compartments[compartment].SynapsesIn[synapse])] = (pool, unit, compartment, synapse)
+        return units, synapses
+
+    def saveConnectivity(self, filename, pools):
+        '''
+        Saves the network built by the factory in a compressed .npz file, that can be 
+        given to the constructor to build the same network again without drawing it.
+        The units and Synapse objects are saved by their location in the pools, so the
+        pools must be built in the same order with the same configuration.
+
+        - Inputs:
+            + **filename**: name of the file.
+
+            + **pools**: list of all the pools in the system (including the synaptic noises
+            built by the factory).
+        '''
+        units, synapses = self.locations(pools)
+        sourceLocation = np.array([units[id(unit)] for unit in self.sources], dtype = int).reshape(-1, 2)
+        targetLocation = np.array([synapses[id(synapse)] for synapse in self.targets], dtype = int).reshape(-1, 4)
+        np.savez_compressed(filename, pools = np.array([pools[pool].pool for pool in xrange(len(pools))], dtype = str),
+                            numberOfSynapses = self.numberOfSynapses, 
+                            numberOfSynapticNoise = self.numberOfSynapticNoise,
+                            source = sourceLocation[self.source], target = targetLocation[self.target],
+                            gmax_muS = self.gmax_muS, delay_ms = self.delay_ms, variation = self.variation,
+                            timeConstant_ms = self.timeConstant_ms, dynamics = self.dynamics)
+
+    def loadConnectivity(self, filename, pools):
+        '''
+        Reads a network saved by the saveConnectivity method. The conductances are added
+        to the Synapse objects by the buildConductances method.
+
+        - Inputs:
+            + **filename**: name of the file.
+
+            + **pools**: list of all the pools in the system (including the synaptic noises
+            built by the factory).
+        '''
+        network = np.load(filename)
+        if network['pools'].tolist() != [pools[pool].pool for pool in xrange(len(pools))]:
+            raise ValueError('The pools of the connectivity file ' + filename + ' are not the pools of the system.')
+        self.numberOfSynapses = int(network['numberOfSynapses'])
+        self.numberOfSynapticNoise = int(network['numberOfSynapticNoise'])
+        # Each unit and Synapse object is looked up only once.
+        source, sourceInverse = np.unique(network['source'].reshape(-1, 2), axis = 0, return_inverse = True)
+        target, targetInverse = np.unique(network['target'].reshape(-1, 4), axis = 0, return_inverse = True)
+        self.newSource.append(np.array([self.addSource(pools[pool].unit[unit]) for pool, unit in source], 
+                                       dtype = int)[sourceInverse])
+        self.newTarget.append(np.array([self.addTarget(pools[pool].unit[unit].compartment[compartment].SynapsesIn[synapse])
+                                        for pool, unit, compartment, synapse in target], dtype = int)[targetInverse])
+        self.newGmax.append(network['gmax_muS'])
+        self.newDelay.append(network['delay_ms'])
+        self.newVariation.append(network['variation'])
+        self.newTimeConstant.append(network['timeConstant_ms'])
+        self.newDynamics.extend(network['dynamics'].tolist())
@@ -59,9 +59,9 @@ class SynapticNoise(object):
         ## interval) or *FR* (firing rate).
         self.target = conf.parameterSet('NoiseTarget_' + pool, pool, 0)
         if self.target == 'ISI' :
-            exec 'def NoiseFunction(t): return 1000.0/('  +  conf.parameterSet('NoiseFunction_' + pool, pool, 0) + ')'
+            NoiseFunction = '1000.0/('  +  conf.parameterSet('NoiseFunction_' + pool, pool, 0) + ')'
         else:
-            exec 'def NoiseFunction(t): return '   +  conf.parameterSet('NoiseFunction_' + pool, pool, 0)
+            NoiseFunction = conf.parameterSet('NoiseFunction_' + pool, pool, 0)
 
         ## The  mean firing rate of the neural tract units.
         self.FR = conf.inputFunctionGet(NoiseFunction) * conf.timeStep_ms/1000.0
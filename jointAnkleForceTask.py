@@ -55,23 +55,24 @@ class jointAnkleForceTask(object):
         '''
         '''
         
-        self.ankleAngle_rad[int(np.rint(t / self.conf.timeStep_ms))] = ankleAngle
+        self.ankleAngle_rad[self.conf.tick(t)] = ankleAngle
 
     def computeTorque(self, t):
         '''
         '''
+        step = self.conf.tick(t)
         torque = 0
         for muscle in self.muscles:
-            torque += muscle.Muscle.force[int(np.rint(t / self.conf.timeStep_ms))] * muscle.Muscle.momentArm_m[int(np.rint(t / self.conf.timeStep_ms))]
-        velocity = (self.ankleAngle_rad[int(np.rint(t / self.conf.timeStep_ms))] - 
-                    self.ankleAngle_rad[int(np.rint(t / self.conf.timeStep_ms)) - 1]) / self.conf.timeStep_ms
-        acceleration = (self.ankleAngle_rad[int(np.rint(t / self.conf.timeStep_ms))] - 
-                    2*self.ankleAngle_rad[int(np.rint(t / self.conf.timeStep_ms)) - 1]+
-                    self.ankleAngle_rad[int(np.rint(t / self.conf.timeStep_ms)) - 2]) / (self.conf.timeStep_ms**2)
+            torque += muscle.Muscle.force[step] * muscle.Muscle.momentArm_m[step]
+        velocity = (self.ankleAngle_rad[step] - 
+                    self.ankleAngle_rad[step - 1]) / self.conf.timeStep_ms
+        acceleration = (self.ankleAngle_rad[step] - 
+                    2*self.ankleAngle_rad[step - 1]+
+                    self.ankleAngle_rad[step - 2]) / (self.conf.timeStep_ms**2)
         
-        torque -= 0*1100*velocity + 0*320*self.ankleAngle_rad[int(np.rint(t / self.conf.timeStep_ms))] + 0*acceleration
+        torque -= 0*1100*velocity + 0*320*self.ankleAngle_rad[step] + 0*acceleration
         
-        self.ankleTorque_Nm[int(np.rint(t / self.conf.timeStep_ms))] = torque
+        self.ankleTorque_Nm[step] = torque
         
     def reset(self, t):
         '''